@@ -1,10 +1,11 @@
 # Minimal FastAPI wrapper around ChatbotForTravel core to support frontend contract.
 # To run: `uvicorn api:app --host 127.0.0.1 --port 8001 --reload`
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 import logging
-import time
+import random
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import sys
@@ -19,8 +20,19 @@ from core.intent_detector import detect_intent  # type: ignore
 from core.osm_loader import ensure_poi_dataset  # type: ignore
 from core.weather import get_weather  # type: ignore
 from core.recommender import recommend_pois  # type: ignore
-from core.itinerary import build_itinerary  # type: ignore
+from core.catalog import catalog_stats, get_shard, peek_shard, pin_request  # type: ignore
+from core.catalog_reload import start_catalog_watcher, stop_catalog_watcher  # type: ignore
+from core.viewport import parse_bbox  # type: ignore
+from core.plan_store import create_plan, get_plan, PlanNotFound  # type: ignore
 from core.llm_composer import compose_plan_response  # type: ignore
+from core.param_extractor import extract_params  # type: ignore
+from core.context_store import get_context, update_context, close_context_store  # type: ignore
+from core.event_log import submit_events, close_event_log, add_event_listener, EventQueueFull  # type: ignore
+from core.preferences import update_from_events  # type: ignore
+from core.fastjson import dumps as json_dumps  # type: ignore
+from core.poi_json import parse_fields, public_poi  # type: ignore
+from core.poi_record import PoiRecord  # type: ignore
+from core import metrics, profiling  # type: ignore
 
 app = FastAPI(title="Tripiz Chat API")
 
@@ -33,28 +45,62 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure logging to show debug messages during runs
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+# Log level lấy từ env (mặc định INFO để không tốn chi phí log DEBUG trên mọi request)
+logging.basicConfig(
+    level=os.getenv("TRIPIZ_LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
 logger = logging.getLogger("tripiz")
 
+# Tỉ lệ request được log body (0.0 = tắt, 1.0 = log tất cả); chỉ có tác dụng khi bật DEBUG
+LOG_BODY_SAMPLE_RATE = float(os.getenv("TRIPIZ_LOG_BODY_SAMPLE", "0"))
+
 
-# Log incoming requests and timing for easier debugging in VS Code
+# Per-request timing: Server-Timing header + histogram cho /metrics; body log chỉ khi được sample
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    start_time = time.time()
-    try:
-        body = await request.body()
-    except Exception:
-        body = b""
-    logger.debug(f"Incoming request: {request.method} {request.url.path} body={body.decode(errors='ignore')}")
+    timings = metrics.start_request()
+    # Ghim shard: request chạy trọn trên một version catalog dù reload nóng xảy ra giữa chừng
+    pins = pin_request()
+    if LOG_BODY_SAMPLE_RATE > 0 and logger.isEnabledFor(logging.DEBUG) and random.random() < LOG_BODY_SAMPLE_RATE:
+        try:
+            body = await request.body()
+        except Exception:
+            body = b""
+        logger.debug("Incoming request: %s %s body=%s", request.method, request.url.path, body.decode(errors="ignore"))
     response = await call_next(request)
-    duration = (time.time() - start_time) * 1000
-    logger.debug(f"Completed {request.method} {request.url.path} -> {response.status_code} in {duration:.1f}ms")
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    metrics.observe_request(timings, path)
+    response.headers["Server-Timing"] = timings.server_timing()
+    if pins:
+        response.headers["X-Catalog-Version"] = ",".join(f"{s.slug}:{s.version}" for s in pins.values())
+    if "profile" in timings.labels:
+        response.headers["X-Tripiz-Profile-Id"] = timings.labels["profile"]
+    logger.debug("Completed %s %s -> %s in %.1fms", request.method, request.url.path, response.status_code, timings.total_ms())
     return response
 
+# Event tương tác -> cập nhật vector sở thích của user (trên thread ghi event)
+add_event_listener(update_from_events)
+
+@app.on_event("startup")
+def _start_watchers():
+    start_catalog_watcher()
+
+@app.on_event("shutdown")
+def _flush_stores():
+    stop_catalog_watcher()
+    close_context_store()
+    close_event_log()
+
 @app.get('/health')
 async def health():
-    return {'status': 'ok', 'service': 'Tripiz Chat API'}
+    return {'status': 'ok', 'service': 'Tripiz Chat API',
+            'catalog': {s['slug']: s['version'] for s in catalog_stats()}}
+
+@app.get('/metrics', response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
 
 class Suggestion(BaseModel):
     id: str
@@ -73,37 +119,124 @@ class ChatResponse(BaseModel):
     suggestions: Optional[List[Suggestion]] = None
     metadata: Optional[Dict[str, Any]] = None
 
+class ContextUpdate(BaseModel):
+    preferences: Optional[Dict[str, Any]] = None
+    conversationSummary: Optional[str] = None
+    replacePreferences: bool = False  # True: thay toàn bộ preferences thay vì merge
+
+class PlanPoiEdit(BaseModel):
+    poi_id: Optional[str] = None  # POI trong catalog (poi_id trả về ở plan_pois)
+    poi: Optional[Dict[str, Any]] = None  # hoặc POI tự do, cần lat/lon
+    # bỏ trống cả hai -> tự chọn ứng viên chưa dùng gần ngày đó nhất
+
+
+class FastJSONResponse(JSONResponse):
+    """Encode bằng core.fastjson (orjson nếu có); POI là fragment JSON dựng sẵn, không qua pydantic."""
+
+    def render(self, content: Any) -> bytes:
+        return json_dumps(content)
+
+
+def _fields(fields: Optional[str]):
+    try:
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _public_pois(pois: List[Dict[str, Any]], fields=None) -> List[Any]:
+    """
+    POI công khai: POI lấy từ shard (PoiRecord) dùng fragment JSON của shard theo poi_id (shard đang trong cache);
+    POI client gửi (dict) luôn dựng bằng public_poi, kể cả khi poi_id trông giống id catalog.
+    """
+    out, by_slug = [], {}
+    for poi in pois:
+        poi_id = poi.get('poi_id')
+        fragments, row = None, -1
+        if isinstance(poi, PoiRecord) and isinstance(poi_id, str) and poi_id.count(':') == 2:
+            slug = poi_id.split(':', 1)[0]
+            if slug not in by_slug:
+                shard = peek_shard(slug)
+                by_slug[slug] = shard.poi_fragments() if shard is not None else None
+            fragments = by_slug[slug]
+            row = fragments.row(poi_id) if fragments is not None else -1
+        out.append(fragments.fragment(row, fields) if row >= 0 else public_poi(poi, fields))
+    return out
+
+
+def _fast(model: BaseModel) -> FastJSONResponse:
+    return FastJSONResponse(model.model_dump())
+
+
+def _plan_payload(plan, fields=None) -> Dict[str, Any]:
+    return {
+        'planId': plan.id,
+        'version': plan.version,
+        'city': plan.city,
+        'days': [{
+            'day': i + 1,
+            'title': day['title'],
+            'distance': day['distance'],
+            'travelMinutes': day['travel_minutes'],
+            'transport': day['transport'],
+            'weather': day['weather'],
+            'pois': _public_pois(day['pois'], fields),
+        } for i, day in enumerate(plan.days_output())],
+    }
+
+# Handler đồng bộ: FastAPI chạy trong threadpool nên các bước I/O/CPU (shard, weather, routing)
+# không chặn event loop và request đồng thời có thể gộp chung việc nặng (core/singleflight.py)
 @app.post('/api/chat', response_model=ChatResponse)
-async def chat(req: ChatRequest):
+def chat(req: ChatRequest, request: Request, fields: Optional[str] = None):
+    # Profile cProfile khi có header X-Tripiz-Profile hoặc được sample (core/profiling.py)
+    with profiling.maybe_profile(request.headers, '/api/chat'):
+        return _chat(req, fields)
+
+def _chat(req: ChatRequest, fields: Optional[str]):
+    # fields=name,lat,lon -> chỉ trả các trường này cho POI trong metadata
+    poi_fields = _fields(fields)
     try:
         # Derive city preference or fallback
         city = 'Hồ Chí Minh'
         ctx = req.context or {}
         prefs = ctx.get('preferences') or {}
+        if isinstance(prefs, dict) and prefs:
+            # Client gửi preferences -> lưu lại cho các lượt sau
+            update_context(req.userId, preferences=prefs)
+        else:
+            # Không gửi context -> dùng preferences đã lưu của user
+            prefs = get_context(req.userId)['preferences']
         if isinstance(prefs, dict) and 'city' in prefs:
             city = str(prefs['city'])
 
         # Load data and detect intent (force offline: use CSV cache only)
-        logger.debug(f"Loading POI dataset for city={city} (force_offline=True)")
-        poi_df = ensure_poi_dataset(city, force_offline=True)
-        logger.debug(f"POI dataset loaded: {getattr(poi_df, 'shape', 'unknown')} rows")
-        weather = get_weather(city)
-        intent = detect_intent(req.message)
-        logger.debug(f"Detected intent={intent} for message='{req.message}'")
+        with metrics.stage("catalog"):
+            poi_df = ensure_poi_dataset(city, force_offline=True)
+        logger.debug("POI dataset loaded for city=%s: %s rows", city, getattr(poi_df, 'shape', 'unknown'))
+        with metrics.stage("weather"):
+            weather = get_weather(city)
+        with metrics.stage("intent"):
+            intent = detect_intent(req.message)
+        metrics.set_label("intent", intent)
+        if intent != 'plan':
+            update_context(req.userId, action={'type': intent, 'message': req.message[:200]})
+        logger.debug("Detected intent=%s for message=%r", intent, req.message)
 
         if intent == 'weather':
             reply = f"⛅ Thời tiết {city}: {weather['description']}, {weather['temp']}°C"
-            return ChatResponse(replyText=reply, suggestions=[], metadata={'intent': intent})
+            return _fast(ChatResponse(replyText=reply, suggestions=[], metadata={'intent': intent}))
         elif intent == 'lookup':
-            pois = recommend_pois(
-                city=city,
-                poi_df=poi_df,
-                user_query=req.message,
-                taste_tags=prefs.get('taste', []),
-                activity_tags=prefs.get('interests', []),
-                budget_per_day=prefs.get('budget', 1_500_000),
-                walk_tolerance_km=prefs.get('walk_tolerance_km', 5.0),
-            )
+            with metrics.stage("scoring"):
+                pois = recommend_pois(
+                    city=city,
+                    poi_df=poi_df,
+                    user_query=req.message,
+                    taste_tags=prefs.get('taste', []),
+                    activity_tags=prefs.get('interests', []),
+                    budget_per_day=prefs.get('budget', 1_500_000),
+                    walk_tolerance_km=prefs.get('walk_tolerance_km', 5.0),
+                    user_id=req.userId,
+                )
             # Build a reply with actual POI names and include image URLs in metadata
             pois_out = []
             if pois is not None and len(pois) > 0:
@@ -115,26 +248,15 @@ async def chat(req: ChatRequest):
                     name = str(poi.get('name', 'Unnamed'))
                     category = str(poi.get('category', 'N/A'))
                     reply += f"{i+1}. {name} ({category})\n"
-                    # Add image URLs for frontend rendering
-                    pois_out.append({
-                        'name': name,
-                        'category': category,
-                        'image_url1': poi.get('image_url1'),
-                        'image_url2': poi.get('image_url2'),
-                        'address': poi.get('address'),
-                        'avg_cost': poi.get('avg_cost'),
-                        'description': poi.get('description'),
-                        'lat': poi.get('lat'),
-                        'lon': poi.get('lon'),
-                        'rating': poi.get('rating'),
-                    })
+                # Add image URLs for frontend rendering
+                pois_out = _public_pois(pois[:display_count], poi_fields)
                 if count > 10:
                     reply += f"\n...và {count - 10} địa điểm khác"
             else:
                 count = 0
                 reply = "🔎 Không tìm thấy địa điểm phù hợp. Thử tìm kiếm khác nhé!"
             suggestions = [Suggestion(id='s1', label='Show nearby', action={'type': 'open_screen', 'screen': 'map', 'payload': {}})]
-            return ChatResponse(replyText=reply, suggestions=suggestions, metadata={'intent': intent, 'poi_count': count, 'pois': pois_out})
+            return _fast(ChatResponse(replyText=reply, suggestions=suggestions, metadata={'intent': intent, 'poi_count': count, 'pois': pois_out}))
         elif intent == 'plan':
             params = {
                 'city': city,
@@ -144,45 +266,141 @@ async def chat(req: ChatRequest):
                 'budget_vnd': prefs.get('budget', 1_500_000),
                 'walk_tolerance_km': prefs.get('walk_tolerance_km', 5.0),
                 'transport': prefs.get('transport', 'xe máy/ô tô'),
+                'user_id': req.userId,
             }
-            plan_raw = build_itinerary(params, poi_df, weather)
+            # Slot nói rõ trong câu ("3 ngày ở Đà Nẵng, 2 triệu") thắng preferences; luật cục bộ, không gọi LLM
+            with metrics.stage("parse"):
+                found, _ = extract_params(req.message)
+            params.update(found)
+            if params['city'] != city:
+                with metrics.stage("weather"):
+                    weather = get_weather(params['city'])
+            plan = create_plan(params, weather)
+            update_context(req.userId, last_plan_id=plan.id, action={'type': intent, 'message': req.message[:200], 'planId': plan.id})
+            plan_raw = plan.days_output()
             # Collect POI images for each day
-            pois_days = []
-            for day in plan_raw:
-                pois_out = []
-                for poi in day.get('pois', []):
-                    pois_out.append({
-                        'name': poi.get('name', 'Unnamed'),
-                        'category': poi.get('category', 'N/A'),
-                        'image_url1': poi.get('image_url1'),
-                        'image_url2': poi.get('image_url2'),
-                        'address': poi.get('address'),
-                        'avg_cost': poi.get('avg_cost'),
-                        'description': poi.get('description'),
-                        'lat': poi.get('lat'),
-                        'lon': poi.get('lon'),
-                        'rating': poi.get('rating'),
-                    })
-                pois_days.append(pois_out)
-            plan_text = compose_plan_response(plan_raw, params)
-            return ChatResponse(replyText=plan_text, suggestions=[], metadata={'intent': intent, 'plan_pois': pois_days})
+            pois_days = [_public_pois(day.get('pois', []), poi_fields) for day in plan_raw]
+            with metrics.stage("compose"):
+                plan_text = compose_plan_response(plan_raw, params)
+            return _fast(ChatResponse(replyText=plan_text, suggestions=[], metadata={'intent': intent, 'plan_id': plan.id, 'plan_pois': pois_days}))
         else:
-            return ChatResponse(replyText='Bạn có thể yêu cầu: gợi ý địa điểm, xem thời tiết, hoặc lên lịch trình.', suggestions=[], metadata={'intent': 'general'})
+            return _fast(ChatResponse(replyText='Bạn có thể yêu cầu: gợi ý địa điểm, xem thời tiết, hoặc lên lịch trình.', suggestions=[], metadata={'intent': 'general'}))
     except Exception as e:
         import traceback
         error_detail = traceback.format_exc()
         print(f"ERROR in chat endpoint: {error_detail}")
-        return ChatResponse(
+        return _fast(ChatResponse(
             replyText=f"Đã xảy ra lỗi: {str(e)}\nVui lòng thử lại.",
             suggestions=[],
             metadata={'error': str(e)}
-        )
+        ))
+
+# ---------- Sửa lịch trình từng ngày (plan_id lấy từ metadata của /api/chat intent=plan) ----------
+def _edit_plan(plan_id: str, op=None, fields: Optional[str] = None):
+    poi_fields = _fields(fields)
+    try:
+        plan = get_plan(plan_id)
+        with plan.lock:
+            if op is not None:
+                op(plan)
+            return FastJSONResponse(_plan_payload(plan, poi_fields))
+    except PlanNotFound:
+        raise HTTPException(status_code=404, detail=f"Plan {plan_id} không tồn tại hoặc đã hết hạn")
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get('/api/plans/{plan_id}')
+def plan_detail(plan_id: str, fields: Optional[str] = None):
+    return _edit_plan(plan_id, None, fields)
+
+@app.post('/api/plans/{plan_id}/days/{day}/pois')
+def plan_insert_poi(plan_id: str, day: int, edit: PlanPoiEdit, fields: Optional[str] = None):
+    return _edit_plan(plan_id, lambda p: p.insert(day, edit.poi_id, edit.poi), fields)
+
+@app.put('/api/plans/{plan_id}/days/{day}/pois/{idx}')
+def plan_replace_poi(plan_id: str, day: int, idx: int, edit: PlanPoiEdit, fields: Optional[str] = None):
+    return _edit_plan(plan_id, lambda p: p.replace(day, idx, edit.poi_id, edit.poi), fields)
+
+@app.delete('/api/plans/{plan_id}/days/{day}/pois/{idx}')
+def plan_remove_poi(plan_id: str, day: int, idx: int, fields: Optional[str] = None):
+    return _edit_plan(plan_id, lambda p: p.remove(day, idx), fields)
+
+@app.post('/api/plans/{plan_id}/days/{day}/regenerate')
+def plan_regenerate_day(plan_id: str, day: int, fields: Optional[str] = None):
+    return _edit_plan(plan_id, lambda p: p.regenerate(day), fields)
+
+@app.get('/api/pois/suggest')
+def poi_suggest(q: str = '', city: str = 'Hồ Chí Minh', limit: int = 8):
+    # Autocomplete theo tiền tố, không phân biệt dấu (index dựng sẵn lúc load shard)
+    try:
+        shard = get_shard(city)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    index = shard.suggest_index()
+    return FastJSONResponse({'query': q, 'city': shard.name,
+                             'suggestions': index.search(q, limit) if index is not None else []})
+
+@app.get('/api/pois')
+def pois_in_view(bbox: str, zoom: int = 14, category: Optional[str] = None, city: str = 'Hồ Chí Minh'):
+    # bbox = west,south,east,north; zoom thấp -> cụm kèm số lượng, zoom cao -> từng POI
+    try:
+        box = parse_bbox(bbox)
+        shard = get_shard(city)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    index = shard.viewport_index()
+    if index is None:
+        return {'city': shard.name, 'zoom': zoom, 'clustered': False, 'total': 0, 'truncated': False, 'items': []}
+    return FastJSONResponse({'city': shard.name, **index.query(box, zoom, category)})
 
 @app.post('/api/events')
 async def events(payload: Dict[str, Any]):
-    # Placeholder: accept and ignore
-    return { 'status': 'ok' }
+    # Một event hoặc {"events": [...]}; chỉ xếp hàng, thread nền ghi theo lô
+    batch = payload['events'] if isinstance(payload.get('events'), list) else [payload]
+    try:
+        accepted = submit_events(batch)
+    except EventQueueFull as e:
+        return JSONResponse(status_code=429, content={'status': 'busy', 'retryAfter': e.retry_after},
+                            headers={'Retry-After': str(e.retry_after)})
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={'status': 'error', 'detail': str(e)})
+    return {'status': 'ok', 'accepted': accepted}
 
 @app.get('/api/context/{user_id}')
-async def context(user_id: str):
-    return { 'userId': user_id, 'preferences': { 'price': 'medium' }, 'recentActions': [], 'conversationSummary': '' }
+def context(user_id: str):
+    ctx = get_context(user_id)
+    return {'userId': user_id, **ctx}
+
+@app.put('/api/context/{user_id}')
+def update_user_context(user_id: str, body: ContextUpdate):
+    ctx = update_context(user_id, preferences=body.preferences, summary=body.conversationSummary,
+                         replace_preferences=body.replacePreferences)
+    return {'userId': user_id, **ctx}
+
+# ---------- Admin: profile đã capture (cần header X-Admin-Token = TRIPIZ_ADMIN_TOKEN) ----------
+def _require_admin(token: Optional[str]):
+    if not profiling.authorized(token):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@app.get('/admin/profiles')
+def admin_profiles(x_admin_token: Optional[str] = Header(None)):
+    _require_admin(x_admin_token)
+    return {'profiles': profiling.list_profiles()}
+
+@app.get('/admin/profiles/{profile_id}')
+def admin_profile(profile_id: str, format: str = 'prof', x_admin_token: Optional[str] = Header(None)):
+    # format=prof: file pstats (snakeviz/pstats), json: tóm tắt + top hàm theo cumtime
+    _require_admin(x_admin_token)
+    try:
+        if format == 'json':
+            return profiling.profile_summary(profile_id)
+        if format == 'prof':
+            return FileResponse(profiling.profile_path(profile_id), media_type='application/octet-stream',
+                                filename=f'{profile_id}.prof')
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} không tồn tại hoặc đã bị xoá")
+    raise HTTPException(status_code=400, detail="format phải là prof hoặc json")
@@ -0,0 +1,237 @@
+"""
+Load test cho /api/chat: throughput + latency p50/p95/p99 theo intent dưới concurrency.
+
+Weather / Wikipedia / LLM được phục vụ bởi stub local (bench/stubs.py).
+
+Chạy từ thư mục python_chatbot:
+    python -m bench.loadtest --requests 500 --concurrency 16                 # in-process (ASGI)
+    python -m bench.loadtest --mode http --spawn --workers 2 --concurrency 32  # uvicorn local
+    python -m bench.loadtest --mode http --url http://127.0.0.1:8001           # server có sẵn
+    python -m bench.loadtest --mix weather=1,lookup=3,plan=1 --json report.json
+    python -m bench.loadtest --mix lookup=1,events=10        # /api/chat cùng lúc với /api/events
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from bench.stubs import StubServer  # noqa: E402
+
+MESSAGES = {
+    "weather": ["Thời tiết hôm nay thế nào", "Hà Nội hôm nay mưa không", "What's the weather today"],
+    "lookup": ["Tìm quán cà phê yên tĩnh", "Gợi ý nhà hàng hải sản", "Find cafes in District 1"],
+    "plan": ["Lên lịch trình 2 ngày", "Plan a 3-day trip", "Tạo lịch trình tham quan 1 ngày"],
+}
+
+
+EVENT_TYPES = ["view", "click", "save", "dismiss"]
+EVENTS_PER_REQUEST = 20
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in filter(None, spec.split(",")):
+        name, _, weight = part.partition("=")
+        if name not in MESSAGES and name != "events":
+            raise ValueError(f"Intent không hỗ trợ trong mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def build_workload(n: int, mix: Dict[str, float], seed: int = 0) -> List[Tuple[str, dict]]:
+    rng = random.Random(seed)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=n)
+    workload = []
+    for i, k in enumerate(kinds):
+        if k == "events":
+            workload.append((k, {"events": [{
+                "type": rng.choice(EVENT_TYPES),
+                "userId": f"load-{i % 50}",
+                "poiId": f"hcm:food:{rng.randrange(300)}",
+            } for _ in range(EVENTS_PER_REQUEST)]}))
+            continue
+        workload.append((k, {
+            "userId": f"load-{i % 50}",
+            "message": rng.choice(MESSAGES[k]),
+            "context": {"preferences": {"city": "Hồ Chí Minh", "days": 2, "budget": 1_500_000}},
+        }))
+    return workload
+
+
+async def _run(client, workload: List[Tuple[str, dict]], concurrency: int, timeout: float):
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in workload:
+        queue.put_nowait(item)
+    samples: List[Tuple[str, float, bool]] = []
+
+    async def worker():
+        while True:
+            try:
+                kind, body = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            t0 = time.perf_counter()
+            ok = False
+            try:
+                if kind == "events":
+                    r = await client.post("/api/events", json=body, timeout=timeout)
+                    ok = r.status_code == 200
+                else:
+                    r = await client.post("/api/chat", json=body, timeout=timeout)
+                    ok = r.status_code == 200 and "error" not in (r.json().get("metadata") or {})
+            except Exception:
+                ok = False
+            samples.append((kind, (time.perf_counter() - t0) * 1000, ok))
+
+    t_start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - t_start
+
+
+def summarize(samples: List[Tuple[str, float, bool]], wall_s: float) -> dict:
+    def stats(rows):
+        lat = np.array([ms for _, ms, _ in rows]) if rows else np.zeros(1)
+        errors = sum(1 for _, _, ok in rows if not ok)
+        return {
+            "count": len(rows),
+            "errors": errors,
+            "error_rate": round(errors / len(rows), 4) if rows else 0.0,
+            "p50_ms": round(float(np.percentile(lat, 50)), 2),
+            "p95_ms": round(float(np.percentile(lat, 95)), 2),
+            "p99_ms": round(float(np.percentile(lat, 99)), 2),
+            "mean_ms": round(float(lat.mean()), 2),
+            "max_ms": round(float(lat.max()), 2),
+        }
+
+    report = {"overall": stats(samples), "per_intent": {}}
+    report["overall"]["rps"] = round(len(samples) / wall_s, 2) if wall_s > 0 else 0.0
+    report["overall"]["wall_s"] = round(wall_s, 3)
+    for kind in sorted({k for k, _, _ in samples}):
+        report["per_intent"][kind] = stats([s for s in samples if s[0] == kind])
+    return report
+
+
+def print_report(report: dict, meta: dict):
+    o = report["overall"]
+    print(f"\nmode={meta['mode']} concurrency={meta['concurrency']} requests={o['count']} "
+          f"wall={o['wall_s']}s rps={o['rps']} error_rate={o['error_rate']:.2%}")
+    print(f"{'intent':<10}{'count':>7}{'err%':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    rows = list(report["per_intent"].items()) + [("ALL", o)]
+    for name, s in rows:
+        print(f"{name:<10}{s['count']:>7}{s['error_rate']:>8.1%}{s['p50_ms']:>10.1f}"
+              f"{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}")
+
+
+async def run_asgi(workload, concurrency: int, timeout: float):
+    import httpx
+    import api  # import sau khi env đã trỏ sang stub
+
+    async with api.app.router.lifespan_context(api.app):
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            return await _run(client, workload, concurrency, timeout)
+
+
+async def run_http(url: str, workload, concurrency: int, timeout: float):
+    import httpx
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits) as client:
+        return await _run(client, workload, concurrency, timeout)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_uvicorn(env: Dict[str, str], workers: int) -> Tuple[subprocess.Popen, str]:
+    import httpx
+
+    port = _free_port()
+    cmd = [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", str(port),
+           "--workers", str(workers), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=BASE_DIR, env={**os.environ, **env})
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"uvicorn thoát sớm (code {proc.returncode})")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return proc, url
+        except httpx.HTTPError:
+            time.sleep(0.3)
+    proc.terminate()
+    raise RuntimeError("uvicorn không sẵn sàng sau 60s")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Load test /api/chat")
+    ap.add_argument("--mode", choices=["asgi", "http"], default="asgi")
+    ap.add_argument("--url", default="", help="URL server có sẵn (mode=http, không --spawn)")
+    ap.add_argument("--spawn", action="store_true", help="tự chạy uvicorn local (mode=http)")
+    ap.add_argument("--workers", type=int, default=1, help="số worker uvicorn khi --spawn")
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--mix", default="weather=1,lookup=3,plan=1")
+    ap.add_argument("--timeout", type=float, default=60.0)
+    ap.add_argument("--warmup", type=int, default=5, help="số request chạy trước, không tính vào báo cáo")
+    ap.add_argument("--weather-ms", type=float, default=None, help="độ trễ stub weather")
+    ap.add_argument("--llm-ms", type=float, default=None, help="độ trễ stub LLM")
+    ap.add_argument("--wiki-ms", type=float, default=None, help="độ trễ stub Wikipedia")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", default="", help="ghi báo cáo JSON ra file")
+    args = ap.parse_args(argv)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    latency = {k: v for k, v in {"weather": args.weather_ms, "llm": args.llm_ms,
+                                 "wikipedia": args.wiki_ms}.items() if v is not None}
+    mix = parse_mix(args.mix)
+    workload = build_workload(args.requests, mix, seed=args.seed)
+    warmup = build_workload(args.warmup, mix, seed=args.seed + 1)
+
+    proc: Optional[subprocess.Popen] = None
+    with StubServer(latency_ms=latency) as stubs:
+        try:
+            if args.mode == "asgi":
+                os.environ.update(stubs.env())
+                os.chdir(BASE_DIR)
+                asyncio.run(run_asgi(warmup, 1, args.timeout))
+                samples, wall = asyncio.run(run_asgi(workload, args.concurrency, args.timeout))
+            else:
+                url = args.url
+                if args.spawn or not url:
+                    proc, url = spawn_uvicorn(stubs.env(), args.workers)
+                asyncio.run(run_http(url, warmup, 1, args.timeout))
+                samples, wall = asyncio.run(run_http(url, workload, args.concurrency, args.timeout))
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait(timeout=10)
+
+    report = summarize(samples, wall)
+    meta = {"mode": args.mode, "concurrency": args.concurrency, "mix": mix, "stub_calls": stubs.calls}
+    print_report(report, meta)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, **report}, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,398 @@
+"""
+Benchmark các hàm lõi theo kích thước dữ liệu (thời gian + peak memory).
+
+Chạy từ thư mục python_chatbot:
+    python -m bench.run_bench                         # so sánh với bench/baselines.json
+    python -m bench.run_bench --sizes 1000,10000,100000,1000000
+    python -m bench.run_bench --update-baseline       # ghi lại baseline sau khi đã review
+    python -m bench.run_bench --check                 # exit code 1 nếu có regression
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+import numpy as np  # noqa: E402
+
+from bench.synthetic import generate_catalog, generate_grid_graph, write_catalog  # noqa: E402
+
+BASELINE_PATH = os.path.join(BASE_DIR, "bench", "baselines.json")
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+DEFAULT_POINTS = [10, 50, 200]
+DEFAULT_MESSAGES = [100, 1_000]
+DEFAULT_ANN_SIZES = [200_000]
+
+INTENT_MESSAGES = [
+    "Thời tiết Đà Lạt hôm nay",
+    "Tìm quán cà phê yên tĩnh ở quận 1",
+    "Lên lịch trình 3 ngày ở Đà Nẵng",
+    "Có gì hay ở gần đây không",
+    "Plan a 2-day trip to Hanoi",
+    "Món nào ngon nhất Sài Gòn",
+]
+
+
+def _measure(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Median thời gian (ms) qua `repeat` lần chạy + peak memory (KB) của một lần chạy riêng."""
+    times = []
+    sink = io.StringIO()
+    with contextlib.redirect_stdout(sink):
+        fn()  # warm-up: import, cache file hệ thống
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            times.append((time.perf_counter() - t0) * 1000)
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return {"time_ms": round(statistics.median(times), 3), "peak_kb": round(peak / 1024, 1)}
+
+
+@contextlib.contextmanager
+def _in_dir(path: str):
+    prev = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(prev)
+
+
+def bench_catalog(sizes: List[int], repeat: int) -> Dict[str, Dict[str, float]]:
+    """recommend_pois() và build_itinerary() trên catalog giả lập nhiều kích thước."""
+    from core.recommender import recommend_pois
+    from core.itinerary import build_itinerary
+
+    results = {}
+    for n in sizes:
+        tmp = tempfile.mkdtemp(prefix="tripiz_bench_")
+        try:
+            write_catalog(generate_catalog(n, seed=n), os.path.join(tmp, "data"))
+            with _in_dir(tmp):
+                rep = repeat if n < 100_000 else 1
+                results[f"recommend_pois[{n}]"] = _measure(lambda: recommend_pois(
+                    city="Hồ Chí Minh",
+                    category="food",
+                    user_query="quán phở ngon",
+                    taste_tags=["Vietnamese"],
+                    activity_tags=["food"],
+                    budget_per_day=1_500_000,
+                ), rep)
+                params = {"city": "Hồ Chí Minh", "days": 3, "budget_vnd": 1_500_000,
+                          "taste_tags": ["Vietnamese"], "activity_tags": ["attraction"]}
+                results[f"build_itinerary[{n}]"] = _measure(
+                    lambda: build_itinerary(params, None, {"description": "nắng nhẹ"}), rep
+                )
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        print(f"  catalog {n:>9,} rows done")
+    return results
+
+
+# Từng phím gõ của vài truy vấn (có dấu và không dấu)
+SUGGEST_TYPED = ["phở bò", "ben thanh", "cà phê lê lợi", "nguyen hue 1", "quán 3"]
+SUGGEST_QUERIES = [t[:i] for t in SUGGEST_TYPED for i in range(1, len(t) + 1)]
+
+
+def bench_suggest(sizes: List[int], repeat: int) -> Dict[str, Dict[str, float]]:
+    """PrefixIndex (core/suggest.py): thời gian dựng + một lượt gõ SUGGEST_QUERIES (mỗi phím một truy vấn)."""
+    from core.suggest import PrefixIndex
+
+    results = {}
+    for n in sizes:
+        df = generate_catalog(n, seed=n)
+        results[f"suggest.build[{n}]"] = _measure(lambda: PrefixIndex.build(df), 1)
+        index = PrefixIndex.build(df)
+
+        def run():
+            for q in SUGGEST_QUERIES:
+                index.search(q, 8)
+
+        results[f"suggest.search[{n}]"] = _measure(run, repeat)
+        per_q = results[f"suggest.search[{n}]"]["time_ms"] * 1000 / len(SUGGEST_QUERIES)
+        print(f"  suggest {n:>9,} rows: {per_q:.0f} µs/truy vấn")
+    return results
+
+
+JSON_RESULT_POIS = 1_000  # số POI trong một response lookup lớn
+
+
+def bench_json(sizes: List[int], repeat: int) -> Dict[str, Dict[str, float]]:
+    """Serialise JSON_RESULT_POIS POI: dict + jsonable_encoder + json (cũ) vs fragment dựng sẵn (core/poi_json.py)."""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    from core.fastjson import dumps
+    from core.poi_json import PoiFragments, public_poi
+
+    results = {}
+    for n in sizes:
+        df = generate_catalog(n, seed=n)
+        df["poi_id"] = [f"bench:{c}:{i}" for i, c in enumerate(df["category"])]
+        results[f"json.build[{n}]"] = _measure(lambda: PoiFragments.build(df), 1)
+        fragments = PoiFragments.build(df)
+        rng = np.random.default_rng(n)
+        records = df.iloc[rng.choice(n, size=min(n, JSON_RESULT_POIS), replace=False)].to_dict(orient="records")
+
+        def old():
+            return JSONResponse(jsonable_encoder({"pois": [public_poi(r) for r in records]})).body
+
+        def new(fields=None):
+            return dumps({"pois": [fragments.fragment(fragments.row(r["poi_id"]), fields) for r in records]})
+
+        results[f"json.dict[{n}]"] = _measure(old, repeat)
+        results[f"json.fragments[{n}]"] = _measure(new, repeat)
+        print(f"  json {n:>9,} rows: {len(old()) / 1024:.0f} KB -> {len(new()) / 1024:.0f} KB "
+              f"({len(new(('poi_id', 'name', 'lat', 'lon'))) / 1024:.0f} KB với fields=poi_id,name,lat,lon)")
+    return results
+
+
+# Khung nhìn ~1000x800px quanh Q1 ở vài mức zoom (cụm -> từng POI)
+VIEWPORT_QUERIES = [((106.45, 10.55, 107.05, 11.0), 11), ((106.62, 10.72, 106.78, 10.84), 13),
+                    ((106.68, 10.765, 106.72, 10.795), 15), ((106.695, 10.772, 106.705, 10.779), 17)]
+
+
+def bench_viewport(sizes: List[int], repeat: int) -> Dict[str, Dict[str, float]]:
+    """ViewportIndex (core/viewport.py): thời gian dựng + VIEWPORT_QUERIES (tất cả và category food)."""
+    from core.viewport import ViewportIndex
+
+    results = {}
+    for n in sizes:
+        df = generate_catalog(n, seed=n)
+        results[f"viewport.build[{n}]"] = _measure(lambda: ViewportIndex.build(df), 1)
+        index = ViewportIndex.build(df)
+
+        def run():
+            for bbox, zoom in VIEWPORT_QUERIES:
+                index.query(bbox, zoom)
+                index.query(bbox, zoom, "food")
+
+        results[f"viewport.query[{n}]"] = _measure(run, repeat)
+        items = max(len(index.query(b, z)["items"]) for b, z in VIEWPORT_QUERIES)
+        print(f"  viewport {n:>9,} rows: tối đa {items} phần tử/khung nhìn")
+    return results
+
+
+ANN_QUERIES = [
+    "quán phở ngon", "sushi Nhật Bản", "hải sản tươi sống", "Vegetarian chay", "nhà hàng Pháp",
+    "lẩu Sài Gòn", "Korean bbq", "món Việt truyền thống", "đồ ăn nhanh giá rẻ", "Indian curry",
+    "bún Bến Thành", "fine-dining Nguyễn Huệ", "cơm Lê Lợi", "Halal", "chinese Hoa Sen",
+]
+
+
+def bench_ann(sizes: List[int], repeat: int) -> Dict[str, Dict[str, float]]:
+    """IVF (core/ann_index.py): thời gian truy hồi + recall@12 so với cosine vét cạn, theo nprobe."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    from core.ann_index import IVFIndex
+
+    results = {}
+    for n in sizes:
+        df = generate_catalog(n, seed=n)
+        df = df[df["category"] == "food"].reset_index(drop=True)
+        text = df["name"].astype(str) + " " + df["tag"].astype(str) + " " + df["description"].astype(str)
+        vec = TfidfVectorizer()
+        M = vec.fit_transform(text)
+        t0 = time.perf_counter()
+        ivf = IVFIndex.build(M)
+        results[f"ann.build[{n}]"] = {"time_ms": round((time.perf_counter() - t0) * 1000, 3),
+                                      "peak_kb": round(ivf.nbytes / 1024, 1)}
+        qs = [vec.transform([q]) for q in ANN_QUERIES]
+        # so khớp theo điểm: hoà điểm ở vị trí 12 không tính là trượt
+        full = [(M @ q.T).toarray().ravel() for q in qs]
+        kth = [np.sort(f)[-12] for f in full]
+
+        def run_exact():
+            for q in qs:
+                (M @ q.T).toarray()
+
+        results[f"ann.exact[{n}]"] = _measure(run_exact, repeat)
+        for nprobe in (1, 4, 8, 16, 32, 64):
+            hits = 0
+            for q, f, k in zip(qs, full, kth):
+                rows, sims = ivf.search(M, q, nprobe)
+                top = rows[np.argsort(-sims, kind="stable")[:12]] if rows is not None else []
+                hits += sum(1 for r in top if f[r] >= k - 1e-9)
+            recall = hits / (12 * len(qs))
+
+            def run(nprobe=nprobe):
+                for q in qs:
+                    ivf.search(M, q, nprobe)
+
+            results[f"ann.search[nprobe={nprobe},{n}]"] = {**_measure(run, repeat), "recall": round(recall, 3)}
+            print(f"  ann {n:>9,} nprobe={nprobe:<3} recall@12={recall:.3f}")
+    return results
+
+
+def bench_routing(points: List[int], repeat: int) -> Dict[str, Dict[str, float]]:
+    """
+    pairwise_distance_matrix() (haversine, graph biên dịch, NetworkX), pairwise_travel_matrix() theo phương tiện,
+    mst_order() và build_routes() theo số POI.
+    """
+    import core.route_optimizer as ro
+    from core.routing import build_routes
+    from core.geo_graph import OSMNX_AVAILABLE
+    from core.graph_compiler import compile_graph
+
+    results = {}
+    grid = generate_grid_graph(60, 80)
+    results["compile_graph[60x80]"] = _measure(lambda: compile_graph(grid), 1)
+    compiled = compile_graph(grid)
+    original_graph_loader = ro.road_graph_for_city
+    for n in points:
+        pois = generate_catalog(n, seed=n)[["name", "lat", "lon"]].to_dict(orient="records")
+
+        def _no_graph(city):
+            raise FileNotFoundError("benchmark: haversine")
+
+        ro.road_graph_for_city = _no_graph
+        try:
+            results[f"pairwise_distance_matrix.haversine[{n}]"] = _measure(
+                lambda: ro.pairwise_distance_matrix("Hồ Chí Minh", pois), repeat
+            )
+            dist, _, _ = ro.pairwise_distance_matrix("Hồ Chí Minh", pois)
+            ro.road_graph_for_city = lambda city: compiled
+            results[f"pairwise_distance_matrix.road[{n}]"] = _measure(
+                lambda: ro.pairwise_distance_matrix("Hồ Chí Minh", pois), repeat
+            )
+            for mode in ("drive", "walk"):
+                results[f"pairwise_travel_matrix.{mode}[{n}]"] = _measure(
+                    lambda: ro.pairwise_travel_matrix("Hồ Chí Minh", pois, mode), repeat
+                )
+            if OSMNX_AVAILABLE and n <= 50:
+                ro.road_graph_for_city = lambda city: grid
+                results[f"pairwise_distance_matrix.road_nx[{n}]"] = _measure(
+                    lambda: ro.pairwise_distance_matrix("Hồ Chí Minh", pois), 1
+                )
+        finally:
+            ro.road_graph_for_city = original_graph_loader
+        results[f"mst_order[{n}]"] = _measure(lambda: ro.mst_order(dist), repeat)
+        # Tuyến theo phong cách (beam search), ma trận haversine vì không truyền city
+        cand = generate_catalog(n, seed=n).assign(final=np.linspace(1, 0, n)).to_dict(orient="records")
+        results[f"build_routes[{n}]"] = _measure(lambda: build_routes(cand, 1_500_000, "normal"), repeat)
+        print(f"  routing {n:>4} points done")
+    return results
+
+
+def bench_intent(batches: List[int], repeat: int) -> Dict[str, Dict[str, float]]:
+    """detect_intent() trên batch tin nhắn (tổng thời gian cho cả batch)."""
+    from core.intent_detector import detect_intent
+
+    results = {}
+    with _in_dir(BASE_DIR):
+        for n in batches:
+            msgs = [INTENT_MESSAGES[i % len(INTENT_MESSAGES)] + f" {i}" for i in range(n)]
+            results[f"detect_intent[{n}]"] = _measure(lambda: [detect_intent(m) for m in msgs], repeat)
+            print(f"  intent {n:>6} messages done")
+    return results
+
+
+def load_baseline(path: str = BASELINE_PATH) -> Dict[str, Dict[str, float]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("results", {})
+
+
+def save_baseline(results: Dict[str, Dict[str, float]], path: str = BASELINE_PATH):
+    payload = {
+        "meta": {
+            "created": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "platform": platform.platform(terse=True),
+        },
+        "results": dict(sorted(results.items())),
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+
+def report(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+           tolerance: float) -> List[str]:
+    """In bảng kết quả; trả về danh sách case bị regression (> tolerance so với baseline)."""
+    regressions = []
+    print(f"\n{'case':<48}{'time ms':>12}{'Δ time':>10}{'peak KB':>12}{'Δ mem':>10}")
+    for key, cur in sorted(results.items()):
+        base: Optional[Dict[str, float]] = baseline.get(key)
+        d_time = d_mem = ""
+        if base:
+            rt = cur["time_ms"] / max(base["time_ms"], 1e-6)
+            rm = cur["peak_kb"] / max(base["peak_kb"], 1e-6)
+            d_time, d_mem = f"{rt - 1:+.0%}", f"{rm - 1:+.0%}"
+            if rt > 1 + tolerance or rm > 1 + tolerance:
+                regressions.append(key)
+        print(f"{key:<48}{cur['time_ms']:>12.2f}{d_time:>10}{cur['peak_kb']:>12.1f}{d_mem:>10}")
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Tripiz core benchmarks")
+    ap.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="kích thước catalog, vd 1000,10000")
+    ap.add_argument("--points", default=",".join(map(str, DEFAULT_POINTS)), help="số POI cho routing")
+    ap.add_argument("--messages", default=",".join(map(str, DEFAULT_MESSAGES)), help="batch tin nhắn cho intent")
+    ap.add_argument("--ann-sizes", default=",".join(map(str, DEFAULT_ANN_SIZES)), help="kích thước catalog cho nhóm ann")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--only", default="", help="chỉ chạy nhóm: catalog,routing,intent,ann,suggest,viewport,json")
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--tolerance", type=float, default=0.3, help="ngưỡng regression (0.3 = chậm hơn 30%%)")
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--check", action="store_true", help="exit 1 nếu có regression")
+    args = ap.parse_args(argv)
+
+    all_groups = {"catalog", "routing", "intent", "ann", "suggest", "viewport", "json"}
+    groups = set(filter(None, args.only.split(","))) or all_groups
+    ints = lambda s: [int(x) for x in s.split(",") if x]  # noqa: E731
+
+    results: Dict[str, Dict[str, float]] = {}
+    if "catalog" in groups:
+        results.update(bench_catalog(ints(args.sizes), args.repeat))
+    if "routing" in groups:
+        results.update(bench_routing(ints(args.points), args.repeat))
+    if "intent" in groups:
+        results.update(bench_intent(ints(args.messages), args.repeat))
+    if "ann" in groups:
+        results.update(bench_ann(ints(args.ann_sizes), args.repeat))
+    if "suggest" in groups:
+        results.update(bench_suggest(ints(args.sizes), args.repeat))
+    if "viewport" in groups:
+        results.update(bench_viewport(ints(args.sizes), args.repeat))
+    if "json" in groups:
+        results.update(bench_json(ints(args.sizes), args.repeat))
+
+    baseline = load_baseline(args.baseline)
+    regressions = report(results, baseline, args.tolerance)
+
+    if args.update_baseline:
+        merged = dict(baseline)
+        merged.update(results)
+        save_baseline(merged, args.baseline)
+        print(f"\n💾 Baseline đã cập nhật: {args.baseline}")
+    elif regressions:
+        print(f"\n⚠️ {len(regressions)} case chậm/tốn bộ nhớ hơn baseline > {args.tolerance:.0%}: {', '.join(regressions)}")
+        if args.check:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
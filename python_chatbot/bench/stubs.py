@@ -0,0 +1,133 @@
+"""
+Server HTTP giả lập cho OpenWeather, Wikipedia và OpenAI (chat completions) – dùng cho
+load test / benchmark để không gọi API thật. Độ trễ mỗi dịch vụ cấu hình được.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_LATENCY_MS = {"weather": 80, "wikipedia": 120, "llm": 600}
+
+
+def _weather_payload(query: Dict[str, list]) -> dict:
+    city = (query.get("q") or ["Ho Chi Minh City"])[0].split(",")[0]
+    return {
+        "cod": 200,
+        "name": city,
+        "main": {"temp": 30.5, "humidity": 70},
+        "weather": [{"description": "mây rải rác"}],
+    }
+
+
+def _wikipedia_payload(query: Dict[str, list]) -> dict:
+    title = (query.get("titles") or [""])[0]
+    return {"query": {"pages": {"1": {
+        "title": title,
+        "thumbnail": {"source": "https://example.invalid/wiki/thumb.jpg"},
+        "extract": f"{title} là một địa điểm nổi tiếng.",
+    }}}}
+
+
+def _llm_payload(body: dict) -> dict:
+    messages = body.get("messages") or []
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    # llm_parser yêu cầu JSON tham số; các lời gọi khác nhận text thường
+    if "JSON" in system:
+        content = json.dumps({"city": "Hồ Chí Minh", "budget_vnd": 1500000, "days": 2, "taste_tags": [],
+                              "activity_tags": [], "walk_tolerance_km": 5.0, "transport": "xe máy/ô tô"},
+                             ensure_ascii=False)
+    else:
+        content = "Đây là phản hồi giả lập từ stub LLM."
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+class StubServer:
+    """
+    Chạy server giả lập trên một thread nền.
+    >>> with StubServer() as stubs:
+    ...     os.environ.update(stubs.env())
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: Optional[Dict[str, float]] = None):
+        self.latency_ms = dict(DEFAULT_LATENCY_MS)
+        self.latency_ms.update(latency_ms or {})
+        self.calls = {"weather": 0, "wikipedia": 0, "llm": 0}
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, fmt, *args):  # im lặng
+                pass
+
+            def _send(self, service: str, payload: dict):
+                stub.calls[service] += 1
+                time.sleep(stub.latency_ms.get(service, 0) / 1000)
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path.startswith("/weather"):
+                    self._send("weather", _weather_payload(query))
+                elif url.path.startswith("/wikipedia"):
+                    self._send("wikipedia", _wikipedia_payload(query))
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send("llm", _llm_payload(body))
+                else:
+                    self.send_error(404)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """Biến môi trường để core trỏ sang stub (phải set trước khi import core)."""
+        return {
+            "OPENWEATHER_API_KEY": "stub",
+            "OPENWEATHER_URL": f"{self.base_url}/weather",
+            "WIKIPEDIA_API_URL": f"{self.base_url}/wikipedia",
+            "OPENAI_API_KEY": "stub",
+            "OPENAI_BASE_URL": f"{self.base_url}/v1",
+        }
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,192 @@
+"""
+Sinh dữ liệu giả lập cho benchmark: catalog POI (cùng cột với data/pois_hcm_*.csv)
+và road graph dạng lưới trong bbox của thành phố.
+"""
+import math
+import os
+from typing import Dict, Tuple
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+# (north, south, east, west) – giống bbox_by_city trong core
+HCM_BBOX = (10.85, 10.70, 106.83, 106.63)
+
+CATALOG_COLUMNS = [
+    "name", "tag", "avg_cost", "description", "lat", "lon", "address", "opening_hours",
+    "image_url1", "image_url2", "rating", "reviews", "extra_website",
+]
+
+# Phân bố category gần với data thật (~340 dòng)
+CATEGORY_SHARE = {
+    "food": 0.32,
+    "cafe": 0.12,
+    "entertainment": 0.17,
+    "shopping": 0.11,
+    "attraction": 0.28,
+}
+
+TAGS = {
+    "food": ["Casual dining", "vietnamese", "Japanese", "Indian", "Korean", "Seafood",
+             "French", "Western", "Vegetarian", "fine-dining", "chinese", "Halal"],
+    "cafe": ["Coffee shop", "Coffee shop", "Coffee shop", "Animals, coffee shop"],
+    "entertainment": ["Active", "Fun", "Mystery", "Nature"],
+    "shopping": ["mall", "market", "souvenir", "fashion"],
+    "attraction": ["religious", "nature", "landmark", "entertainment", "cultural",
+                   "viewpoint", "park", "market", "museum"],
+}
+
+COST_RANGE = {
+    "food": (80_000, 800_000),
+    "cafe": (60_000, 300_000),
+    "entertainment": (100_000, 600_000),
+    "shopping": (0, 500_000),
+    "attraction": (0, 200_000),
+}
+
+NAME_HEAD = {
+    "food": ["Quán", "Nhà hàng", "Bếp", "Cơm", "Phở", "Bún", "Lẩu", "Sushi"],
+    "cafe": ["Cà phê", "Cafe", "Trà", "Coffee"],
+    "entertainment": ["Khu vui chơi", "Escape room", "Bowling", "Rạp", "Game center"],
+    "shopping": ["Chợ", "TTTM", "Cửa hàng", "Shop"],
+    "attraction": ["Nhà thờ", "Chùa", "Bảo tàng", "Công viên", "Đền", "Dinh"],
+}
+NAME_TAIL = ["Sài Gòn", "Bến Thành", "Hoa Sen", "Phố Cổ", "Ngọc Lan", "Mây", "Gió", "Sông Xanh",
+             "Hạnh Phúc", "Thiên Long", "Bình Minh", "An Nhiên", "Đông Du", "Lê Lợi", "Nguyễn Huệ"]
+STREETS = ["Lê Lợi", "Nguyễn Huệ", "Pasteur", "Hai Bà Trưng", "Điện Biên Phủ", "Võ Văn Tần",
+           "Nguyễn Trãi", "Cách Mạng Tháng 8", "Lý Tự Trọng", "Tú Xương"]
+DESCRIPTIONS = {
+    "food": ["Món Việt truyền thống, không gian ấm cúng", "Ẩm thực địa phương nổi tiếng",
+             "Hải sản tươi sống mỗi ngày", "Đồ ăn nhanh giá rẻ"],
+    "cafe": ["Quán cà phê yên tĩnh, thích hợp để thư giãn", "Cà phê rang xay, có view đẹp"],
+    "entertainment": ["Hoạt động vui chơi cho nhóm bạn", "Trò chơi giải đố hấp dẫn"],
+    "shopping": ["Mua sắm quần áo, quà lưu niệm", "Khu chợ sầm uất với nhiều gian hàng"],
+    "attraction": ["Công trình kiến trúc lịch sử", "Không gian xanh mát, lý tưởng để đi dạo",
+                   "Nơi lưu giữ nhiều giá trị văn hóa, lịch sử"],
+}
+
+
+def generate_catalog(n: int, bbox: Tuple[float, float, float, float] = HCM_BBOX, seed: int = 0) -> pd.DataFrame:
+    """
+    Sinh n POI giả lập trong bbox. Toạ độ lấy theo vài cụm (quận) để giống phân bố thật.
+    Cột 'category' được thêm để tách file theo category khi ghi ra đĩa.
+    """
+    rng = np.random.default_rng(seed)
+    north, south, east, west = bbox
+    cats = np.array(list(CATEGORY_SHARE))
+    category = rng.choice(cats, size=n, p=np.array(list(CATEGORY_SHARE.values())))
+
+    # Cụm trung tâm (quận) + nhiễu gauss, cắt theo bbox
+    n_clusters = max(4, int(math.sqrt(n) // 4))
+    centers_lat = rng.uniform(south, north, n_clusters)
+    centers_lon = rng.uniform(west, east, n_clusters)
+    which = rng.integers(0, n_clusters, n)
+    spread = 0.012
+    lat = np.clip(centers_lat[which] + rng.normal(0, spread, n), south, north)
+    lon = np.clip(centers_lon[which] + rng.normal(0, spread, n), west, east)
+
+    tag = np.empty(n, dtype=object)
+    avg_cost = np.zeros(n, dtype=np.int64)
+    name = np.empty(n, dtype=object)
+    description = np.empty(n, dtype=object)
+    tails = np.array(NAME_TAIL, dtype=object)
+    for cat in cats:
+        mask = category == cat
+        m = int(mask.sum())
+        if not m:
+            continue
+        tag[mask] = rng.choice(np.array(TAGS[cat], dtype=object), m)
+        lo, hi = COST_RANGE[cat]
+        avg_cost[mask] = (rng.integers(lo // 10_000, hi // 10_000 + 1, m) * 10_000)
+        heads = rng.choice(np.array(NAME_HEAD[cat], dtype=object), m)
+        name[mask] = heads + " " + rng.choice(tails, m)
+        description[mask] = rng.choice(np.array(DESCRIPTIONS[cat], dtype=object), m)
+
+    # Tên trùng nhau nhiều ở catalog lớn – thêm số thứ tự cho giống chi nhánh thật
+    idx = np.arange(n).astype(str).astype(object)
+    name = name + " " + idx
+    street_no = rng.integers(1, 400, n).astype(str).astype(object)
+    address = street_no + " " + rng.choice(np.array(STREETS, dtype=object), n) + ", Quận " + \
+        rng.integers(1, 13, n).astype(str).astype(object)
+    open_h = rng.integers(6, 11, n)
+    close_h = rng.integers(20, 24, n)
+    opening_hours = [f"{o}:00-{c}:00" for o, c in zip(open_h, close_h)]
+
+    df = pd.DataFrame({
+        "name": name,
+        "tag": tag,
+        "avg_cost": avg_cost,
+        "description": description,
+        "lat": lat,
+        "lon": lon,
+        "address": address,
+        "opening_hours": opening_hours,
+        "image_url1": "https://example.invalid/img/" + idx + "_1.jpg",
+        "image_url2": "https://example.invalid/img/" + idx + "_2.jpg",
+        "rating": np.round(rng.uniform(3.0, 5.0, n), 1),
+        "reviews": rng.integers(0, 5000, n),
+        "extra_website": "",
+        "category": category,
+    })
+    return df
+
+
+def write_catalog(df: pd.DataFrame, out_dir: str, slug: str = "hcm") -> Dict[str, str]:
+    """Ghi catalog ra các file pois_<slug>_<category>.csv giống layout của data/."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+    for cat, part in df.groupby("category"):
+        path = os.path.join(out_dir, f"pois_{slug}_{cat}.csv")
+        part[CATALOG_COLUMNS].to_csv(path, index=False)
+        paths[cat] = path
+    return paths
+
+
+def generate_grid_graph(rows: int, cols: int, bbox: Tuple[float, float, float, float] = HCM_BBOX,
+                        oneway_share: float = 0.15, seed: int = 0) -> nx.MultiDiGraph:
+    """
+    Sinh road graph dạng lưới rows x cols trong bbox, cùng schema với graph osmnx
+    (node có x/y, cạnh có length (m) và highway). Một phần cạnh là một chiều.
+    """
+    rng = np.random.default_rng(seed)
+    north, south, east, west = bbox
+    lats = np.linspace(south, north, rows)
+    lons = np.linspace(west, east, cols)
+    G = nx.MultiDiGraph(crs="epsg:4326")
+
+    def nid(r, c):
+        return r * cols + c
+
+    for r in range(rows):
+        for c in range(cols):
+            # Lệch nhẹ để các khối phố không hoàn toàn đều
+            G.add_node(nid(r, c), y=float(lats[r] + rng.normal(0, 1e-4)), x=float(lons[c] + rng.normal(0, 1e-4)))
+
+    def add_street(u, v, highway):
+        y1, x1 = G.nodes[u]["y"], G.nodes[u]["x"]
+        y2, x2 = G.nodes[v]["y"], G.nodes[v]["x"]
+        length = _haversine_m(y1, x1, y2, x2)
+        G.add_edge(u, v, length=length, highway=highway, oneway=False)
+        if rng.random() >= oneway_share:
+            G.add_edge(v, u, length=length, highway=highway, oneway=False)
+        else:
+            G[u][v][0]["oneway"] = True
+
+    for r in range(rows):
+        for c in range(cols):
+            # Cứ 5 hàng/cột có một trục chính
+            if c + 1 < cols:
+                add_street(nid(r, c), nid(r, c + 1), "primary" if r % 5 == 0 else "residential")
+            if r + 1 < rows:
+                add_street(nid(r, c), nid(r + 1, c), "primary" if c % 5 == 0 else "residential")
+    return G
+
+
+def _haversine_m(lat1, lon1, lat2, lon2):
+    R = 6371000
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))
@@ -0,0 +1,101 @@
+"""
+Truy hồi văn bản xấp xỉ (ANN) cho catalog lớn: IVF trên phép chiếu dày của ma trận TF-IDF.
+
+- Chiếu TF-IDF (thưa, nhiều chiều) xuống ANN_DIM chiều bằng TruncatedSVD (fit trên mẫu)
+- Gom cụm các vector đã chiếu (MiniBatchKMeans, cosine) thành n_lists danh sách đảo (IVF)
+- Truy vấn: chọn `nprobe` cụm gần query nhất, chấm lại cosine CHÍNH XÁC trên TF-IDF
+  cho các dòng trong các cụm đó -> thứ hạng trong shortlist giống hệt tìm kiếm vét cạn
+- nprobe lớn hơn = recall cao hơn, chậm hơn (nprobe = n_lists tương đương vét cạn)
+"""
+import math
+import os
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+
+ANN_MIN_ROWS = int(os.getenv("TRIPIZ_ANN_MIN_ROWS", "20000"))  # nhỏ hơn -> tìm vét cạn
+ANN_NPROBE = int(os.getenv("TRIPIZ_ANN_NPROBE", "16"))
+ANN_DIM = 64
+ANN_FIT_SAMPLE = 50_000
+ANN_ASSIGN_CHUNK = 100_000
+
+
+def _normalize_rows(Z: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(Z, axis=1, keepdims=True)
+    return Z / np.maximum(norms, 1e-12)
+
+
+class IVFIndex:
+    """Chỉ mục IVF: ma trận chiếu, tâm cụm và danh sách dòng của từng cụm (CSR-like)."""
+
+    def __init__(self, components: np.ndarray, centroids: np.ndarray, list_rows: np.ndarray,
+                 list_start: np.ndarray, build_s: float = 0.0):
+        self.projection = np.ascontiguousarray(components.T)  # (vocab, dim) float32
+        self.centroids = centroids        # (n_lists, dim) float32, đã L2-normalize
+        self.list_rows = list_rows        # dòng sắp theo cụm, int32
+        self.list_start = list_start      # (n_lists + 1,) offset vào list_rows
+        self.build_s = build_s
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.projection.nbytes + self.centroids.nbytes + self.list_rows.nbytes + self.list_start.nbytes)
+
+    @classmethod
+    def build(cls, M, n_lists: Optional[int] = None, dim: int = ANN_DIM, seed: int = 0) -> "IVFIndex":
+        """M: ma trận TF-IDF (CSR, dòng đã L2-normalize)."""
+        t0 = time.perf_counter()
+        n = M.shape[0]
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(n, size=min(n, ANN_FIT_SAMPLE), replace=False))
+        dim = max(1, min(dim, M.shape[1] - 1, len(sample) - 1))
+        svd = TruncatedSVD(n_components=dim, random_state=seed).fit(M[sample])
+        components = svd.components_.astype(np.float32)
+
+        n_lists = n_lists or int(min(4096, max(16, 4 * math.sqrt(n))))
+        n_lists = min(n_lists, len(sample))
+        projection = np.ascontiguousarray(components.T)
+        Zs = _normalize_rows(np.asarray(M[sample] @ projection, dtype=np.float32))
+        km = MiniBatchKMeans(n_clusters=n_lists, random_state=seed, batch_size=4096, n_init=1).fit(Zs)
+        centroids = _normalize_rows(km.cluster_centers_.astype(np.float32))
+
+        labels = np.empty(n, dtype=np.int32)
+        for lo in range(0, n, ANN_ASSIGN_CHUNK):
+            Z = _normalize_rows(np.asarray(M[lo:lo + ANN_ASSIGN_CHUNK] @ projection, dtype=np.float32))
+            labels[lo:lo + len(Z)] = np.argmax(Z @ centroids.T, axis=1)
+
+        order = np.argsort(labels, kind="stable").astype(np.int32)
+        counts = np.bincount(labels, minlength=n_lists)
+        list_start = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(components, centroids, order, list_start, time.perf_counter() - t0)
+
+    def candidates(self, q, nprobe: int = ANN_NPROBE) -> Optional[np.ndarray]:
+        """Các dòng thuộc `nprobe` cụm gần query nhất (đã sắp tăng dần); None nếu query rỗng sau khi chiếu."""
+        # chỉ các term có trong query: O(nnz(q) * dim), không đụng tới cả ma trận chiếu
+        q = q.tocsr()
+        zq = q.data.astype(np.float32) @ self.projection[q.indices]
+        norm = np.linalg.norm(zq)
+        if norm < 1e-12:
+            return None
+        scores = self.centroids @ (zq / norm)
+        nprobe = min(max(1, nprobe), self.n_lists)
+        probe = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        rows = np.concatenate([self.list_rows[self.list_start[c]:self.list_start[c + 1]] for c in probe])
+        rows.sort()
+        return rows
+
+    def search(self, M, q, nprobe: int = ANN_NPROBE) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """(rows, cosine chính xác trên TF-IDF cho các rows); (None, None) nếu không truy hồi được."""
+        if q.nnz == 0:
+            return None, None
+        rows = self.candidates(q, nprobe)
+        if rows is None or not len(rows):
+            return None, None
+        sims = (M[rows] @ q.T).toarray().ravel()
+        return rows, sims
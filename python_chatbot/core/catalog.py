@@ -0,0 +1,588 @@
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from .cities import city_key, city_name, city_slug, fold
+from . import metrics
+from .graph_compiler import compiled_path, load_compiled_graph
+from .ann_index import ANN_MIN_ROWS, IVFIndex
+from .suggest import PrefixIndex, build_prefix_index
+from .viewport import ViewportIndex, build_viewport_index
+from .poi_json import PoiFragments, build_poi_fragments
+from .poi_record import compact_frame
+from . import shared_store
+from . import singleflight
+
+# Catalog chia theo thành phố (shard): mỗi shard giữ DataFrame từng category, TF-IDF index
+# và road graph (load khi cần). Các shard nằm trong LRU giới hạn theo bộ nhớ.
+
+DATA_DIR = "data"
+OSM_SUBDIR = "osm"
+CATEGORIES = ("food", "cafe", "entertainment", "shopping", "attraction")
+CATALOG_MAX_BYTES = int(float(os.getenv("TRIPIZ_CATALOG_MAX_MB", "512")) * 1024 * 1024)
+
+DEFAULT_COST = 200000
+NUMERIC_COLUMNS = ("lat", "lon", "avg_cost", "rating", "reviews")
+
+# Loại OSM (amenity/tourism/leisure/shop) -> category của catalog
+OSM_CATEGORY = {
+    "restaurant": "food",
+    "fast_food": "food",
+    "food_court": "food",
+    "cafe": "cafe",
+    "bar": "entertainment",
+    "pub": "entertainment",
+    "nightclub": "entertainment",
+    "cinema": "entertainment",
+    "theatre": "entertainment",
+    "theme_park": "entertainment",
+    "zoo": "entertainment",
+    "water_park": "entertainment",
+    "marketplace": "shopping",
+    "mall": "shopping",
+    "department_store": "shopping",
+    "supermarket": "shopping",
+    "gift": "shopping",
+    "clothes": "shopping",
+    "attraction": "attraction",
+    "museum": "attraction",
+    "gallery": "attraction",
+    "viewpoint": "attraction",
+    "artwork": "attraction",
+    "park": "attraction",
+    "garden": "attraction",
+    "place_of_worship": "attraction",
+}
+
+SHARD_LOADS = metrics.counter("tripiz_catalog_shard_loads_total", "Số lần load shard catalog", ("city",))
+SHARD_EVICTIONS = metrics.counter("tripiz_catalog_shard_evictions_total", "Số shard bị LRU loại", ("city",))
+_SHARD_FLIGHT = singleflight.group("catalog_shard")
+_GRAPH_FLIGHT = singleflight.group("compiled_graph")
+
+SHARD_BYTES = metrics.gauge("tripiz_catalog_shard_bytes", "Bộ nhớ ước tính của shard đang giữ", ("city",))
+
+
+def shard_sources(slug: str, data_dir: str = DATA_DIR) -> Dict[str, str]:
+    """
+    File nguồn của shard theo category: pois_<slug>_<category>.csv trong data/ (dữ liệu tuyển chọn),
+    nếu thiếu thì lấy bản ingest từ OSM trong data/osm/ (xem core.osm_ingest);
+    fallback cuối là file cache đơn pois_cache_<slug>.csv.
+    """
+    files = {}
+    for cat in CATEGORIES:
+        for folder in (data_dir, os.path.join(data_dir, OSM_SUBDIR)):
+            path = os.path.join(folder, f"pois_{slug}_{cat}.csv")
+            if os.path.exists(path):
+                files[cat] = path
+                break
+    if not files:
+        legacy = os.path.join(data_dir, f"pois_cache_{slug}.csv")
+        if os.path.exists(legacy):
+            files["*"] = legacy
+    return files
+
+
+def _normalize(df: pd.DataFrame, category: str, city: str, slug: str, source_file: str,
+               compact: bool = True) -> pd.DataFrame:
+    """
+    Chuẩn hoá kiểu dữ liệu một lần lúc load (CSV thật có lat/avg_cost dạng chuỗi, thiếu cột tag...).
+    compact: float32/int32/categorical/chuỗi intern (xem poi_record.compact_frame).
+    """
+    df = df.copy()
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    if {"lat", "lon"} <= set(df.columns):
+        df = df[df["lat"].notna() & df["lon"].notna()]
+
+    if "tag" not in df.columns:
+        df["tag"] = category
+    df["tag"] = df["tag"].fillna(category)
+    if "avg_cost" not in df.columns:
+        df["avg_cost"] = DEFAULT_COST
+    df["avg_cost"] = df["avg_cost"].fillna(DEFAULT_COST)
+    df["category"] = category
+    df["city"] = city
+    df["city_norm"] = fold(city)
+    df["source_file"] = os.path.basename(source_file)
+    df["poi_id"] = _stable_ids(df, slug, category)
+    df = df.reset_index(drop=True)
+    return compact_frame(df) if compact else df
+
+
+def _stable_ids(df: pd.DataFrame, slug: str, category: str) -> List[str]:
+    """
+    poi_id = <slug>:<category>:<key>, key = osm_id nếu có, không thì hash(tên, toạ độ 6 chữ số).
+    Không phụ thuộc số dòng CSV -> sửa/chèn dòng khác (hot reload) không làm id của POI cũ trỏ sang POI khác.
+    Trùng khoá (cùng tên + toạ độ) thêm hậu tố -1, -2... theo thứ tự xuất hiện.
+    """
+    names = df["name"].astype(str).tolist() if "name" in df.columns else [""] * len(df)
+    lats = df["lat"].tolist() if "lat" in df.columns else [0.0] * len(df)
+    lons = df["lon"].tolist() if "lon" in df.columns else [0.0] * len(df)
+    osm = df["osm_id"].tolist() if "osm_id" in df.columns else [None] * len(df)
+    keys = []
+    for name, lat, lon, oid in zip(names, lats, lons, osm):
+        if isinstance(oid, str) and oid:
+            keys.append(oid)
+        else:
+            raw = f"{name}|{float(lat):.6f}|{float(lon):.6f}".encode("utf-8")
+            keys.append(hashlib.blake2b(raw, digest_size=6).hexdigest())
+    seen: Dict[str, int] = {}
+    out = []
+    for key in keys:
+        n = seen.get(key, 0)
+        seen[key] = n + 1
+        out.append(f"{slug}:{category}:{key}" if n == 0 else f"{slug}:{category}:{key}-{n}")
+    return out
+
+
+def _text_nbytes(index) -> int:
+    vec, M = index
+    vocab = sum(sys.getsizeof(k) + 28 for k in vec.vocabulary_) if hasattr(vec, "vocabulary_") else 0
+    return M.data.nbytes + M.indices.nbytes + M.indptr.nbytes + vocab
+
+
+class CityShard:
+    """Dữ liệu của một thành phố: DataFrame theo category + index dựng lười (TF-IDF, road graph)."""
+
+    def __init__(self, key: str, name: str, slug: str, data_dir: str, frames: Dict[str, pd.DataFrame],
+                 sources: Dict[str, str]):
+        self.key = key
+        self.name = name
+        self.slug = slug
+        self.data_dir = data_dir
+        self.frames = frames
+        self.sources = sources
+        self.version = source_version(name, sources, data_dir)
+        self.loaded_at = time.time()
+        self._combined: Optional[pd.DataFrame] = None
+        self._poi_meta: Optional[pd.DataFrame] = None
+        self._text: Dict[str, Tuple[TfidfVectorizer, object]] = {}
+        self._ann: Dict[str, Optional[IVFIndex]] = {}
+        self._suggest: Optional[PrefixIndex] = None
+        self._viewport: Optional[ViewportIndex] = None
+        self._fragments: Optional[PoiFragments] = None
+        self._graph = None
+        self._graph_bytes = 0
+        self._lock = threading.Lock()
+        self.bundle: Optional[shared_store.Bundle] = None  # bundle dùng chung (mmap) nếu attach
+        self._checked_at = time.monotonic()
+
+    def attach_bundle(self, bundle: "shared_store.Bundle"):
+        """Dùng index đã publish (TF-IDF, autocomplete, JSON fragment, graph) thay vì dựng lại trong worker này."""
+        self.bundle = bundle
+        self._text = shared_store.read_text(bundle)
+        self._suggest = shared_store.read_suggest(bundle, self.frames)
+        self._fragments = shared_store.read_fragments(bundle, self.frames)
+
+    def stale(self) -> bool:
+        """Shard dùng chung mà CURRENT đã trỏ sang version khác (đọc CURRENT tối đa mỗi SHARED_POLL_S giây)."""
+        if self.bundle is None:
+            return False
+        now = time.monotonic()
+        if now - self._checked_at < shared_store.SHARED_POLL_S:
+            return False
+        self._checked_at = now
+        current = shared_store.current_version(self.slug)
+        return current is not None and current != self.bundle.version
+
+    def category(self, category: str) -> pd.DataFrame:
+        category = category.lower()
+        if category not in CATEGORIES:
+            raise ValueError(f"Không có dữ liệu cho category: {category}")
+        df = self.frames.get(category)
+        if df is None:
+            raise FileNotFoundError(f"Không có dữ liệu {category} cho {self.name}")
+        return df
+
+    def combined(self) -> pd.DataFrame:
+        if self._combined is None:
+            self._combined = pd.concat(list(self.frames.values()), ignore_index=True)
+        return self._combined
+
+    def poi_meta(self, poi_id: str) -> Optional[Tuple[str, str]]:
+        """(tag, category) của một POI theo poi_id, None nếu không có."""
+        if self._poi_meta is None:
+            df = self.combined()
+            self._poi_meta = df.drop_duplicates("poi_id").set_index("poi_id")[["tag", "category"]]
+        try:
+            tag, category = self._poi_meta.loc[poi_id]
+        except KeyError:
+            return None
+        return str(tag), str(category)
+
+    def text_index(self, category: str):
+        """TF-IDF (vectorizer, ma trận đã L2-normalize) trên name + tag + description, cache theo category."""
+        index = self._text.get(category)
+        if index is not None:
+            return index
+        with self._lock:
+            index = self._text.get(category)
+            if index is None:
+                df = self.category(category)
+                text = df["name"].fillna("").astype(str) + " " + df["tag"].astype(object).fillna("").astype(str) + " " + \
+                    df.get("description", pd.Series([""] * len(df))).fillna("").astype(str)
+                vec = TfidfVectorizer(stop_words=None)
+                try:
+                    M = vec.fit_transform(text)
+                except ValueError:
+                    # toàn stop word / rỗng -> không có vocabulary
+                    vec, M = None, None
+                index = self._text[category] = (vec, M)
+        return index
+
+    def ann_index(self, category: str) -> Optional[IVFIndex]:
+        """IVF trên TF-IDF của category (chỉ dựng khi đủ ANN_MIN_ROWS dòng; nhỏ hơn -> None = vét cạn)."""
+        if category in self._ann:
+            return self._ann[category]
+        vec, M = self.text_index(category)
+        with self._lock:
+            if category not in self._ann:
+                index = None
+                if vec is not None and M.shape[0] >= ANN_MIN_ROWS:
+                    index = IVFIndex.build(M)
+                    print(f"⚡ ANN index {self.name}/{category}: {M.shape[0]} dòng, "
+                          f"{index.n_lists} cụm, {index.build_s:.1f}s")
+                self._ann[category] = index
+        _STORE.enforce_budget(keep=self.cache_key)
+        return self._ann[category]
+
+    def suggest_index(self) -> Optional[PrefixIndex]:
+        """Index tiền tố (tên + địa chỉ) cho autocomplete; dựng lúc load shard."""
+        if self._suggest is None and self.frames:
+            with self._lock:
+                if self._suggest is None:
+                    self._suggest = build_prefix_index(pd.concat(list(self.frames.values()), ignore_index=True))
+        return self._suggest
+
+    def viewport_index(self) -> Optional[ViewportIndex]:
+        """Lưới cụm theo zoom + index không gian cho /api/pois (dựng lần đầu khi cần)."""
+        if self._viewport is None and self.frames:
+            with self._lock:
+                if self._viewport is None:
+                    self._viewport = build_viewport_index(pd.concat(list(self.frames.values()), ignore_index=True))
+                    print(f"⚡ Viewport index {self.name}: {self._viewport.build_s * 1000:.0f} ms")
+            _STORE.enforce_budget(keep=self.cache_key)
+        return self._viewport
+
+    def poi_fragments(self) -> Optional[PoiFragments]:
+        """JSON công khai serialise sẵn của từng POI (theo poi_id); dựng lúc load shard."""
+        if self._fragments is None and self.frames:
+            with self._lock:
+                if self._fragments is None:
+                    self._fragments = build_poi_fragments(pd.concat(list(self.frames.values()), ignore_index=True))
+        return self._fragments
+
+    def graph(self):
+        """Road graph đã biên dịch (CompiledGraph), load lần đầu khi cần (raise nếu không có cache)."""
+        if self._graph is None:
+            # single-flight thay cho self._lock: load graph lâu không chặn các index khác của shard
+            _GRAPH_FLIGHT.do((self.cache_key, id(self)), self._load_graph)
+            _STORE.enforce_budget(keep=self.cache_key)
+        return self._graph
+
+    def _load_graph(self):
+        if self._graph is None:
+            G = shared_store.read_graph(self.bundle) if self.bundle is not None else None
+            if G is None:
+                G = load_compiled_graph(self.name, self.data_dir)
+            self._graph_bytes = G.nbytes
+            self._graph = G
+
+    def warm(self, like: Optional["CityShard"] = None):
+        """Dựng sẵn TF-IDF mọi category, autocomplete, JSON fragment; viewport/ANN/graph nếu `like` đã dựng."""
+        for cat in self.frames:
+            self.text_index(cat)
+        self.suggest_index()
+        self.poi_fragments()
+        if like is None:
+            return
+        if like._viewport is not None:
+            self.viewport_index()
+        for cat, index in list(like._ann.items()):
+            if index is not None:
+                self.ann_index(cat)
+        if like._graph is not None:
+            self.graph()
+
+    @property
+    def cache_key(self) -> Tuple[str, str]:
+        return (os.path.abspath(self.data_dir), self.key)
+
+    def nbytes(self) -> int:
+        """Footprint đo được: DataFrame (deep) + TF-IDF + road graph (ước lượng)."""
+        total = sum(int(df.memory_usage(deep=True).sum()) for df in self.frames.values())
+        if self._combined is not None:
+            total += int(self._combined.memory_usage(deep=True).sum())
+        total += sum(_text_nbytes(ix) for ix in self._text.values() if ix[0] is not None)
+        total += sum(ix.nbytes for ix in self._ann.values() if ix is not None)
+        if self._suggest is not None:
+            total += self._suggest.nbytes
+        if self._viewport is not None:
+            total += self._viewport.nbytes
+        if self._fragments is not None:
+            total += self._fragments.nbytes
+        return total + self._graph_bytes
+
+    def stats(self) -> Dict:
+        return {
+            "city": self.name,
+            "slug": self.slug,
+            "version": self.version,
+            "rows": {cat: len(df) for cat, df in self.frames.items()},
+            "bytes": self.nbytes(),
+            "graph_loaded": self._graph is not None,
+            "text_indexes": sorted(self._text),
+            "ann_indexes": sorted(c for c, ix in self._ann.items() if ix is not None),
+            "suggest_terms": len(self._suggest.vocab) if self._suggest is not None else 0,
+            "viewport_index": self._viewport is not None,
+            "poi_fragments_bytes": self._fragments.nbytes if self._fragments is not None else 0,
+            "shared_version": self.bundle.version if self.bundle is not None else None,
+        }
+
+
+def graph_source(city: str, data_dir: str = DATA_DIR) -> Optional[str]:
+    """File nguồn road graph của thành phố: GraphML, hoặc .npz nếu chỉ có bản đã biên dịch."""
+    from . import geo_graph
+
+    for path in (geo_graph._get_graph_cache_path(city, data_dir), compiled_path(city, data_dir)):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def source_version(city: str, sources: Dict[str, str], data_dir: str = DATA_DIR) -> str:
+    """Version dữ liệu nguồn của shard: CSV + road graph (đổi file nào cũng ra version mới)."""
+    graph = graph_source(city, data_dir)
+    return _sources_version({**sources, "graph": graph} if graph else sources)
+
+
+def _sources_version(sources: Dict[str, str]) -> str:
+    """Version ổn định giữa các process: hash(tên file, mtime, size) của file nguồn."""
+    parts = []
+    for _, path in sorted(sources.items()):
+        st = os.stat(path)
+        parts.append(f"{os.path.basename(path)}:{st.st_mtime_ns}:{st.st_size}")
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:10]
+
+
+def load_shard(city: str, data_dir: str = DATA_DIR, shared: bool = True) -> CityShard:
+    key = city_key(city) or fold(city)
+    slug = city_slug(city)
+    name = city_name(city)
+    sources = shard_sources(slug, data_dir)
+    if not sources:
+        raise FileNotFoundError(
+            f"❌ Không có dữ liệu POI cho {name}: thiếu {data_dir}/pois_{slug}_<category>.csv "
+            f"hoặc {data_dir}/pois_cache_{slug}.csv"
+        )
+    if shared and shared_store.enabled():
+        return _attach_shared(city, key, name, slug, data_dir, sources)
+
+    frames: Dict[str, pd.DataFrame] = {}
+    if "*" in sources:
+        # Cache đơn từ OSM: cột category là loại OSM -> map sang category catalog
+        raw = pd.read_csv(sources["*"])
+        osm_type = raw.get("category", pd.Series(["attraction"] * len(raw))).astype(str)
+        cats = osm_type.map(OSM_CATEGORY).fillna("attraction")
+        if "tag" not in raw.columns:
+            raw["tag"] = osm_type
+        for cat in CATEGORIES:
+            part = raw[cats == cat].drop(columns=["category", "city"], errors="ignore")
+            if len(part):
+                frames[cat] = _normalize(part, cat, name, slug, sources["*"])
+    else:
+        for cat, path in sources.items():
+            frames[cat] = _normalize(pd.read_csv(path), cat, name, slug, path)
+
+    print(f"⚡ Loaded shard {name}: {sum(len(f) for f in frames.values())} POIs từ {len(sources)} file")
+    SHARD_LOADS.inc(city=slug)
+    shard = CityShard(key, name, slug, data_dir, frames, sources)
+    shard.suggest_index()
+    shard.poi_fragments()
+    return shard
+
+
+def _shared_source(city: str, sources: Dict[str, str], data_dir: str) -> str:
+    return f"{os.path.abspath(data_dir)}|{source_version(city, sources, data_dir)}"
+
+
+def publish_shared_shard(city: str, data_dir: str = DATA_DIR, root: Optional[str] = None) -> str:
+    """Dựng shard từ CSV (TF-IDF mọi category, JSON fragment, graph nếu có) rồi publish vào thư mục dùng chung."""
+    shard = load_shard(city, data_dir, shared=False)
+    for cat in shard.frames:
+        shard.text_index(cat)
+    try:
+        G = shard.graph()
+    except Exception as e:
+        print(f"⚠️ Không publish road graph cho {shard.name}: {e}")
+        G = None
+    writer = shared_store.BundleWriter(shard.slug, shard.version, root)
+    try:
+        writer.manifest.update(city=shard.name, source=_shared_source(shard.name, shard.sources, data_dir))
+        shared_store.write_frames(writer, shard.frames)
+        shared_store.write_text(writer, shard._text)
+        shared_store.write_suggest(writer, shard.suggest_index())
+        shared_store.write_fragments(writer, shard.poi_fragments())
+        shared_store.write_graph(writer, G)
+        version = writer.commit()
+    except BaseException:
+        writer.abort()
+        raise
+    print(f"💾 Published shard {shard.name}: {writer.path}")
+    return version
+
+
+def _attach_shared(city: str, key: str, name: str, slug: str, data_dir: str, sources: Dict[str, str]) -> CityShard:
+    """Shard từ bundle dùng chung (mmap); chưa có hoặc cũ hơn CSV -> worker này publish (có khoá liên process)."""
+    source = _shared_source(name, sources, data_dir)
+    bundle = shared_store.attach(slug)
+    if bundle is None or bundle.manifest.get("source") != source:
+        with shared_store.publish_lock(slug):
+            bundle = shared_store.attach(slug)  # worker khác có thể vừa publish xong
+            if bundle is None or bundle.manifest.get("source") != source:
+                publish_shared_shard(city, data_dir)
+                bundle = shared_store.attach(slug)
+    frames = shared_store.read_frames(bundle)
+    print(f"⚡ Attached shard {name}: {sum(len(f) for f in frames.values())} POIs từ {bundle.path}")
+    SHARD_LOADS.inc(city=slug)
+    shard = CityShard(key, name, slug, data_dir, frames, sources)
+    shard.attach_bundle(bundle)
+    shard.suggest_index()
+    return shard
+
+
+class CatalogStore:
+    """LRU các CityShard, giới hạn theo tổng bộ nhớ (shard vừa dùng luôn được giữ lại)."""
+
+    def __init__(self, max_bytes: int = CATALOG_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._shards: "OrderedDict[Tuple[str, str], CityShard]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, city: str, data_dir: str = DATA_DIR) -> CityShard:
+        cache_key = (os.path.abspath(data_dir), city_key(city) or fold(city))
+        with self._lock:
+            shard = self._shards.get(cache_key)
+            if shard is not None:
+                if not shard.stale():
+                    self._shards.move_to_end(cache_key)
+                    return shard
+                self._shards.pop(cache_key)  # đã publish version mới -> attach lại
+        # request đồng thời cho cùng thành phố chờ chung một lần load (single-flight)
+        shard = _SHARD_FLIGHT.do(cache_key, lambda: self._load(city, data_dir, cache_key))
+        self.enforce_budget(keep=cache_key)
+        return shard
+
+    def _load(self, city: str, data_dir: str, cache_key: Tuple[str, str]) -> CityShard:
+        with self._lock:
+            shard = self._shards.get(cache_key)  # leader trước vừa load xong
+        if shard is None:
+            shard = load_shard(city, data_dir)
+            with self._lock:
+                self._shards[cache_key] = shard
+        return shard
+
+    def enforce_budget(self, keep: Optional[Tuple[str, str]] = None):
+        with self._lock:
+            sizes = {k: s.nbytes() for k, s in self._shards.items()}
+            total = sum(sizes.values())
+            for k in list(self._shards):
+                if total <= self.max_bytes:
+                    break
+                if k == keep:
+                    continue
+                evicted = self._shards.pop(k)
+                total -= sizes[k]
+                SHARD_EVICTIONS.inc(city=evicted.slug)
+                SHARD_BYTES.set(0, city=evicted.slug)
+                print(f"♻️ Evict shard {evicted.name} ({sizes[k] / 1e6:.1f} MB)")
+            for k, s in self._shards.items():
+                SHARD_BYTES.set(sizes[k], city=s.slug)
+
+    def swap(self, cache_key: Tuple[str, str], old: CityShard, new: CityShard) -> bool:
+        """Thay old bằng new (RCU): request đang giữ old chạy tiếp trên old; False nếu old không còn là bản hiện tại."""
+        with self._lock:
+            if self._shards.get(cache_key) is not old:
+                return False
+            self._shards[cache_key] = new
+        self.enforce_budget(keep=cache_key)
+        return True
+
+    def entries(self) -> List[Tuple[Tuple[str, str], CityShard]]:
+        with self._lock:
+            return list(self._shards.items())
+
+    def peek(self, city: str, data_dir: str = DATA_DIR) -> Optional[CityShard]:
+        """Shard nếu đang nằm trong LRU, không load (dùng khi chỉ cần dữ liệu đã có sẵn)."""
+        with self._lock:
+            return self._shards.get((os.path.abspath(data_dir), city_key(city) or fold(city)))
+
+    def invalidate(self, city: str, data_dir: str = DATA_DIR):
+        with self._lock:
+            self._shards.pop((os.path.abspath(data_dir), city_key(city) or fold(city)), None)
+
+    def clear(self):
+        with self._lock:
+            self._shards.clear()
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            shards = list(self._shards.values())
+        return [s.stats() for s in shards]
+
+
+_STORE = CatalogStore()
+
+# Shard đã dùng trong request hiện tại: mọi lần get_shard sau trả đúng bản đó dù đã reload giữa chừng
+_pinned: ContextVar[Optional[Dict[Tuple[str, str], CityShard]]] = ContextVar("tripiz_pinned_shards", default=None)
+
+
+def pin_request() -> Dict[Tuple[str, str], CityShard]:
+    """Bắt đầu ghim shard cho request (gọi ở middleware); dict trả về = các shard request đã dùng."""
+    pins: Dict[Tuple[str, str], CityShard] = {}
+    _pinned.set(pins)
+    return pins
+
+
+def _pin_key(city: str, data_dir: str) -> Tuple[str, str]:
+    return (os.path.abspath(data_dir), city_key(city) or fold(city))
+
+
+def get_shard(city: str, data_dir: str = DATA_DIR) -> CityShard:
+    pins = _pinned.get()
+    if pins is None:
+        return _STORE.get(city, data_dir)
+    key = _pin_key(city, data_dir)
+    shard = pins.get(key)
+    if shard is None:
+        shard = pins[key] = _STORE.get(city, data_dir)
+    return shard
+
+
+def peek_shard(city: str, data_dir: str = DATA_DIR) -> Optional[CityShard]:
+    pins = _pinned.get()
+    shard = pins.get(_pin_key(city, data_dir)) if pins is not None else None
+    return shard or _STORE.peek(city, data_dir)
+
+
+def invalidate_shard(city: str, data_dir: str = DATA_DIR):
+    """Bỏ shard khỏi LRU để lần truy cập sau load lại từ file."""
+    _STORE.invalidate(city, data_dir)
+
+
+def road_graph_for_city(city: str):
+    """Road graph lấy qua shard để được cache + tính vào ngân sách bộ nhớ của LRU."""
+    return get_shard(city).graph()
+
+
+def catalog_stats() -> List[Dict]:
+    return _STORE.stats()
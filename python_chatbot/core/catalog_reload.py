@@ -0,0 +1,110 @@
+"""
+Reload catalog nóng: theo dõi file nguồn của các shard đang nạp, dựng lại ở nền rồi đổi nguyên tử.
+
+- Thread nền kiểm tra mỗi TRIPIZ_RELOAD_POLL_S giây (0 = tắt) version nguồn của từng shard trong LRU:
+  CSV pois_<slug>_*.csv (kể cả bản OSM) + GraphML/.npz của road graph (catalog.source_version)
+- Version mới phải giữ nguyên qua hai lần kiểm tra liên tiếp (file copy dở không bị load)
+- Dựng shard mới ngoài khoá: TF-IDF, autocomplete, JSON fragment, và viewport/ANN/graph nếu bản cũ đã có;
+  xong mới swap vào LRU (read-copy-update). Request đang chạy đã ghim bản cũ (catalog.pin_request)
+  nên chạy xong trên bản cũ; request sau thấy bản mới. Lỗi dựng -> giữ bản cũ, thử lại khi file đổi tiếp
+- Thành phố mới (thêm CSV) không cần watcher: shard chưa từng load sẽ được load lần đầu khi có request
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from . import metrics
+from .catalog import _STORE, CityShard, load_shard, shard_sources, source_version
+
+RELOAD_POLL_S = float(os.getenv("TRIPIZ_RELOAD_POLL_S", "5"))
+
+RELOADS = metrics.counter("tripiz_catalog_reloads_total", "Số lần reload shard theo kết quả", ("city", "result"))
+RELOAD_SECONDS = metrics.histogram("tripiz_catalog_reload_seconds", "Thời gian dựng lại shard ở nền", ("city",))
+
+
+def current_source_version(shard: CityShard) -> Optional[str]:
+    """Version nguồn hiện tại trên đĩa của shard (None nếu file nguồn đã biến mất)."""
+    sources = shard_sources(shard.slug, shard.data_dir)
+    if not sources:
+        return None
+    try:
+        return source_version(shard.name, sources, shard.data_dir)
+    except FileNotFoundError:
+        return None  # file bị thay giữa lúc liệt kê và stat
+
+
+def reload_shard(cache_key: Tuple[str, str], old: CityShard) -> bool:
+    """Dựng shard mới cho old (ở thread gọi) rồi swap; True nếu bản mới đã vào LRU."""
+    t0 = time.perf_counter()
+    try:
+        new = load_shard(old.name, old.data_dir)
+        new.warm(like=old)
+    except Exception as e:
+        RELOADS.inc(city=old.slug, result="error")
+        print(f"⚠️ Reload shard {old.name} lỗi, giữ version {old.version}: {e}")
+        return False
+    RELOAD_SECONDS.observe(time.perf_counter() - t0, city=old.slug)
+    if not _STORE.swap(cache_key, old, new):
+        RELOADS.inc(city=old.slug, result="superseded")  # bị evict/invalidate trong lúc dựng
+        return False
+    RELOADS.inc(city=old.slug, result="ok")
+    print(f"🔄 Reload shard {old.name}: {old.version} -> {new.version} ({time.perf_counter() - t0:.1f}s)")
+    return True
+
+
+class CatalogWatcher:
+    def __init__(self, poll_s: float = RELOAD_POLL_S):
+        self.poll_s = poll_s
+        self._seen: Dict[Tuple[str, str], str] = {}  # version mới thấy ở lần kiểm tra trước (chờ ổn định)
+        self._failed: Dict[Tuple[str, str], str] = {}  # version đã dựng lỗi -> không thử lại tới khi file đổi
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def check_once(self) -> int:
+        """Một vòng kiểm tra; trả về số shard đã reload."""
+        reloaded = 0
+        for key, shard in _STORE.entries():
+            version = current_source_version(shard)
+            if version is None or version == shard.version or self._failed.get(key) == version:
+                self._seen.pop(key, None)
+                continue
+            if self._seen.get(key) != version:
+                self._seen[key] = version  # đợi lần sau: file có thể đang được ghi
+                continue
+            self._seen.pop(key, None)
+            if reload_shard(key, shard):
+                self._failed.pop(key, None)
+                reloaded += 1
+            else:
+                self._failed[key] = version
+        return reloaded
+
+    def _run(self):
+        while not self._stop.wait(self.poll_s):
+            try:
+                self.check_once()
+            except Exception as e:
+                print(f"⚠️ Catalog watcher lỗi: {e}")
+
+    def start(self):
+        if self.poll_s > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="catalog-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+_WATCHER = CatalogWatcher()
+
+
+def start_catalog_watcher():
+    _WATCHER.start()
+
+
+def stop_catalog_watcher():
+    _WATCHER.stop()
@@ -0,0 +1,88 @@
+import re
+from typing import Optional, Tuple
+
+import unidecode
+
+# Danh sách thành phố hỗ trợ; key = tên đã bỏ dấu + lowercase (xem fold())
+# bbox = (north, south, east, west) – vùng trung tâm dùng cho OSM / road graph
+CITIES = {
+    "ho chi minh": {
+        "name": "Hồ Chí Minh",
+        "slug": "hcm",
+        "bbox": (10.85, 10.70, 106.83, 106.63),
+        "aliases": ["sai gon", "saigon", "hcm", "hcmc", "tp hcm", "tphcm", "ho chi minh city"],
+    },
+    "da lat": {
+        "name": "Đà Lạt",
+        "slug": "da_lat",
+        "bbox": (11.97, 11.90, 108.47, 108.40),
+        "aliases": ["dalat"],
+    },
+    "ha noi": {
+        "name": "Hà Nội",
+        "slug": "ha_noi",
+        "bbox": (21.08, 20.95, 105.90, 105.75),
+        "aliases": ["hanoi"],
+    },
+    "da nang": {
+        "name": "Đà Nẵng",
+        "slug": "da_nang",
+        "bbox": (16.10, 15.90, 108.30, 108.10),
+        "aliases": ["danang"],
+    },
+    "hue": {
+        "name": "Huế",
+        "slug": "hue",
+        "bbox": (16.50, 16.42, 107.63, 107.52),
+        "aliases": ["thua thien hue"],
+    },
+    "nha trang": {
+        "name": "Nha Trang",
+        "slug": "nha_trang",
+        "bbox": (12.28, 12.18, 109.22, 109.12),
+        "aliases": ["nhatrang"],
+    },
+}
+
+_ALIASES = {alias: key for key, info in CITIES.items() for alias in [key] + info["aliases"]}
+_PREFIX = re.compile(r"^(thanh pho|tp\.?|city of)\s+")
+
+
+def fold(text) -> str:
+    """Chuẩn hoá text để so khớp: lowercase + bỏ dấu tiếng Việt (unidecode)."""
+    return unidecode.unidecode(str(text).lower()).strip()
+
+
+def city_key(city: str) -> Optional[str]:
+    """Trả về key trong CITIES (chấp nhận có/không dấu, alias, tiền tố 'TP.'), None nếu không biết."""
+    f = fold(city)
+    f = re.sub(r"[^a-z0-9. ]+", " ", f)
+    f = _PREFIX.sub("", re.sub(r"\s+", " ", f).strip())
+    return _ALIASES.get(f) or _ALIASES.get(f.replace(".", "").strip())
+
+
+def city_slug(city: str) -> str:
+    """Slug dùng trong tên file (pois_<slug>_<category>.csv, <slug>_graph.graphml)."""
+    key = city_key(city)
+    if key:
+        return CITIES[key]["slug"]
+    return re.sub(r"[^a-z0-9]+", "_", fold(city)).strip("_")
+
+
+def city_name(city: str) -> str:
+    key = city_key(city)
+    return CITIES[key]["name"] if key else str(city)
+
+
+def city_bbox(city: str) -> Optional[Tuple[float, float, float, float]]:
+    key = city_key(city)
+    return CITIES[key]["bbox"] if key else None
+
+
+_MENTION = re.compile(r"\b(" + "|".join(sorted((re.escape(a) for a in _ALIASES), key=len, reverse=True)) + r")\b")
+
+
+def find_city(text: str) -> Optional[str]:
+    """Tên hiển thị của thành phố đầu tiên được nhắc tới trong câu (có/không dấu), None nếu không có."""
+    m = _MENTION.search(re.sub(r"[^a-z0-9]+", " ", fold(text)))
+    return CITIES[_ALIASES[m.group(1)]]["name"] if m else None
@@ -0,0 +1,244 @@
+"""
+Context người dùng theo userId: preferences, plan gần nhất, các hành động gần đây.
+
+- Tầng nóng: OrderedDict LRU trong bộ nhớ (giới hạn số user)
+- Lưu bền: SQLite (data/context.db), ghi trễ theo lô bởi một thread nền
+  -> request không chờ I/O đĩa; bản ghi chưa flush vẫn đọc được từ bộ nhớ
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from . import metrics
+
+CONTEXT_DB = os.getenv("TRIPIZ_CONTEXT_DB", "data/context.db")
+CONTEXT_HOT_MAX = int(os.getenv("TRIPIZ_CONTEXT_HOT_MAX", "10000"))
+CONTEXT_FLUSH_S = float(os.getenv("TRIPIZ_CONTEXT_FLUSH_S", "1.0"))
+CONTEXT_FLUSH_BATCH = 500  # flush sớm khi đủ chừng này user bẩn
+RECENT_ACTIONS_MAX = 20
+
+# Giữ tương thích với stub cũ của /api/context cho user chưa có dữ liệu
+DEFAULT_PREFERENCES = {"price": "medium"}
+
+CONTEXT_LOOKUPS = metrics.counter("tripiz_context_lookups_total", "Số lần đọc context theo tầng", ("tier",))
+CONTEXT_HOT_USERS = metrics.gauge("tripiz_context_hot_users", "Số user trong tầng nóng")
+CONTEXT_FLUSHED = metrics.counter("tripiz_context_flushed_total", "Số bản ghi context đã ghi xuống SQLite")
+CONTEXT_FLUSH_SECONDS = metrics.histogram("tripiz_context_flush_seconds", "Thời gian một lần flush context")
+
+
+def _empty_context() -> Dict[str, Any]:
+    return {
+        "preferences": dict(DEFAULT_PREFERENCES),
+        "lastPlanId": None,
+        "recentActions": [],
+        "conversationSummary": "",
+        "updatedAt": None,
+    }
+
+
+class ContextStore:
+    def __init__(self, db_path: str = CONTEXT_DB, hot_max: int = CONTEXT_HOT_MAX, flush_s: float = CONTEXT_FLUSH_S):
+        self.db_path = db_path
+        self.hot_max = hot_max
+        self.flush_s = flush_s
+        self._hot: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._dirty: Dict[str, str] = {}  # user_id -> JSON chờ ghi
+        self._inflight: Dict[str, str] = {}  # batch đang được ghi
+        self._flushes = 0  # số lần flush xong, để _entry biết bản vừa đọc từ SQLite có thể đã cũ
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- SQLite ----------
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS user_context ("
+                " user_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _load(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._db_lock:
+            row = self._db().execute("SELECT data FROM user_context WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # ---------- tầng nóng ----------
+    def _cached(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Entry đang trong tầng nóng, hoặc bản chờ ghi nếu đã bị đẩy ra (gọi khi đang giữ self._lock)."""
+        ctx = self._hot.get(user_id)
+        if ctx is not None:
+            self._hot.move_to_end(user_id)
+            CONTEXT_LOOKUPS.inc(tier="hot")
+            return ctx
+        # đã bị đẩy khỏi tầng nóng nhưng chưa ghi xong xuống SQLite
+        pending = self._dirty.get(user_id) or self._inflight.get(user_id)
+        if pending is None:
+            return None
+        CONTEXT_LOOKUPS.inc(tier="pending")
+        return self._admit(user_id, json.loads(pending))
+
+    def _admit(self, user_id: str, ctx: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        ctx = {**_empty_context(), **(ctx or {})}
+        self._hot[user_id] = ctx
+        while len(self._hot) > self.hot_max:
+            self._hot.popitem(last=False)
+        CONTEXT_HOT_USERS.set(len(self._hot))
+        return ctx
+
+    def _entry(self, user_id: str) -> Dict[str, Any]:
+        """
+        Entry trong tầng nóng (gọi khi đang giữ self._lock). Khi phải đọc SQLite thì nhả self._lock trong lúc
+        đọc để user khác không phải chờ I/O, rồi kiểm tra lại tầng nóng: thread khác có thể đã nạp/sửa entry,
+        hoặc một lần flush đã ghi bản mới hơn bản vừa đọc (khi đó đọc lại).
+        """
+        while True:
+            ctx = self._cached(user_id)
+            if ctx is not None:
+                return ctx
+            generation = self._flushes
+            self._lock.release()
+            try:
+                stored = self._load(user_id)
+            finally:
+                self._lock.acquire()
+            ctx = self._cached(user_id)
+            if ctx is not None:
+                return ctx
+            if generation == self._flushes:
+                CONTEXT_LOOKUPS.inc(tier="sqlite" if stored is not None else "miss")
+                return self._admit(user_id, stored)
+
+    def get(self, user_id: str) -> Dict[str, Any]:
+        with self._lock:
+            return json.loads(json.dumps(self._entry(user_id)))
+
+    def update(self, user_id: str, preferences: Optional[Dict[str, Any]] = None, last_plan_id: Optional[str] = None,
+               action: Optional[Dict[str, Any]] = None, summary: Optional[str] = None,
+               replace_preferences: bool = False) -> Dict[str, Any]:
+        """Cập nhật context (merge preferences, thêm action) và đánh dấu cần ghi xuống SQLite."""
+        with self._lock:
+            ctx = self._entry(user_id)
+            if preferences is not None:
+                ctx["preferences"] = dict(preferences) if replace_preferences else {**ctx["preferences"], **preferences}
+            if last_plan_id is not None:
+                ctx["lastPlanId"] = last_plan_id
+            if action is not None:
+                ctx["recentActions"] = (ctx["recentActions"] + [{**action, "at": time.time()}])[-RECENT_ACTIONS_MAX:]
+            if summary is not None:
+                ctx["conversationSummary"] = summary
+            ctx["updatedAt"] = time.time()
+            self._dirty[user_id] = json.dumps(ctx, ensure_ascii=False, default=str)
+            n_dirty = len(self._dirty)
+        self._ensure_writer()
+        if n_dirty >= CONTEXT_FLUSH_BATCH:
+            self._wake.set()
+        return json.loads(json.dumps(ctx, default=str))
+
+    def apply(self, user_id: str, fn: Callable[[Dict[str, Any]], None]):
+        """Sửa context tại chỗ bằng fn(ctx) (dưới lock) rồi đánh dấu cần ghi – dùng cho cập nhật từ event."""
+        with self._lock:
+            ctx = self._entry(user_id)
+            fn(ctx)
+            self._dirty[user_id] = json.dumps(ctx, ensure_ascii=False, default=str)
+        self._ensure_writer()
+
+    def peek(self, user_id: str, key: str, default=None):
+        """Đọc một trường của context, không copy cả entry (đường nóng khi chấm điểm)."""
+        with self._lock:
+            return self._entry(user_id).get(key, default)
+
+    # ---------- ghi trễ ----------
+    def _ensure_writer(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._writer, name="context-writer", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def _writer(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_s)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Context flush lỗi: {e}")
+
+    def flush(self) -> int:
+        """Ghi toàn bộ context bẩn trong một transaction."""
+        with self._lock:
+            batch, self._dirty = self._dirty, {}
+            self._inflight = batch
+        if not batch:
+            return 0
+        t0 = time.perf_counter()
+        now = time.time()
+        try:
+            with self._db_lock:
+                conn = self._db()
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO user_context (user_id, data, updated_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                        [(uid, data, now) for uid, data in batch.items()],
+                    )
+        except Exception:
+            with self._lock:  # ghi lỗi -> trả lại batch, bản mới hơn (nếu có) được giữ
+                self._dirty = {**batch, **self._dirty}
+            raise
+        finally:
+            with self._lock:
+                self._inflight = {}
+                self._flushes += 1
+        CONTEXT_FLUSHED.inc(len(batch))
+        CONTEXT_FLUSH_SECONDS.observe(time.perf_counter() - t0)
+        return len(batch)
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self.flush()
+
+
+_STORE = ContextStore()
+
+
+def get_context(user_id: str) -> Dict[str, Any]:
+    return _STORE.get(user_id)
+
+
+def update_context(user_id: str, **changes) -> Dict[str, Any]:
+    return _STORE.update(user_id, **changes)
+
+
+def apply_context(user_id: str, fn: Callable[[Dict[str, Any]], None]):
+    _STORE.apply(user_id, fn)
+
+
+def peek_context(user_id: str, key: str, default=None):
+    return _STORE.peek(user_id, key, default)
+
+
+def flush_contexts() -> int:
+    return _STORE.flush()
+
+
+def close_context_store():
+    _STORE.close()
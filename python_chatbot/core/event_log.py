@@ -0,0 +1,211 @@
+"""
+Ghi nhận event tương tác từ app (POST /api/events).
+
+- Hàng đợi trong bộ nhớ có giới hạn; request chỉ append vào hàng đợi rồi trả về ngay
+- Thread nền ghi theo lô (append-only) vào SQLite data/events.db,
+  flush khi đủ EVENT_BATCH event hoặc sau EVENT_FLUSH_S giây
+- Hàng đợi đầy -> EventQueueFull (API trả 429 + Retry-After) thay vì để RAM/độ trễ tăng vô hạn
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from . import metrics
+
+EVENTS_DB = os.getenv("TRIPIZ_EVENTS_DB", "data/events.db")
+EVENT_QUEUE_MAX = int(os.getenv("TRIPIZ_EVENT_QUEUE_MAX", "20000"))
+EVENT_BATCH = int(os.getenv("TRIPIZ_EVENT_BATCH", "500"))
+EVENT_FLUSH_S = float(os.getenv("TRIPIZ_EVENT_FLUSH_S", "0.5"))
+EVENT_MAX_PER_REQUEST = 1000
+
+EVENTS_RECEIVED = metrics.counter("tripiz_events_received_total", "Số event được nhận vào hàng đợi")
+EVENTS_REJECTED = metrics.counter("tripiz_events_rejected_total", "Số event bị từ chối", ("reason",))
+EVENTS_WRITTEN = metrics.counter("tripiz_events_written_total", "Số event đã ghi xuống SQLite")
+EVENTS_QUEUE_DEPTH = metrics.gauge("tripiz_events_queue_depth", "Số event đang chờ ghi")
+EVENTS_FLUSH_SECONDS = metrics.histogram("tripiz_events_flush_seconds", "Thời gian ghi một lô event")
+EVENTS_FLUSH_SIZE = metrics.histogram("tripiz_events_flush_size", "Số event trong một lô",
+                                      buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000))
+
+
+class EventQueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Hàng đợi event đầy, thử lại sau {retry_after}s")
+        self.retry_after = retry_after
+
+
+def normalize_event(raw: Dict[str, Any], received_at: float) -> tuple:
+    """Event (dict) -> hàng (ts, received_at, user_id, type, poi_id, payload JSON)."""
+    if not isinstance(raw, dict):
+        raise ValueError("Event phải là object JSON")
+    etype = raw.get("type") or raw.get("event") or raw.get("name")
+    if not etype:
+        raise ValueError("Event thiếu 'type'")
+    ts = raw.get("ts") or raw.get("timestamp") or received_at
+    try:
+        ts = float(ts)
+    except (TypeError, ValueError):
+        ts = received_at
+    user_id = raw.get("userId") or raw.get("user_id")
+    poi_id = raw.get("poiId") or raw.get("poi_id")
+    return (ts, received_at, None if user_id is None else str(user_id), str(etype),
+            None if poi_id is None else str(poi_id), json.dumps(raw, ensure_ascii=False, default=str))
+
+
+class EventLog:
+    def __init__(self, db_path: str = EVENTS_DB, queue_max: int = EVENT_QUEUE_MAX,
+                 batch: int = EVENT_BATCH, flush_s: float = EVENT_FLUSH_S):
+        self.db_path = db_path
+        self.queue_max = queue_max
+        self.batch = batch
+        self.flush_s = flush_s
+        self._queue: deque = deque()
+        self._cond = threading.Condition()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = False
+        self._rate = float(batch) / max(flush_s, 1e-3)  # event/s ghi được, cập nhật sau mỗi lô
+        self._listeners: List[Callable[[List[tuple]], None]] = []
+
+    def add_listener(self, fn: Callable[[List[tuple]], None]):
+        """fn(rows) được gọi trên thread ghi sau mỗi lô đã lưu (ngoài đường đi của request)."""
+        self._listeners.append(fn)
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, received_at REAL NOT NULL,"
+                " user_id TEXT, type TEXT NOT NULL, poi_id TEXT, payload TEXT NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def submit(self, events: List[Dict[str, Any]]) -> int:
+        """Đưa event vào hàng đợi (tất cả hoặc không); raise ValueError / EventQueueFull."""
+        if len(events) > EVENT_MAX_PER_REQUEST:
+            EVENTS_REJECTED.inc(len(events), reason="too_large")
+            raise ValueError(f"Tối đa {EVENT_MAX_PER_REQUEST} event mỗi request")
+        now = time.time()
+        try:
+            rows = [normalize_event(e, now) for e in events]
+        except ValueError:
+            EVENTS_REJECTED.inc(len(events), reason="invalid")
+            raise
+        self._ensure_writer()
+        with self._cond:
+            if len(self._queue) + len(rows) > self.queue_max:
+                EVENTS_REJECTED.inc(len(rows), reason="queue_full")
+                raise EventQueueFull(self.retry_after())
+            self._queue.extend(rows)
+            depth = len(self._queue)
+            if depth >= self.batch:
+                self._cond.notify()
+        EVENTS_RECEIVED.inc(len(rows))
+        EVENTS_QUEUE_DEPTH.set(depth)
+        return len(rows)
+
+    def retry_after(self) -> int:
+        """Ước lượng số giây để writer xả bớt nửa hàng đợi."""
+        return max(1, int(round(len(self._queue) / 2 / max(self._rate, 1.0))))
+
+    # ---------- writer ----------
+    def _ensure_writer(self):
+        if self._thread is None:
+            with self._cond:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._writer, name="event-writer", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def _take(self) -> List[tuple]:
+        with self._cond:
+            n = min(self.batch, len(self._queue))
+            rows = [self._queue.popleft() for _ in range(n)]
+            EVENTS_QUEUE_DEPTH.set(len(self._queue))
+            return rows
+
+    def _write(self, rows: List[tuple]):
+        t0 = time.perf_counter()
+        with self._write_lock:
+            conn = self._db()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO events (ts, received_at, user_id, type, poi_id, payload) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+        elapsed = time.perf_counter() - t0
+        EVENTS_WRITTEN.inc(len(rows))
+        EVENTS_FLUSH_SECONDS.observe(elapsed)
+        EVENTS_FLUSH_SIZE.observe(len(rows))
+        self._rate = 0.8 * self._rate + 0.2 * (len(rows) / max(elapsed, 1e-4))
+        for fn in self._listeners:
+            try:
+                fn(rows)
+            except Exception as e:
+                print(f"⚠️ Event listener lỗi: {e}")
+
+    def _writer(self):
+        while True:
+            with self._cond:
+                if not self._stop and len(self._queue) < self.batch:
+                    self._cond.wait(self.flush_s)
+                stopping = self._stop
+            rows = self._take()
+            while rows:
+                try:
+                    self._write(rows)
+                except Exception as e:
+                    EVENTS_REJECTED.inc(len(rows), reason="write_error")
+                    print(f"⚠️ Ghi event lỗi, bỏ {len(rows)} event: {e}")
+                if len(rows) < self.batch and not stopping:
+                    break
+                rows = self._take()
+            if stopping:
+                return
+
+    def flush(self):
+        """Ghi ngay mọi event đang chờ (dùng khi tắt server / trong benchmark)."""
+        rows = self._take()
+        while rows:
+            self._write(rows)
+            rows = self._take()
+
+    def close(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=10)
+        self.flush()
+
+    def depth(self) -> int:
+        return len(self._queue)
+
+
+_LOG = EventLog()
+
+
+def submit_events(events: List[Dict[str, Any]]) -> int:
+    return _LOG.submit(events)
+
+
+def add_event_listener(fn: Callable[[List[tuple]], None]):
+    _LOG.add_listener(fn)
+
+
+def flush_events():
+    _LOG.flush()
+
+
+def close_event_log():
+    _LOG.close()
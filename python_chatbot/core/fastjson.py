@@ -0,0 +1,89 @@
+"""
+Encode JSON nhanh cho response: orjson nếu có, fallback json chuẩn.
+
+- Fragment: JSON đã serialise sẵn (bytes), chèn nguyên vào output không encode lại
+  (orjson.Fragment nếu bản orjson hỗ trợ; nếu không thì dumps placeholder rồi thay bằng bytes)
+- Hiểu kiểu numpy (int/float/bool/ndarray); NaN/inf (float Python hoặc numpy) -> null như orjson,
+  kể cả ở fallback json chuẩn
+"""
+import json
+import math
+import re
+import secrets
+from typing import Any, List
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # orjson là tuỳ chọn
+    orjson = None
+
+NATIVE_FRAGMENT = orjson is not None and hasattr(orjson, "Fragment")
+
+if NATIVE_FRAGMENT:
+    Fragment = orjson.Fragment
+else:
+    class Fragment:
+        """JSON hợp lệ đã serialise (bytes), được chèn nguyên vào output của dumps()."""
+        __slots__ = ("contents",)
+
+        def __init__(self, contents: bytes):
+            self.contents = contents
+
+# Placeholder cho fragment khi phải ghép: "\u0000<token><n>\u0000" (token ngẫu nhiên mỗi process)
+_TOKEN = secrets.token_hex(6)
+_PLACEHOLDER = re.compile(rb'"\\u0000' + _TOKEN.encode() + rb'(\d+)\\u0000"')
+
+
+def _default(o: Any):
+    if isinstance(o, np.integer):
+        return int(o)
+    if isinstance(o, np.floating):
+        return float(o) if math.isfinite(o) else None
+    if isinstance(o, np.bool_):
+        return bool(o)
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    if isinstance(o, (set, frozenset, tuple)):
+        return list(o)
+    if hasattr(o, "isoformat"):
+        return o.isoformat()
+    raise TypeError(f"Không serialise được kiểu {type(o).__name__}")
+
+
+def _finite(o: Any) -> Any:
+    """NaN/inf -> None trong dict/list lồng nhau (json chuẩn không tự đổi; np.float64 là float nên không qua default)."""
+    if isinstance(o, float):
+        return o if math.isfinite(o) else None
+    if isinstance(o, dict):
+        return {k: _finite(v) for k, v in o.items()}
+    if isinstance(o, (list, tuple)):
+        return [_finite(v) for v in o]
+    return o
+
+
+def _encode(obj: Any, default) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(_finite(obj), default=lambda o: _finite(default(o)), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def dumps(obj: Any) -> bytes:
+    """obj -> JSON bytes (compact, UTF-8); Fragment được chèn nguyên văn."""
+    if NATIVE_FRAGMENT:
+        return _encode(obj, _default)
+
+    parts: List[bytes] = []
+
+    def default(o: Any):
+        if isinstance(o, Fragment):
+            parts.append(o.contents)
+            return f"\x00{_TOKEN}{len(parts) - 1}\x00"
+        return _default(o)
+
+    out = _encode(obj, default)
+    if not parts:
+        return out
+    return _PLACEHOLDER.sub(lambda m: parts[int(m.group(1))], out)
@@ -3,6 +3,9 @@ import math
 import networkx as nx
 import numpy as np
 
+from .cities import city_bbox, city_slug
+from . import singleflight
+
 # Global flag to disable road graph downloads for offline mode
 FORCE_OFFLINE = True
 
@@ -29,9 +32,16 @@ def haversine_dist(lat1, lon1, lat2, lon2):
     return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
 
-def _get_graph_cache_path(city: str) -> str:
-    os.makedirs("data", exist_ok=True)
-    return f"data/{city.lower().replace(' ', '_')}_graph.graphml"
+def _get_graph_cache_path(city: str, data_dir: str = "data") -> str:
+    os.makedirs(data_dir, exist_ok=True)
+    # Tên cũ (có dấu, vd "hồ_chí_minh_graph.graphml") vẫn được dùng nếu đã có sẵn
+    legacy = os.path.join(data_dir, f"{city.lower().replace(' ', '_')}_graph.graphml")
+    if os.path.exists(legacy):
+        return legacy
+    return os.path.join(data_dir, f"{city_slug(city)}_graph.graphml")
+
+
+_GRAPH_FLIGHT = singleflight.group("road_graph")
 
 
 def road_graph_for_city(city: str) -> nx.MultiDiGraph:
@@ -39,11 +49,16 @@ def road_graph_for_city(city: str) -> nx.MultiDiGraph:
     Tải graph đường (drive) cho city và cache lại để lần sau load nhanh hơn.
     - Dùng bbox trung tâm cho các thành phố lớn.
     - Cache lại thành file graphml để load nhanh sau này.
+    - Các lời gọi đồng thời cùng thành phố dùng chung một lần tải/parse (single-flight).
     """
     if not OSMNX_AVAILABLE:
         raise RuntimeError("osmnx is not available - cannot build road graphs")
-    
+
     cache_path = _get_graph_cache_path(city)
+    return _GRAPH_FLIGHT.do(cache_path, lambda: _load_or_download(city, cache_path))
+
+
+def _load_or_download(city: str, cache_path: str) -> nx.MultiDiGraph:
     if os.path.exists(cache_path):
         print(f"⚡ Đang tải graph từ cache: {cache_path}")
         return ox.load_graphml(cache_path)
@@ -55,18 +70,9 @@ def road_graph_for_city(city: str) -> nx.MultiDiGraph:
             f"Cannot download new graph data. Please run in online mode first to build cache."
         )
 
-    bbox_by_city = {
-        "ho chi minh": (10.85, 10.70, 106.83, 106.63),
-        "đà lạt": (11.97, 11.90, 108.47, 108.40),
-        "hà nội": (21.08, 20.95, 105.90, 105.75),
-        "đà nẵng": (16.10, 15.90, 108.30, 108.10),
-        "huế": (16.50, 16.42, 107.63, 107.52),
-        "nha trang": (12.28, 12.18, 109.22, 109.12),
-    }
-
-    city_key = city.lower().strip()
-    if city_key in bbox_by_city:
-        north, south, east, west = bbox_by_city[city_key]
+    bbox = city_bbox(city)
+    if bbox:
+        north, south, east, west = bbox
         G = ox.graph_from_bbox(
             north=north, south=south, east=east, west=west,
             network_type="drive", simplify=True
@@ -0,0 +1,675 @@
+"""
+Biên dịch road graph (osmnx/GraphML) thành graph định tuyến gọn, lưu dạng mảng numpy:
+- chỉ giữ thành phần liên thông mạnh lớn nhất (không còn cặp điểm "không có đường" -> inf)
+- gộp chuỗi node bậc 2 thành một cạnh (giữ tổng length + polyline để snap)
+- snap POI vào cạnh gần nhất (không chỉ node gần nhất)
+- Dijkstra trên CSR bằng scipy.sparse.csgraph (nhiều nguồn một lần)
+- thời gian đi (giây) theo phương tiện tính sẵn lúc biên dịch từ highway/maxspeed/speed_kph:
+  "drive" theo chiều đường, "walk" đi được cả hai chiều với tốc độ đi bộ (mạng đi bộ suy ra từ road graph);
+  CSR theo từng phương tiện dựng một lần mỗi graph, vòng Dijkstra không tra thuộc tính cạnh
+
+Chạy từ thư mục python_chatbot:
+    python -m core.graph_compiler --city "Hồ Chí Minh"     # data/hcm_graph.graphml -> data/hcm_graph.npz
+"""
+import argparse
+import math
+import os
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import networkx as nx
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra
+
+from .cities import city_slug, fold
+
+GRID_CELL_DEG = 0.005  # ~550 m – ô lưới cho spatial index của segment
+EARTH_R = 6371000.0
+M_PER_DEG_LAT = 110540.0
+M_PER_DEG_LON = 111320.0
+# 2: có edge_drive_s/edge_walk_s; 3: có seg_drive_off/seg_walk_off. .npz cũ hơn được biên dịch lại từ GraphML
+GRAPH_FORMAT = 3
+# Trọng số gói của CSR thời gian: độ dài (dm) ở 24 bit thấp (tối đa ~1.677 km mỗi đường),
+# thời gian (ms) ở phần trên (tối đa ~149 giờ trong 2^53 của float64)
+LEN_SPAN = float(1 << 24)
+
+MODES = ("drive", "walk")
+WALK_SPEED_KMH = float(os.getenv("TRIPIZ_WALK_SPEED_KMH", "4.5"))
+# Không có graph: thời gian = khoảng cách haversine / tốc độ trung bình trong phố
+FALLBACK_SPEED_KMH = {"drive": float(os.getenv("TRIPIZ_ROUTE_SPEED_KMH", "20")), "walk": WALK_SPEED_KMH}
+# Tốc độ xe máy/ô tô thực tế trong phố theo loại đường (km/h); maxspeed/speed_kph thấp hơn thì lấy cái thấp hơn
+HIGHWAY_SPEED_KMH = {
+    "motorway": 60, "motorway_link": 40, "trunk": 40, "trunk_link": 30,
+    "primary": 30, "primary_link": 25, "secondary": 25, "secondary_link": 22,
+    "tertiary": 22, "tertiary_link": 20, "unclassified": 18, "residential": 16,
+    "living_street": 10, "service": 12, "road": 18,
+}
+DEFAULT_HIGHWAY_SPEED_KMH = 18
+# Đi bộ: hệ số quãng đường hiệu dụng (đường cao tốc/quốc lộ không vỉa hè, phải đi vòng/chờ sang đường)
+WALK_DETOUR = {"motorway": 4.0, "motorway_link": 4.0, "trunk": 2.0, "trunk_link": 2.0, "primary": 1.2}
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Haversine (m), vector hoá trên mảng numpy."""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.asarray(lon2) - np.asarray(lon1))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_R * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def travel_mode(transport: Optional[str]) -> str:
+    """Phương tiện của params ("đi bộ", "xe máy/ô tô", "walk"...) -> "walk" | "drive"."""
+    t = fold(transport or "")
+    return "walk" if "di bo" in t or "walk" in t or "foot" in t else "drive"
+
+
+def _first(value) -> Optional[str]:
+    """Thuộc tính osmnx có thể là list hoặc chuỗi "['a', 'b']" (cạnh đã gộp) -> phần tử đầu."""
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else None
+    if value is None:
+        return None
+    value = str(value).strip()
+    if value.startswith("["):
+        value = value.strip("[]").split(",")[0].strip(" '\"")
+    return value or None
+
+
+def _speed_kmh(value) -> float:
+    """maxspeed/speed_kph ("50", "['40', '50']", "30 mph") -> km/h, nan nếu không đọc được."""
+    if isinstance(value, (int, float)):
+        return float(value) if value > 0 else math.nan
+    if isinstance(value, (list, tuple)):
+        speeds = [_speed_kmh(v) for v in value]
+        speeds = [v for v in speeds if math.isfinite(v)]
+        return min(speeds) if speeds else math.nan
+    text = str(value or "").strip()
+    if text.startswith("["):
+        return _speed_kmh([v.strip(" '\"") for v in text.strip("[]").split(",")])
+    try:
+        kmh = float(text.split()[0])
+    except (IndexError, ValueError):
+        return math.nan
+    if kmh <= 0:
+        return math.nan
+    return kmh * 1.609 if "mph" in text else kmh
+
+
+def edge_speeds(data: Dict) -> Tuple[float, float]:
+    """(tốc độ xe km/h, hệ số quãng đường đi bộ) của một cạnh osmnx."""
+    highway = _first(data.get("highway")) or ""
+    speed = HIGHWAY_SPEED_KMH.get(highway, DEFAULT_HIGHWAY_SPEED_KMH)
+    for attr in ("speed_kph", "maxspeed"):
+        limit = _speed_kmh(data.get(attr))
+        if math.isfinite(limit):
+            speed = min(speed, limit)
+    return float(speed), WALK_DETOUR.get(highway, 1.0)
+
+
+class ModeWeights:
+    """
+    CSR thời gian của một phương tiện (xuôi + đảo chiều). Trọng số mỗi cạnh gói cả thời gian lẫn độ dài:
+    ms * LEN_SPAN + dm (số nguyên, cộng chính xác trong float64) -> một lần Dijkstra cho đường nhanh nhất
+    (hoà thì ngắn nhất) và độ dài của chính đường đó, không cần đi lại mảng predecessor.
+    """
+
+    __slots__ = ("csr", "csr_t")
+    ARRAYS = ("csr.data", "csr.indices", "csr.indptr", "csr_t.data", "csr_t.indices", "csr_t.indptr")
+
+    def __init__(self, csr: csr_matrix, csr_t: csr_matrix):
+        self.csr, self.csr_t = csr, csr_t
+
+    @classmethod
+    def build(cls, u: np.ndarray, v: np.ndarray, seconds: np.ndarray, length: np.ndarray, n: int) -> "ModeWeights":
+        packed = pack_weights(seconds, length)
+        return cls(_min_csr(u, v, packed, n), _min_csr(v, u, packed, n))
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Mảng theo tên trong ARRAYS (để publish vào bundle dùng chung)."""
+        out = {}
+        for tag, m in (("csr", self.csr), ("csr_t", self.csr_t)):
+            out[f"{tag}.data"], out[f"{tag}.indices"], out[f"{tag}.indptr"] = m.data, m.indices, m.indptr
+        return out
+
+    @classmethod
+    def from_arrays(cls, a: Dict[str, np.ndarray], n: int) -> "ModeWeights":
+        def csr(tag):
+            return csr_matrix((a[f"{tag}.data"], a[f"{tag}.indices"], a[f"{tag}.indptr"]), shape=(n, n), copy=False)
+        return cls(csr("csr"), csr("csr_t"))
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(v.nbytes for v in self.arrays().values()))
+
+
+def pack_weights(seconds: np.ndarray, length: np.ndarray) -> np.ndarray:
+    """(giây, m) -> ms * LEN_SPAN + dm; thời gian tối thiểu 1 ms để scipy không coi là "không có cạnh"."""
+    ms = np.maximum(np.round(np.asarray(seconds) * 1000.0), 1.0)
+    return ms * LEN_SPAN + np.minimum(np.round(np.asarray(length) * 10.0), LEN_SPAN - 1)
+
+
+def unpack_weights(packed: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Tổng trọng số gói (kết quả Dijkstra) -> (giây, m); inf (không tới được) -> inf."""
+    ms = np.floor(packed / LEN_SPAN)
+    dm = np.where(np.isfinite(packed), packed - ms * LEN_SPAN, np.inf)
+    return ms / 1000.0, dm / 10.0
+
+
+class CompiledGraph:
+    """
+    Graph định tuyến dạng mảng.
+    - px, py: toạ độ mọi điểm polyline (lon, lat)
+    - edge_u, edge_v, edge_len: cạnh có hướng giữa các node định tuyến (0..n_nodes-1), length (m)
+    - edge_drive_s, edge_walk_s: thời gian đi hết cạnh (giây) bằng xe / đi bộ
+    - edge_rev: chỉ số cạnh ngược chiều cùng polyline (-1 nếu đường một chiều)
+    - seg_*: các đoạn thẳng của polyline từng cạnh (dùng để snap), seg_off = khoảng cách từ đầu cạnh,
+      seg_drive_off/seg_walk_off = thời gian (giây) từ đầu cạnh: cạnh đã gộp có thể qua nhiều loại đường
+    - grid_*: spatial index các segment theo ô lưới GRID_CELL_DEG
+    """
+
+    ARRAYS = ("px", "py", "node_point", "edge_u", "edge_v", "edge_len", "edge_rev", "edge_drive_s", "edge_walk_s",
+              "seg_edge", "seg_p0", "seg_p1", "seg_off", "seg_len", "seg_drive_off", "seg_walk_off",
+              "grid_keys", "grid_start", "grid_items")
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Optional[Dict] = None):
+        meta = dict(meta or {})
+        if "edge_drive_s" not in arrays:
+            # .npz trước GRAPH_FORMAT 2 (không có highway): tốc độ trung bình cho mọi cạnh
+            arrays = {**arrays,
+                      "edge_drive_s": arrays["edge_len"] / (FALLBACK_SPEED_KMH["drive"] / 3.6),
+                      "edge_walk_s": arrays["edge_len"] / (WALK_SPEED_KMH / 3.6)}
+            meta["format"] = 1
+        if "seg_drive_off" not in arrays:
+            # .npz trước GRAPH_FORMAT 3: thời gian trong cạnh tỉ lệ với quãng đường (tốc độ trung bình của cạnh)
+            per_m = {mode: arrays[f"edge_{mode}_s"][arrays["seg_edge"]] / np.maximum(arrays["edge_len"][arrays["seg_edge"]], 1e-6)
+                     for mode in MODES}
+            arrays = {**arrays, **{f"seg_{mode}_off": arrays["seg_off"] * per_m[mode] for mode in MODES}}
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.meta = meta
+        self.n_nodes = len(self.node_point)
+        self._csr = None
+        self._csr_t = None
+        self._modes: Dict[str, ModeWeights] = {}
+
+    # ---------- lưu / nạp ----------
+    def save(self, path: str):
+        meta = np.array([f"{k}={v}" for k, v in self.meta.items()])
+        np.savez(path, meta=meta, **{name: getattr(self, name) for name in self.ARRAYS})
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledGraph":
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in cls.ARRAYS if name in data.files}
+            meta = dict(item.split("=", 1) for item in data["meta"].tolist())
+        return cls(arrays, meta)
+
+    @property
+    def format(self) -> int:
+        return int(self.meta.get("format", 1))
+
+    @property
+    def nbytes(self) -> int:
+        total = sum(getattr(self, name).nbytes for name in self.ARRAYS)
+        for m in (self._csr, self._csr_t):
+            if m is not None:
+                total += m.data.nbytes + m.indices.nbytes + m.indptr.nbytes
+        total += sum(w.nbytes for w in self._modes.values())
+        return int(total)
+
+    def number_of_nodes(self) -> int:
+        return self.n_nodes
+
+    def number_of_edges(self) -> int:
+        return len(self.edge_u)
+
+    # ---------- định tuyến ----------
+    def csr(self) -> csr_matrix:
+        """Ma trận kề CSR (cạnh song song giữ length nhỏ nhất)."""
+        if self._csr is None:
+            self._csr = _min_csr(self.edge_u, self.edge_v, self.edge_len, self.n_nodes)
+        return self._csr
+
+    def edge_seconds(self, mode: str) -> np.ndarray:
+        return self.edge_walk_s if mode == "walk" else self.edge_drive_s
+
+    def weights(self, mode: str) -> ModeWeights:
+        """CSR trọng số gói của phương tiện, dựng một lần mỗi graph (đi bộ: mọi cạnh đi được hai chiều)."""
+        w = self._modes.get(mode)
+        if w is None:
+            if mode == "walk":
+                u = np.concatenate([self.edge_u, self.edge_v])
+                v = np.concatenate([self.edge_v, self.edge_u])
+                w = ModeWeights.build(u, v, np.tile(self.edge_walk_s, 2), np.tile(self.edge_len, 2), self.n_nodes)
+            else:
+                w = ModeWeights.build(self.edge_u, self.edge_v, self.edge_drive_s, self.edge_len, self.n_nodes)
+            self._modes[mode] = w
+        return w
+
+    def prepare(self) -> "CompiledGraph":
+        """Dựng sẵn CSR length + CSR thời gian mọi phương tiện (lúc load, không phải lúc request)."""
+        self.csr_reverse()
+        for mode in MODES:
+            self.weights(mode)
+        return self
+
+    def snap(self, lat: float, lon: float) -> Tuple[int, float]:
+        """Snap (lat, lon) vào cạnh gần nhất -> (edge index, khoảng cách từ đầu cạnh theo m)."""
+        s, t = self._snap_segment(lat, lon)
+        return int(self.seg_edge[s]), float(self.seg_off[s] + t * self.seg_len[s])
+
+    def _snap_segment(self, lat: float, lon: float) -> Tuple[int, float]:
+        """Segment gần (lat, lon) nhất -> (segment index, vị trí 0..1 trên segment)."""
+        cx, cy = int(math.floor(lon / GRID_CELL_DEG)), int(math.floor(lat / GRID_CELL_DEG))
+        cand = np.empty(0, dtype=self.grid_items.dtype)
+        for ring in range(0, 64):
+            cells = [(cx + dx, cy + dy) for dx in range(-ring - 1, ring + 2) for dy in range(-ring - 1, ring + 2)]
+            cand = self._segments_in(cells)
+            if len(cand):
+                break
+        if not len(cand):
+            raise ValueError("Graph rỗng – không snap được")
+
+        kx = M_PER_DEG_LON * math.cos(math.radians(lat))
+        ax = (self.px[self.seg_p0[cand]] - lon) * kx
+        ay = (self.py[self.seg_p0[cand]] - lat) * M_PER_DEG_LAT
+        bx = (self.px[self.seg_p1[cand]] - lon) * kx
+        by = (self.py[self.seg_p1[cand]] - lat) * M_PER_DEG_LAT
+        dx, dy = bx - ax, by - ay
+        len2 = dx * dx + dy * dy
+        t = np.where(len2 > 0, np.clip(-(ax * dx + ay * dy) / np.where(len2 > 0, len2, 1), 0, 1), 0)
+        d2 = (ax + t * dx) ** 2 + (ay + t * dy) ** 2
+        best = int(np.argmin(d2))
+        return int(cand[best]), float(t[best])
+
+    def _seconds_at(self, seg: np.ndarray, t: np.ndarray, mode: str) -> np.ndarray:
+        """Thời gian (giây) từ đầu cạnh tới điểm ở vị trí t của segment seg (segment của một cạnh liền nhau)."""
+        off = self.seg_walk_off if mode == "walk" else self.seg_drive_off
+        edge = self.seg_edge[seg]
+        nxt = np.minimum(seg + 1, len(off) - 1)
+        end = np.where((seg + 1 < len(off)) & (self.seg_edge[nxt] == edge), off[nxt], self.edge_seconds(mode)[edge])
+        return off[seg] + t * (end - off[seg])
+
+    def _segments_in(self, cells: Sequence[Tuple[int, int]]) -> np.ndarray:
+        keys = np.array([_cell_key(x, y) for x, y in cells], dtype=np.int64)
+        pos = np.searchsorted(self.grid_keys, keys)
+        out = []
+        for k, p in zip(keys, pos):
+            if p < len(self.grid_keys) and self.grid_keys[p] == k:
+                out.append(self.grid_items[self.grid_start[p]:self.grid_start[p + 1]])
+        return np.unique(np.concatenate(out)) if out else np.empty(0, dtype=np.int64)
+
+    def csr_reverse(self) -> csr_matrix:
+        """Ma trận kề của graph đảo chiều (Dijkstra ngược: từ mọi node tới một đích)."""
+        if self._csr_t is None:
+            self._csr_t = self.csr().transpose().tocsr()
+        return self._csr_t
+
+    def _endpoints(self, coords: Sequence[Tuple[float, float]], mode: Optional[str] = None):
+        """
+        Snap từng điểm rồi trả về cách ra/vào mạng đường:
+        ra khỏi điểm: tới v (L - off), hoặc lùi về u (off) nếu đường hai chiều / điểm nằm đúng tại u;
+        vào điểm thì ngược lại. Chiều không đi được có chi phí inf.
+        mode=None: chi phí là mét; có mode: chi phí là giây (đi bộ: mọi cạnh hai chiều), *_len vẫn là mét.
+        """
+        snaps = [self._snap_segment(float(lat), float(lon)) for lat, lon in coords]
+        seg = np.array([s[0] for s in snaps], dtype=np.int64)
+        t = np.array([s[1] for s in snaps], dtype=np.float64)
+        e = self.seg_edge[seg].astype(np.int64)
+        off = self.seg_off[seg] + t * self.seg_len[seg]
+        L = self.edge_len[e]
+        u, v = self.edge_u[e].astype(np.int64), self.edge_v[e].astype(np.int64)
+        two_way = (self.edge_rev[e] >= 0) | (mode == "walk")
+        back = two_way | (off <= 1e-6)
+        ahead = two_way | (L - off <= 1e-6)
+        exit_len = np.stack([L - off, np.where(back, off, np.inf)], axis=1)
+        entry_len = np.stack([off, np.where(ahead, L - off, np.inf)], axis=1)
+        # chi phí theo thời gian: cộng dồn từng segment (cạnh đã gộp có thể qua nhiều loại đường)
+        at = self._seconds_at(seg, t, mode) if mode else off
+        total = self.edge_seconds(mode)[e] if mode else L
+        return {
+            "edge": e, "off": off, "at": at, "two_way": two_way,
+            "exit_node": np.stack([v, u], axis=1),
+            "exit_len": exit_len, "exit_cost": np.stack([total - at, np.where(back, at, np.inf)], axis=1),
+            "entry_node": np.stack([u, v], axis=1),
+            "entry_len": entry_len, "entry_cost": np.stack([at, np.where(ahead, total - at, np.inf)], axis=1),
+        }
+
+    def distance_km(self, src: Sequence[Tuple[float, float]], dst: Sequence[Tuple[float, float]]) -> np.ndarray:
+        """
+        Khoảng cách (km) theo mạng đường từ mỗi điểm src tới mỗi điểm dst, ma trận (len(src), len(dst)).
+        Một lần Dijkstra nhiều nguồn: xuôi từ các điểm ra của src, hoặc ngược (graph đảo chiều)
+        từ các điểm vào của dst khi dst ít hơn – vd thêm một POI chỉ cần một cột/một hàng.
+        """
+        S, T = self._endpoints(src), self._endpoints(dst)
+        out = np.full((len(src), len(dst)), np.inf)
+        if len(src) <= len(dst):
+            nodes, rows = np.unique(S["exit_node"], return_inverse=True)
+            rows = rows.reshape(S["exit_node"].shape)
+            D = dijkstra(self.csr(), directed=True, indices=nodes)
+            for k in range(2):
+                # (m, n, 2): exit k của i -> entry b của j
+                via = S["exit_cost"][:, k, None, None] + D[rows[:, k]][:, T["entry_node"]] + T["entry_cost"][None, :, :]
+                out = np.minimum(out, via.min(axis=2))
+        else:
+            nodes, rows = np.unique(T["entry_node"], return_inverse=True)
+            rows = rows.reshape(T["entry_node"].shape)
+            R = dijkstra(self.csr_reverse(), directed=True, indices=nodes)
+            for b in range(2):
+                # (n, m, 2): node ra a của i -> entry b của j, R[entry] = khoảng cách tới entry
+                via = T["entry_cost"][:, b, None, None] + R[rows[:, b]][:, S["exit_node"]] + S["exit_cost"][None, :, :]
+                out = np.minimum(out, via.min(axis=2).T)
+        # Cùng một cạnh: đi thẳng dọc cạnh (xuôi chiều, hoặc ngược nếu hai chiều)
+        same = S["edge"][:, None] == T["edge"][None, :]
+        delta = T["off"][None, :] - S["off"][:, None]
+        direct = np.where(delta >= 0, delta, np.where(S["two_way"][:, None], -delta, np.inf))
+        out = np.where(same, np.minimum(out, direct), out)
+        return out / 1000.0
+
+    def travel(self, src: Sequence[Tuple[float, float]], dst: Sequence[Tuple[float, float]],
+               mode: str = "drive") -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (phút, km) của đường nhanh nhất bằng `mode` từ mỗi điểm src tới mỗi điểm dst, hai ma trận (len(src), len(dst)).
+        Dijkstra nhiều nguồn trên CSR trọng số gói tính sẵn (xuôi từ src hoặc ngược từ dst như distance_km);
+        km là độ dài của chính đường nhanh nhất đó (giải mã từ cùng trọng số).
+        """
+        W = self.weights(mode)
+        S, T = self._endpoints(src, mode), self._endpoints(dst, mode)
+        times, lens = [], []
+        if len(src) <= len(dst):
+            nodes, rows = np.unique(S["exit_node"], return_inverse=True)
+            rows = rows.reshape(S["exit_node"].shape)
+            D = dijkstra(W.csr, directed=True, indices=nodes)
+            for k in range(2):
+                # (m, n, 2): exit k của i -> entry b của j
+                sec, met = unpack_weights(D[rows[:, k]][:, T["entry_node"]])
+                times.append(S["exit_cost"][:, k, None, None] + sec + T["entry_cost"][None, :, :])
+                lens.append(S["exit_len"][:, k, None, None] + met + T["entry_len"][None, :, :])
+        else:
+            nodes, rows = np.unique(T["entry_node"], return_inverse=True)
+            rows = rows.reshape(T["entry_node"].shape)
+            R = dijkstra(W.csr_t, directed=True, indices=nodes)
+            for b in range(2):
+                # (m, n, 2): node ra a của i -> entry b của j, R[entry] = trọng số tới entry
+                sec, met = unpack_weights(R[rows[:, b]][:, S["exit_node"]].transpose(1, 0, 2))
+                times.append(S["exit_cost"][:, None, :] + sec + T["entry_cost"][None, :, b, None])
+                lens.append(S["exit_len"][:, None, :] + met + T["entry_len"][None, :, b, None])
+        t_all, l_all = np.concatenate(times, axis=2), np.concatenate(lens, axis=2)
+        best = np.argmin(t_all, axis=2)[..., None]
+        sec = np.take_along_axis(t_all, best, axis=2)[..., 0]
+        met = np.take_along_axis(l_all, best, axis=2)[..., 0]
+        # Cùng một cạnh: đi thẳng dọc cạnh (xuôi chiều, hoặc ngược nếu hai chiều / đi bộ)
+        same = S["edge"][:, None] == T["edge"][None, :]
+        delta = T["off"][None, :] - S["off"][:, None]
+        direct = np.where(delta >= 0, delta, np.where(S["two_way"][:, None], -delta, np.inf))
+        delta_sec = T["at"][None, :] - S["at"][:, None]
+        direct_sec = np.where(delta >= 0, delta_sec, np.where(S["two_way"][:, None], -delta_sec, np.inf))
+        shorter = same & (direct_sec < sec)
+        sec = np.where(shorter, direct_sec, sec)
+        met = np.where(shorter, direct, met)
+        return sec / 60.0, met / 1000.0
+
+    def travel_matrix(self, coords: Sequence[Tuple[float, float]], mode: str = "drive") -> Tuple[np.ndarray, np.ndarray]:
+        """(phút, km) giữa các toạ độ (lat, lon) bằng `mode` (có hướng với xe)."""
+        minutes, km = self.travel(coords, coords, mode)
+        np.fill_diagonal(minutes, 0.0)
+        np.fill_diagonal(km, 0.0)
+        return minutes, km
+
+    def distance_matrix_km(self, coords: Sequence[Tuple[float, float]]) -> np.ndarray:
+        """Ma trận khoảng cách (km) giữa các toạ độ (lat, lon) theo mạng đường (có hướng)."""
+        dist = self.distance_km(coords, coords)
+        np.fill_diagonal(dist, 0.0)
+        return dist
+
+
+def _cell_key(x: int, y: int) -> int:
+    return (int(x) + (1 << 20)) * (1 << 21) + (int(y) + (1 << 20))
+
+
+def _min_edges(u: np.ndarray, v: np.ndarray, w: np.ndarray) -> np.ndarray:
+    """Chỉ số các cạnh giữ lại khi gộp cạnh song song (w nhỏ nhất mỗi cặp), sort theo (u, v)."""
+    order = np.lexsort((w, v, u))
+    su, sv = u[order], v[order]
+    first = np.ones(len(u), dtype=bool)
+    first[1:] = (su[1:] != su[:-1]) | (sv[1:] != sv[:-1])
+    return order[first]
+
+
+def _min_csr(u: np.ndarray, v: np.ndarray, w: np.ndarray, n: int) -> csr_matrix:
+    keep = _min_edges(u, v, w)
+    # scipy coi 0 là "không có cạnh" -> length 0 đổi thành rất nhỏ
+    return csr_matrix((np.maximum(w[keep], 1e-6), (u[keep], v[keep])), shape=(n, n))
+
+
+def _build_grid(px, py, seg_p0, seg_p1) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    x0 = np.floor(np.minimum(px[seg_p0], px[seg_p1]) / GRID_CELL_DEG).astype(np.int64)
+    x1 = np.floor(np.maximum(px[seg_p0], px[seg_p1]) / GRID_CELL_DEG).astype(np.int64)
+    y0 = np.floor(np.minimum(py[seg_p0], py[seg_p1]) / GRID_CELL_DEG).astype(np.int64)
+    y1 = np.floor(np.maximum(py[seg_p0], py[seg_p1]) / GRID_CELL_DEG).astype(np.int64)
+    keys, items = [], []
+    single = (x0 == x1) & (y0 == y1)
+    idx = np.nonzero(single)[0]
+    keys.append(_cell_key_vec(x0[idx], y0[idx]))
+    items.append(idx)
+    for s in np.nonzero(~single)[0]:
+        for cx in range(x0[s], x1[s] + 1):
+            for cy in range(y0[s], y1[s] + 1):
+                keys.append(np.array([_cell_key(cx, cy)], dtype=np.int64))
+                items.append(np.array([s]))
+    keys = np.concatenate(keys)
+    items = np.concatenate(items).astype(np.int64)
+    order = np.argsort(keys, kind="stable")
+    keys, items = keys[order], items[order]
+    uniq, start = np.unique(keys, return_index=True)
+    start = np.append(start, len(keys)).astype(np.int64)
+    return uniq, start, items
+
+
+def _cell_key_vec(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    return (x + (1 << 20)) * (1 << 21) + (y + (1 << 20))
+
+
+def compile_graph(G: nx.MultiDiGraph) -> CompiledGraph:
+    """Graph osmnx -> CompiledGraph (SCC lớn nhất + gộp node bậc 2)."""
+    ids = list(G.nodes)
+    index = {n: i for i, n in enumerate(ids)}
+    V = len(ids)
+    x = np.array([float(G.nodes[n]["x"]) for n in ids])
+    y = np.array([float(G.nodes[n]["y"]) for n in ids])
+
+    us, vs, ls, speeds, detours = [], [], [], [], []
+    for a, b, data in G.edges(data=True):
+        if a == b:
+            continue
+        us.append(index[a])
+        vs.append(index[b])
+        ls.append(float(data.get("length", "nan")))
+        speed, detour = edge_speeds(data)
+        speeds.append(speed)
+        detours.append(detour)
+    u = np.array(us, dtype=np.int64)
+    v = np.array(vs, dtype=np.int64)
+    length = np.array(ls, dtype=np.float64)
+    # Cạnh thiếu length -> haversine, vector hoá
+    missing = ~np.isfinite(length)
+    length[missing] = haversine_m(y[u[missing]], x[u[missing]], y[v[missing]], x[v[missing]])
+    drive_s = length / (np.array(speeds, dtype=np.float64) / 3.6)
+    walk_s = length * np.array(detours, dtype=np.float64) / (WALK_SPEED_KMH / 3.6)
+
+    # 1. Thành phần liên thông mạnh lớn nhất (data = chỉ số cạnh gốc + 1 để giữ được thuộc tính cạnh)
+    kept = _min_edges(u, v, length)
+    A = csr_matrix(((kept + 1).astype(np.float64), (u[kept], v[kept])), shape=(V, V))
+    _, labels = connected_components(A, directed=True, connection="strong")
+    keep = labels == np.bincount(labels).argmax()
+    A = A[keep][:, keep].tocsr()
+    x, y = x[keep], y[keep]
+    n_scc = int(keep.sum())
+
+    # 2. Gộp chuỗi node bậc 2
+    out_adj: List[List[Tuple[int, int]]] = [[] for _ in range(n_scc)]
+    in_adj: List[set] = [set() for _ in range(n_scc)]
+    coo = A.tocoo()
+    for a, b, w in zip(coo.row.tolist(), coo.col.tolist(), coo.data.tolist()):
+        out_adj[a].append((b, int(w) - 1))
+        in_adj[b].add(a)
+
+    def contractible(n: int) -> bool:
+        outs = {b for b, _ in out_adj[n]}
+        ins = in_adj[n]
+        if len(outs) == 1 and len(ins) == 1:
+            return outs != ins  # a -> n -> b (một chiều)
+        return len(outs) == 2 and outs == ins  # a <-> n <-> b (hai chiều)
+
+    is_kept = np.array([not contractible(n) for n in range(n_scc)], dtype=bool)
+    # (u, v, length, polyline, độ dài / giây xe / giây đi bộ từng segment)
+    edges: List[Tuple[int, int, float, List[int], List[float], List[float], List[float]]] = []
+    visited = np.zeros(n_scc, dtype=bool)
+
+    def walk_from(s: int):
+        for b, i in out_adj[s]:
+            path, seg_lens, prev, cur = [s], [length[i]], s, b
+            seg_d, seg_w = [drive_s[i]], [walk_s[i]]
+            while not is_kept[cur]:
+                visited[cur] = True
+                path.append(cur)
+                nxt = [(c, ci) for c, ci in out_adj[cur] if c != prev] or out_adj[cur]
+                c, ci = nxt[0]
+                prev, cur = cur, c
+                seg_lens.append(length[ci])
+                seg_d.append(drive_s[ci])
+                seg_w.append(walk_s[ci])
+            path.append(cur)
+            edges.append((s, cur, float(sum(seg_lens)), path, seg_lens, seg_d, seg_w))
+
+    for s in np.nonzero(is_kept)[0].tolist():
+        walk_from(s)
+    # Vòng khép kín toàn node bậc 2 (không gặp node giữ lại nào): chọn một node làm mốc
+    for n in range(n_scc):
+        if not is_kept[n] and not visited[n]:
+            is_kept[n] = True
+            walk_from(n)
+            for e in edges:
+                for p in e[3][1:-1]:
+                    visited[p] = True
+
+    kept_ids = np.nonzero(is_kept)[0]
+    route_index = -np.ones(n_scc, dtype=np.int64)
+    route_index[kept_ids] = np.arange(len(kept_ids))
+
+    E = len(edges)
+    edge_u = np.array([route_index[e[0]] for e in edges], dtype=np.int32)
+    edge_v = np.array([route_index[e[1]] for e in edges], dtype=np.int32)
+    edge_len = np.array([e[2] for e in edges], dtype=np.float64)
+
+    # Cạnh ngược: cùng cặp đầu mút đảo chiều và cùng polyline đảo ngược
+    by_path = {tuple(e[3]): i for i, e in enumerate(edges)}
+    edge_rev = np.array([by_path.get(tuple(reversed(e[3])), -1) for e in edges], dtype=np.int32)
+
+    seg_edge, seg_p0, seg_p1, seg_off, seg_len, seg_drive_off, seg_walk_off = [], [], [], [], [], [], []
+    for i, (_, _, _, path, lens, seg_d, seg_w) in enumerate(edges):
+        off = off_d = off_w = 0.0
+        for k in range(len(path) - 1):
+            seg_edge.append(i)
+            seg_p0.append(path[k])
+            seg_p1.append(path[k + 1])
+            seg_off.append(off)
+            seg_len.append(lens[k])
+            seg_drive_off.append(off_d)
+            seg_walk_off.append(off_w)
+            off += lens[k]
+            off_d += seg_d[k]
+            off_w += seg_w[k]
+    seg_p0 = np.array(seg_p0, dtype=np.int32)
+    seg_p1 = np.array(seg_p1, dtype=np.int32)
+    grid_keys, grid_start, grid_items = _build_grid(x, y, seg_p0, seg_p1)
+
+    arrays = {
+        "px": x, "py": y,
+        "node_point": kept_ids.astype(np.int32),
+        "edge_u": edge_u, "edge_v": edge_v, "edge_len": edge_len, "edge_rev": edge_rev,
+        "edge_drive_s": np.array([float(sum(e[5])) for e in edges], dtype=np.float64),
+        "edge_walk_s": np.array([float(sum(e[6])) for e in edges], dtype=np.float64),
+        "seg_edge": np.array(seg_edge, dtype=np.int32), "seg_p0": seg_p0, "seg_p1": seg_p1,
+        "seg_off": np.array(seg_off, dtype=np.float64), "seg_len": np.array(seg_len, dtype=np.float64),
+        "seg_drive_off": np.array(seg_drive_off, dtype=np.float64),
+        "seg_walk_off": np.array(seg_walk_off, dtype=np.float64),
+        "grid_keys": grid_keys, "grid_start": grid_start, "grid_items": grid_items.astype(np.int32),
+    }
+    meta = {"format": GRAPH_FORMAT, "source_nodes": V, "source_edges": G.number_of_edges(), "scc_nodes": n_scc,
+            "nodes": len(kept_ids), "edges": E}
+    return CompiledGraph(arrays, meta)
+
+
+# =====================================================
+# 💾 CACHE THEO THÀNH PHỐ
+# =====================================================
+def compiled_path(city: str, data_dir: str = "data") -> str:
+    return os.path.join(data_dir, f"{city_slug(city)}_graph.npz")
+
+
+def read_graphml(path: str) -> nx.MultiDiGraph:
+    """Đọc GraphML của osmnx; không cần osmnx (chỉ cần x, y, length)."""
+    try:
+        import osmnx as ox
+        return ox.load_graphml(path)
+    except ImportError:
+        G = nx.read_graphml(path, force_multigraph=True)
+        if not G.is_directed():
+            G = G.to_directed()
+        return G
+
+
+def load_compiled_graph(city: str, data_dir: str = "data") -> CompiledGraph:
+    """
+    Graph đã biên dịch của thành phố: dùng <slug>_graph.npz nếu mới hơn GraphML (và cùng GRAPH_FORMAT khi có
+    GraphML để biên dịch lại), nếu không thì biên dịch từ GraphML (hoặc tải mới khi tắt offline) rồi lưu lại .npz.
+    CSR length + thời gian mọi phương tiện được dựng sẵn trước khi trả về.
+    """
+    from . import geo_graph
+
+    npz = compiled_path(city, data_dir)
+    graphml = geo_graph._get_graph_cache_path(city, data_dir)
+    if os.path.exists(npz) and (not os.path.exists(graphml) or os.path.getmtime(npz) >= os.path.getmtime(graphml)):
+        CG = CompiledGraph.load(npz)
+        if CG.format >= GRAPH_FORMAT or not os.path.exists(graphml):
+            return CG.prepare()
+
+    if os.path.exists(graphml):
+        G = read_graphml(graphml)
+    else:
+        G = geo_graph.road_graph_for_city(city)  # raise khi offline / thiếu osmnx
+    CG = compile_graph(G)
+    CG.save(npz)
+    print(f"💾 Graph đã biên dịch: {npz} ({CG.meta['nodes']} node, {CG.meta['edges']} cạnh)")
+    return CG.prepare()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Biên dịch road graph GraphML -> npz gọn cho định tuyến")
+    ap.add_argument("--city", required=True)
+    ap.add_argument("--data-dir", default="data")
+    ap.add_argument("--graphml", default=None, help="đường dẫn GraphML (mặc định data/<slug>_graph.graphml)")
+    args = ap.parse_args(argv)
+
+    from . import geo_graph
+    src = args.graphml or geo_graph._get_graph_cache_path(args.city, args.data_dir)
+    if not os.path.exists(src):
+        print(f"❌ Không có GraphML: {src}")
+        return 1
+    CG = compile_graph(read_graphml(src))
+    out = compiled_path(args.city, args.data_dir)
+    CG.save(out)
+    m = CG.meta
+    print(f"✅ {src} -> {out}")
+    print(f"   node: {m['source_nodes']} -> SCC {m['scc_nodes']} -> {m['nodes']} sau khi gộp bậc 2")
+    print(f"   cạnh: {m['source_edges']} -> {m['edges']} | {CG.nbytes / 1e6:.1f} MB")
+    drive_kmh = CG.edge_len.sum() / CG.edge_drive_s.sum() * 3.6
+    print(f"   tốc độ xe trung bình theo length: {drive_kmh:.1f} km/h, đi bộ {WALK_SPEED_KMH} km/h")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,11 @@
 import os, re, pickle
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.naive_bayes import MultinomialNB
+from . import singleflight
 
 MODEL = os.path.join("data","intent_model.pkl")
+_FLIGHT = singleflight.group("intent_model")
+_model = None  # (vec, clf) đã load, dùng lại cho mọi request
 
 SEED = [
     # Weather queries
@@ -30,11 +33,24 @@ def _train():
     vec = TfidfVectorizer()
     Xv = vec.fit_transform(X)
     clf = MultinomialNB().fit(Xv, y)
-    with open(MODEL, "wb") as f: pickle.dump((vec, clf), f)
+    # ghi file tạm rồi os.replace: process khác không bao giờ đọc phải file ghi dở
+    tmp = f"{MODEL}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f: pickle.dump((vec, clf), f)
+    os.replace(tmp, MODEL)
+    return vec, clf
+
+def _load():
+    global _model
+    if _model is None:
+        if os.path.exists(MODEL):
+            with open(MODEL, "rb") as f: _model = pickle.load(f)
+        else:
+            _model = _train()
+    return _model
 
 def _local(text: str) -> str:
-    if not os.path.exists(MODEL): _train()
-    vec, clf = pickle.load(open(MODEL, "rb"))
+    # lần đầu: các request đồng thời chờ chung một lần load/train (single-flight)
+    vec, clf = _model or _FLIGHT.do(MODEL, _load)
     return clf.predict(vec.transform([text]))[0]
 
 def _rule(t: str):
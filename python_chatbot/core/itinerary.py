@@ -1,6 +1,12 @@
 from typing import Dict, List
-from .route_optimizer import pairwise_distance_matrix, mst_order, greedy_path, total_distance
+
+import numpy as np
+import pandas as pd
+
+from .graph_compiler import travel_mode
+from .route_optimizer import pairwise_travel_matrix, mst_order, greedy_path, total_distance
 from .recommender import recommend_pois
+from .metrics import stage
 
 def _penalize_by_weather(pois: List[Dict], weather_desc: str):
     if not weather_desc:
@@ -16,82 +22,170 @@ def _penalize_by_weather(pois: List[Dict], weather_desc: str):
     return pois
 
 
-def _select_pois_for_days(pois: List[Dict], days: int, max_per_day: int = 6):
+def _balanced_assign(D: np.ndarray, cost: np.ndarray, cap: int, budget: float) -> np.ndarray:
+    """
+    Gán điểm -> cụm theo thứ tự khoảng cách tăng dần (toàn bộ cặp điểm-cụm),
+    bỏ qua cụm đã đủ `cap` điểm hoặc vượt `budget`. Điểm không gán được -> -1.
+    """
+    n, k = D.shape
+    labels = -np.ones(n, dtype=int)
+    size = np.zeros(k, dtype=int)
+    spent = np.zeros(k)
+    for flat in np.argsort(D, axis=None, kind="stable"):
+        i, c = divmod(int(flat), k)
+        if labels[i] >= 0 or size[c] >= cap or spent[c] + cost[i] > budget:
+            continue
+        labels[i] = c
+        size[c] += 1
+        spent[c] += cost[i]
+    return labels
+
+
+def _select_pois_for_days(pois: List[Dict], days: int, max_per_day: int = 6,
+                          budget_per_day: float = float("inf"), iters: int = 20):
+    """
+    Chia POI điểm cao nhất thành `days` cụm gần nhau về địa lý (k-means cân bằng):
+    mỗi ngày tối đa `max_per_day` điểm và tổng avg_cost không vượt `budget_per_day`.
+    Khởi tạo tâm xác định (farthest-point từ POI điểm cao nhất) -> cùng input cho cùng lịch trình.
+    """
     pois = sorted(pois, key=lambda x: x.get("final", 0), reverse=True)
     k = min(len(pois), days * max_per_day)
     chosen = pois[:k]
-    per_day = []
-    for d in range(days):
-        per_day.append(chosen[d::days][:max_per_day])
-    return per_day
+    if not chosen:
+        return [[] for _ in range(days)]
 
+    lat = pd.to_numeric(pd.Series([p.get("lat") for p in chosen], dtype=object), errors="coerce").to_numpy(float, copy=True)
+    lon = pd.to_numeric(pd.Series([p.get("lon") for p in chosen], dtype=object), errors="coerce").to_numpy(float, copy=True)
+    missing = ~(np.isfinite(lat) & np.isfinite(lon))
+    if missing.all():
+        return [chosen[d::days][:max_per_day] for d in range(days)]
+    lat[missing], lon[missing] = np.nanmean(lat), np.nanmean(lon)
+    # Toạ độ phẳng xấp xỉ (độ), kinh độ nhân cos(vĩ độ) để khoảng cách hai trục tương đương
+    X = np.column_stack([lat, lon * np.cos(np.radians(np.mean(lat)))])
+    cost = np.array([float(p.get("avg_cost") or 0) for p in chosen])
+    n_clusters = min(days, len(chosen))
 
-def build_itinerary(params: Dict, poi_df, weather_now: Dict):
-    """
-    Sinh lịch trình tối ưu hoá theo ngày.
-    Returns: list of days with optimized POI ordering
-    """
+    # Farthest-point init: POI điểm cao nhất, rồi lần lượt điểm xa nhất so với các tâm đã có
+    centers = [0]
+    d_min = ((X - X[0]) ** 2).sum(axis=1)
+    for _ in range(1, n_clusters):
+        nxt = int(np.argmax(d_min))
+        centers.append(nxt)
+        d_min = np.minimum(d_min, ((X - X[nxt]) ** 2).sum(axis=1))
+    C = X[centers].copy()
+
+    labels = None
+    for _ in range(iters):
+        D = ((X[:, None, :] - C[None, :, :]) ** 2).sum(axis=2)
+        new_labels = _balanced_assign(D, cost, max_per_day, budget_per_day)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for c in range(n_clusters):
+            members = labels == c
+            if members.any():
+                C[c] = X[members].mean(axis=0)
+
+    # Ngày 1 = cụm chứa POI điểm cao nhất (chosen đã sắp theo điểm giảm dần)
+    clusters = [[chosen[i] for i in np.nonzero(labels == c)[0]] for c in range(n_clusters)]
+    clusters.sort(key=lambda ps: -ps[0].get("final", 0) if ps else 0)
+    return clusters + [[] for _ in range(days - len(clusters))]
+
+
+def gather_candidates(params: Dict, weather_desc: str = "") -> List[Dict]:
+    """Gợi ý POI của mọi category cho params (đã chấm điểm + phạt theo thời tiết)."""
     city   = params["city"]
-    days   = int(params.get("days", 2))
     budget = int(params.get("budget_vnd", 1_500_000))
     taste  = params.get("taste_tags", [])
     acts   = params.get("activity_tags", [])
     walk_km = float(params.get("walk_tolerance_km", 5.0))
-    weather_desc = weather_now.get("description", "")
 
-    # 1️⃣ Get recommendations for all categories
     all_pois = []
     categories = ["food", "cafe", "entertainment", "shopping", "attraction"]
     
     for category in categories:
         try:
-            pois = recommend_pois(
-                city=city,
-                category=category,
-                user_query="",
-                taste_tags=taste,
-                activity_tags=acts,
-                budget_per_day=budget,
-                walk_tolerance_km=walk_km,
-                weather_desc=weather_desc
-            )
+            with stage("scoring"):
+                pois = recommend_pois(
+                    city=city,
+                    category=category,
+                    user_query="",
+                    taste_tags=taste,
+                    activity_tags=acts,
+                    budget_per_day=budget,
+                    walk_tolerance_km=walk_km,
+                    weather_desc=weather_desc,
+                    user_id=params.get("user_id")
+                )
             if pois:
                 all_pois.extend(pois)
         except Exception as e:
             print(f"⚠️ Error loading {category}: {e}")
             continue
-    
+
+    # Apply weather penalty
+    return _penalize_by_weather(all_pois, weather_desc)
+
+
+def order_day(dpois: List[Dict], minutes: list, km: list):
+    """
+    Tối ưu thứ tự tour của một ngày theo thời gian di chuyển từ ma trận có sẵn
+    -> (pois, ma trận phút + km theo thứ tự mới, tổng phút, tổng km).
+    """
+    if len(dpois) < 2:
+        return list(dpois), [row[:] for row in minutes], [row[:] for row in km], 0.0, 0.0
+    with stage("tour"):
+        order = mst_order(minutes)
+    return ([dpois[i] for i in order], _reorder(minutes, order), _reorder(km, order),
+            total_distance(minutes, order), total_distance(km, order))
+
+
+def _reorder(matrix: list, order: list) -> list:
+    return [[matrix[i][j] for j in order] for i in order]
+
+
+def optimize_day(city: str, dpois: List[Dict], mode: str = "drive"):
+    """Tính ma trận thời gian/khoảng cách bằng `mode` cho một ngày rồi tối ưu thứ tự (xem order_day)."""
+    if len(dpois) < 2:
+        zeros = [[0.0] * len(dpois) for _ in dpois]
+        return list(dpois), zeros, [row[:] for row in zeros], 0.0, 0.0
+    with stage("distance_matrix"):
+        minutes, km = pairwise_travel_matrix(city, dpois, mode)
+    return order_day(dpois, minutes, km)
+
+
+def build_itinerary(params: Dict, poi_df, weather_now: Dict):
+    """
+    Sinh lịch trình tối ưu hoá theo ngày: thứ tự tour tối ưu theo thời gian di chuyển của phương tiện
+    (params["transport"]: "xe máy/ô tô" -> drive, "đi bộ" -> walk).
+    Returns: list of days with optimized POI ordering (distance km + travel_minutes)
+    """
+    city   = params["city"]
+    days   = int(params.get("days", 2))
+    budget = int(params.get("budget_vnd", 1_500_000))
+    mode   = travel_mode(params.get("transport"))
+    weather_desc = weather_now.get("description", "")
+
+    # 1️⃣ Get recommendations for all categories
+    all_pois = gather_candidates(params, weather_desc)
     if not all_pois:
         return []
-    
-    # Apply weather penalty
-    all_pois = _penalize_by_weather(all_pois, weather_desc)
 
-    # 2️⃣ Chia địa điểm theo ngày (mỗi ngày ~5-6 điểm)
-    days_pois = _select_pois_for_days(all_pois, days, max_per_day=6)
+    # 2️⃣ Chia địa điểm theo ngày: cụm gần nhau, mỗi ngày ~5-6 điểm, trong ngân sách/ngày
+    with stage("partition"):
+        days_pois = _select_pois_for_days(all_pois, days, max_per_day=6, budget_per_day=budget)
 
     # 3️⃣ Tối ưu thứ tự cho từng ngày
     out_days = []
     for day_idx, dpois in enumerate(days_pois):
-        if len(dpois) < 2:
-            out_days.append({
-                "title": f"Ngày {day_idx + 1}",
-                "pois": dpois,
-                "distance": 0.0,
-                "weather": weather_desc
-            })
-            continue
-
         try:
-            dist, coords, G = pairwise_distance_matrix(city, dpois)
-            order = mst_order(dist)
-            ordered_pois = [dpois[i] for i in order]
-            total_km = total_distance(dist, order)
-
+            ordered_pois, _, _, total_min, total_km = optimize_day(city, dpois, mode)
             out_days.append({
                 "title": f"Ngày {day_idx + 1}",
                 "pois": ordered_pois,
                 "distance": round(total_km, 2),
+                "travel_minutes": round(total_min, 1),
+                "transport": mode,
                 "weather": weather_desc
             })
         except Exception as e:
@@ -100,6 +194,8 @@ def build_itinerary(params: Dict, poi_df, weather_now: Dict):
                 "title": f"Ngày {day_idx + 1}",
                 "pois": dpois,
                 "distance": 0.0,
+                "travel_minutes": 0.0,
+                "transport": mode,
                 "weather": weather_desc
             })
 
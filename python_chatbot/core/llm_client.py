@@ -0,0 +1,255 @@
+"""
+Lớp client LLM dùng chung cho llm_orchestrator / llm_parser.
+
+- Một client OpenAI cho cả process (giữ kết nối HTTP keep-alive), timeout + số lần retry theo env
+- Cache phản hồi: LRU trong bộ nhớ + SQLite (data/llm_cache.db), key = model + system prompt +
+  user prompt đã chuẩn hoá (NFC, gộp khoảng trắng, casefold) + temperature + max_tokens
+- Lời gọi đồng thời cùng key chỉ gọi API một lần (core/singleflight.py)
+- TRIPIZ_LLM_MODE: live (mặc định) | record (gọi thật và ghi vào cassette JSONL) |
+  replay (chỉ đọc cassette, không cần API key, thiếu key -> LLMReplayMiss) cho test/benchmark
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from openai import OpenAI
+
+from . import metrics, singleflight
+
+load_dotenv()
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None  # stub/proxy; None -> endpoint mặc định
+DEFAULT_MODEL = os.getenv("TRIPIZ_LLM_MODEL", "gpt-4o-mini")
+LLM_TIMEOUT_S = float(os.getenv("TRIPIZ_LLM_TIMEOUT_S", "10"))
+LLM_MAX_RETRIES = int(os.getenv("TRIPIZ_LLM_MAX_RETRIES", "1"))
+LLM_MODE = os.getenv("TRIPIZ_LLM_MODE", "live").lower()
+LLM_CASSETTE = os.getenv("TRIPIZ_LLM_CASSETTE", "data/llm_cassette.jsonl")
+LLM_CACHE_DB = os.getenv("TRIPIZ_LLM_CACHE_DB", "data/llm_cache.db")  # "" -> chỉ cache trong bộ nhớ
+LLM_CACHE_TTL_S = float(os.getenv("TRIPIZ_LLM_CACHE_TTL_S", str(7 * 24 * 3600)))  # 0 -> tắt cache
+LLM_CACHE_HOT_MAX = 1024
+
+LLM_CALLS = metrics.counter("tripiz_llm_calls_total", "Số lời gọi LLM theo nguồn trả lời",
+                            ("purpose", "source"))
+LLM_SECONDS = metrics.histogram("tripiz_llm_request_seconds", "Thời gian gọi API LLM (không tính cache)",
+                                ("purpose",))
+LLM_ERRORS = metrics.counter("tripiz_llm_errors_total", "Số lời gọi LLM lỗi/timeout", ("purpose",))
+
+_FLIGHT = singleflight.group("llm")
+_WS = re.compile(r"\s+")
+
+
+class LLMUnavailable(RuntimeError):
+    """Không có API key và không ở chế độ replay."""
+
+
+class LLMReplayMiss(LookupError):
+    """Chế độ replay nhưng cassette không có phản hồi cho key này."""
+
+
+def normalize_prompt(text: str) -> str:
+    """Dạng chuẩn của prompt để làm key cache: NFC, gộp khoảng trắng, casefold."""
+    return _WS.sub(" ", unicodedata.normalize("NFC", text or "")).strip().casefold()
+
+
+def cache_key(model: str, system_prompt: str, prompt: str, temperature: float, max_tokens: Optional[int]) -> str:
+    raw = json.dumps([model, system_prompt.strip(), normalize_prompt(prompt), round(float(temperature), 3), max_tokens],
+                     ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU trong bộ nhớ trước SQLite; entry quá TTL coi như không có."""
+
+    def __init__(self, db_path: str = LLM_CACHE_DB, ttl_s: float = LLM_CACHE_TTL_S, hot_max: int = LLM_CACHE_HOT_MAX):
+        self.db_path = db_path
+        self.ttl_s = ttl_s
+        self.hot_max = hot_max
+        self._hot: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (thời điểm tạo, nội dung)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if not self.db_path:
+            return None
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, model TEXT NOT NULL, content TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        if self.ttl_s <= 0:
+            return None
+        now = time.time()
+        with self._lock:
+            hit = self._hot.get(key)
+            if hit is None:
+                conn = self._db()
+                row = conn.execute("SELECT created_at, content FROM llm_cache WHERE key = ?", (key,)).fetchone() \
+                    if conn is not None else None
+                if row is None:
+                    return None
+                hit = self._remember(key, (row[0], row[1]))
+            if now - hit[0] >= self.ttl_s:
+                self._hot.pop(key, None)
+                return None
+            self._hot.move_to_end(key)
+            return hit[1]
+
+    def put(self, key: str, model: str, content: str):
+        if self.ttl_s <= 0:
+            return
+        created = time.time()
+        with self._lock:
+            self._remember(key, (created, content))
+            conn = self._db()
+            if conn is not None:
+                conn.execute("INSERT OR REPLACE INTO llm_cache (key, model, content, created_at) VALUES (?, ?, ?, ?)",
+                             (key, model, content, created))
+                conn.commit()
+
+    def _remember(self, key: str, entry: tuple) -> tuple:
+        self._hot[key] = entry
+        while len(self._hot) > self.hot_max:
+            self._hot.popitem(last=False)
+        return entry
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class Cassette:
+    """File JSONL {key, model, system, prompt, content}: ghi ở chế độ record, đọc ở chế độ replay."""
+
+    def __init__(self, path: str = LLM_CASSETTE):
+        self.path = path
+        self._entries: Optional[Dict[str, str]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, str]:
+        if self._entries is None:
+            entries: Dict[str, str] = {}
+            if os.path.exists(self.path):
+                with open(self.path, encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            rec = json.loads(line)
+                            entries[rec["key"]] = rec["content"]
+            self._entries = entries
+        return self._entries
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._load().get(key)
+
+    def record(self, key: str, model: str, system_prompt: str, prompt: str, content: str):
+        with self._lock:
+            entries = self._load()
+            if entries.get(key) == content:
+                return
+            entries[key] = content
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "model": model, "system": system_prompt, "prompt": prompt,
+                                    "content": content}, ensure_ascii=False) + "\n")
+
+
+_client = None
+_client_lock = threading.Lock()
+_cache = ResponseCache()
+_cassette = Cassette()
+
+
+def available() -> bool:
+    """Có thể trả lời bằng LLM (có key, hoặc replay từ cassette)."""
+    return LLM_MODE == "replay" or bool(OPENAI_API_KEY)
+
+
+def _openai():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL,
+                                 timeout=LLM_TIMEOUT_S, max_retries=LLM_MAX_RETRIES)
+    return _client
+
+
+def _call_api(model: str, system_prompt: str, prompt: str, temperature: float, max_tokens: Optional[int],
+              timeout: float, purpose: str) -> str:
+    kwargs = {"max_tokens": max_tokens} if max_tokens is not None else {}
+    t0 = time.perf_counter()
+    try:
+        r = _openai().chat.completions.create(
+            model=model,
+            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}],
+            temperature=temperature,
+            timeout=timeout,
+            **kwargs,
+        )
+    except Exception:
+        LLM_ERRORS.inc(purpose=purpose)
+        raise
+    finally:
+        LLM_SECONDS.observe(time.perf_counter() - t0, purpose=purpose)
+    return (r.choices[0].message.content or "").strip()
+
+
+def complete(prompt: str, system_prompt: str, *, model: str = DEFAULT_MODEL, temperature: float = 0.0,
+             max_tokens: Optional[int] = None, timeout: Optional[float] = None, purpose: str = "chat",
+             use_cache: bool = True) -> str:
+    """
+    Nội dung trả lời cho (system_prompt, prompt). Lỗi API/timeout được raise cho caller tự fallback;
+    thời gian chờ API bị chặn bởi timeout (mặc định TRIPIZ_LLM_TIMEOUT_S).
+    """
+    key = cache_key(model, system_prompt, prompt, temperature, max_tokens)
+    if LLM_MODE == "replay":
+        content = _cassette.get(key)
+        if content is None:
+            LLM_CALLS.inc(purpose=purpose, source="replay_miss")
+            raise LLMReplayMiss(f"Cassette {_cassette.path} không có phản hồi cho prompt {prompt[:60]!r}")
+        LLM_CALLS.inc(purpose=purpose, source="replay")
+        return content
+    if not OPENAI_API_KEY:
+        raise LLMUnavailable("OPENAI_API_KEY chưa được cấu hình")
+
+    if use_cache:
+        content = _cache.get(key)
+        if content is not None:
+            LLM_CALLS.inc(purpose=purpose, source="cache")
+            if LLM_MODE == "record":
+                _cassette.record(key, model, system_prompt, prompt, content)
+            return content
+
+    def fetch() -> str:
+        LLM_CALLS.inc(purpose=purpose, source="api")
+        content = _call_api(model, system_prompt, prompt, temperature, max_tokens,
+                            LLM_TIMEOUT_S if timeout is None else timeout, purpose)
+        if use_cache:
+            _cache.put(key, model, content)
+        if LLM_MODE == "record":
+            _cassette.record(key, model, system_prompt, prompt, content)
+        return content
+
+    return _FLIGHT.do(key, fetch)
+
+
+def close_llm_cache():
+    _cache.close()
@@ -23,6 +23,8 @@ def compose_plan_response(plan_raw, params):
     for i, day in enumerate(days, 1):
         pois = day.get("pois") or day.get("order", []) if isinstance(day, dict) else []
         distance = day.get("distance") or day.get("distance_km", 0) if isinstance(day, dict) else 0
+        minutes = day.get("travel_minutes") if isinstance(day, dict) else None
         names = ", ".join(p['name'] for p in pois)
-        lines.append(f"Ngày {i}: {names} (≈ {distance} km)")
+        travel = f"≈ {distance} km, {minutes:.0f} phút di chuyển" if minutes else f"≈ {distance} km"
+        lines.append(f"Ngày {i}: {names} ({travel})")
     return "\n".join(lines)
@@ -1,28 +1,35 @@
-import os, json
-from dotenv import load_dotenv
-from openai import OpenAI
+import json
+import os
+from .llm_client import available, complete
+from .param_extractor import extract_params
 
-load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+DEFAULT_PARAMS = {"city":"Hồ Chí Minh","budget_vnd":1_500_000,"days":2,"taste_tags":[],"activity_tags":[],"walk_tolerance_km":5.0,"transport":"xe máy/ô tô"}
+# Dưới ngưỡng này (chưa thấy city/days/budget nào trong câu) mới nhờ LLM
+PARSE_MIN_CONFIDENCE = float(os.getenv("TRIPIZ_PARSE_MIN_CONFIDENCE", "0.25"))
 
-def parse_prompt_to_params(prompt: str):
-    """
-    Trả về JSON: {city, budget_vnd, days, taste_tags, activity_tags, walk_tolerance_km, transport}
-    """
-    if not OPENAI_API_KEY:
-        # fallback tối thiểu
-        return {"city":"Hồ Chí Minh","budget_vnd":1_500_000,"days":2,"taste_tags":[],"activity_tags":[],"walk_tolerance_km":5.0,"transport":"xe máy/ô tô"}
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    sys = """Bạn là module trích tham số cho TravelGPT+.
+SYSTEM_PROMPT = """Bạn là module trích tham số cho TravelGPT+.
     Trả về JSON có các khóa: city (string), budget_vnd (int), days (int),
     taste_tags ([string]), activity_tags ([string]), walk_tolerance_km (float), transport (string).
     Chỉ trả JSON hợp lệ."""
+
+def _ask_llm(prompt: str):
+    if not available():
+        return {}
     try:
-        r = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role":"system","content":sys},{"role":"user","content":prompt}],
-            temperature=0
-        )
-        return json.loads(r.choices[0].message.content)
+        # temperature=0 -> cùng prompt luôn cùng kết quả, lần sau lấy từ cache
+        data = json.loads(complete(prompt, SYSTEM_PROMPT, temperature=0, purpose="parse"))
+        return {k: v for k, v in data.items() if k in DEFAULT_PARAMS and v not in (None, "")} if isinstance(data, dict) else {}
     except Exception:
-        return {"city":"Hồ Chí Minh","budget_vnd":1_500_000,"days":2,"taste_tags":[],"activity_tags":[],"walk_tolerance_km":5.0,"transport":"xe máy/ô tô"}
+        return {}
+
+def parse_prompt_to_params(prompt: str, defaults=DEFAULT_PARAMS):
+    """
+    Trả về JSON: {city, budget_vnd, days, taste_tags, activity_tags, walk_tolerance_km, transport}
+    Trích bằng luật (core/param_extractor.py) trước; chỉ gọi LLM khi confidence thấp.
+    Slot không có trong câu lấy từ `defaults` (defaults={} -> chỉ trả các slot trích được).
+    """
+    found, confidence = extract_params(prompt)
+    if confidence < PARSE_MIN_CONFIDENCE:
+        # slot luật đã chắc chắn (vd tag) vẫn ưu tiên hơn LLM
+        found = {**_ask_llm(prompt), **found}
+    return {**defaults, **found}
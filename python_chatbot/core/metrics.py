@@ -0,0 +1,206 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+# Bucket (giây) cho histogram latency – đủ rộng từ vài ms tới cả chục giây (plan có routing)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class RequestTimings:
+    """Thời gian từng stage (ms) của một request, cộng dồn nếu stage chạy nhiều lần."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.labels: Dict[str, str] = {}
+
+    def add(self, name: str, ms: float):
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self) -> str:
+        parts = [f"{name};dur={ms:.1f}" for name, ms in self.stages.items()]
+        parts.append(f"total;dur={self.total_ms():.1f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("tripiz_request_timings", default=None)
+
+
+def start_request() -> RequestTimings:
+    timings = RequestTimings()
+    _current.set(timings)
+    return timings
+
+
+def current() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+def set_label(key: str, value: str):
+    timings = _current.get()
+    if timings is not None:
+        timings.labels[key] = str(value)
+
+
+@contextmanager
+def stage(name: str):
+    """Đo thời gian một stage; không làm gì nếu đang ngoài request (streamlit, script)."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, (time.perf_counter() - t0) * 1000)
+
+
+def _label_str(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        return self._values.get(key, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, v in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labelnames, key)} {v:g}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+_LE_INF = 'le="+Inf"'
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., +Inf count], sum
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[idx] += 1
+            self._sums[key] += value
+
+    def count(self, **labels) -> int:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        return sum(self._counts.get(key, []))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key in sorted(self._counts):
+                counts = self._counts[key]
+                cumulative = 0
+                for bound, c in zip(self.buckets, counts):
+                    cumulative += c
+                    le = f'le="{bound:g}"'
+                    lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {cumulative}")
+                cumulative += counts[-1]
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, _LE_INF)} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {self._sums[key]:.6f}")
+                lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+_REGISTRY: Dict[str, object] = {}
+_registry_lock = threading.Lock()
+
+
+def _register(cls, name: str, help_text: str, labelnames: Tuple[str, ...], **kwargs):
+    with _registry_lock:
+        metric = _REGISTRY.get(name)
+        if metric is None:
+            metric = _REGISTRY[name] = cls(name, help_text, labelnames, **kwargs)
+        return metric
+
+
+def counter(name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    return _register(Counter, name, help_text, labelnames)
+
+
+def gauge(name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+    return _register(Gauge, name, help_text, labelnames)
+
+
+def histogram(name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram, name, help_text, labelnames, buckets=buckets)
+
+
+STAGE_SECONDS = histogram(
+    "tripiz_stage_duration_seconds", "Thời gian từng stage xử lý chat", ("intent", "stage")
+)
+REQUEST_SECONDS = histogram(
+    "tripiz_request_duration_seconds", "Tổng thời gian request HTTP", ("path", "intent")
+)
+
+
+def observe_request(timings: RequestTimings, path: str):
+    """Đẩy thời gian của request đã xong vào histogram theo intent/stage."""
+    intent = timings.labels.get("intent", "none")
+    for name, ms in timings.stages.items():
+        STAGE_SECONDS.observe(ms / 1000, intent=intent, stage=name)
+    REQUEST_SECONDS.observe(timings.total_ms() / 1000, path=path, intent=intent)
+
+
+def render_prometheus() -> str:
+    """Xuất toàn bộ metric theo text exposition format của Prometheus."""
+    lines: List[str] = []
+    with _registry_lock:
+        metrics = list(_REGISTRY.values())
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,371 @@
+"""
+Ingest POI offline từ dữ liệu OSM có sẵn trên máy (không cần mạng):
+- JSON Overpass trong data/osmnx_cache/ (osmnx lưu mỗi response một file)
+- File extract .osm / .osm.gz / .osm.bz2 (XML)
+
+Đọc dạng stream (không load cả file), phân loại + chuẩn hoá theo chunk bằng pandas,
+rồi ghi shard theo thành phố: <out>/pois_<slug>_<category>.csv (cùng schema với catalog).
+
+Chạy từ thư mục python_chatbot:
+    python -m core.osm_ingest                                  # data/osmnx_cache -> data/osm
+    python -m core.osm_ingest --src extract.osm.bz2 --out data/osm --city "Đà Nẵng"
+"""
+import argparse
+import bz2
+import glob
+import gzip
+import json
+import os
+import sys
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from .catalog import DATA_DIR, OSM_CATEGORY, OSM_SUBDIR
+from .cities import CITIES, city_key
+
+CACHE_DIR = os.path.join(DATA_DIR, "osmnx_cache")
+OUT_DIR = os.path.join(DATA_DIR, OSM_SUBDIR)
+CHUNK_ROWS = 50_000
+READ_BYTES = 1 << 20
+
+# Thứ tự ưu tiên khi một feature có nhiều key (giống detect_category cũ: amenity > tourism > leisure)
+POI_KEYS = ("amenity", "tourism", "leisure", "shop", "historic")
+KEEP_TAGS = POI_KEYS + ("name", "cuisine", "opening_hours", "website", "contact:website",
+                        "addr:housenumber", "addr:street", "addr:district", "addr:city", "description")
+
+CATALOG_COLUMNS = ["name", "tag", "avg_cost", "description", "lat", "lon", "address", "opening_hours",
+                   "image_url1", "image_url2", "rating", "reviews", "extra_website", "osm_id"]
+
+DEFAULT_COST = {"food": 150000, "cafe": 60000, "entertainment": 200000, "shopping": 200000, "attraction": 50000}
+DESCRIPTIONS = {
+    "restaurant": "Nhà hàng nổi tiếng với ẩm thực địa phương.",
+    "fast_food": "Quán ăn nhanh tiện lợi.",
+    "cafe": "Quán cà phê yên tĩnh, thích hợp để thư giãn.",
+    "bar": "Quán bar sôi động về đêm.",
+    "park": "Không gian xanh mát, lý tưởng để đi dạo.",
+    "garden": "Không gian xanh mát, lý tưởng để đi dạo.",
+    "museum": "Nơi lưu giữ nhiều giá trị văn hóa, lịch sử.",
+    "marketplace": "Khu chợ sầm uất với nhiều gian hàng.",
+}
+DEFAULT_DESCRIPTION = "Địa điểm du lịch được yêu thích."
+
+
+# =====================================================
+# 📥 ĐỌC STREAM
+# =====================================================
+def iter_overpass_elements(path: str, read_bytes: int = READ_BYTES) -> Iterator[dict]:
+    """
+    Duyệt từng phần tử trong mảng "elements" của một response Overpass JSON mà không load cả file.
+    Bộ đệm chỉ giữ phần chưa parse (tối đa ~1 phần tử + read_bytes). File không phải Overpass bị bỏ qua.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = ""
+        # Tìm tới '"elements": ['
+        while True:
+            idx = buf.find('"elements"')
+            if idx >= 0:
+                bracket = buf.find("[", idx)
+                if bracket >= 0:
+                    buf = buf[bracket + 1:]
+                    break
+            chunk = f.read(read_bytes)
+            if not chunk:
+                return
+            buf = buf[-16:] + chunk if idx < 0 else buf + chunk
+
+        pos = 0
+        eof = False
+        while True:
+            # bỏ khoảng trắng / dấu phẩy giữa các phần tử
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                if pos >= len(buf):
+                    raise ValueError("need more data")
+                obj, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise ValueError(f"JSON Overpass không hợp lệ/bị cắt: {path}")
+                chunk = f.read(read_bytes)
+                eof = not chunk
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+            yield obj
+            pos = end
+
+
+def _open_xml(path: str):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def iter_osm_xml_elements(path: str) -> Iterator[dict]:
+    """Duyệt node/way/relation trong file .osm (XML) bằng iterparse, giải phóng phần tử đã đọc."""
+    with _open_xml(path) as f:
+        context = ET.iterparse(f, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event != "end" or elem.tag not in ("node", "way", "relation"):
+                continue
+            obj = {"type": elem.tag, "id": int(elem.get("id"))}
+            if elem.tag == "node":
+                obj["lat"], obj["lon"] = float(elem.get("lat")), float(elem.get("lon"))
+            tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+            if tags:
+                obj["tags"] = tags
+            if elem.tag == "way":
+                obj["nodes"] = [int(nd.get("ref")) for nd in elem.iter("nd")]
+            center = elem.find("center")
+            if center is not None:
+                obj["center"] = {"lat": float(center.get("lat")), "lon": float(center.get("lon"))}
+            yield obj
+            root.clear()
+
+
+def iter_elements(path: str) -> Iterator[dict]:
+    if path.endswith(".json"):
+        return iter_overpass_elements(path)
+    return iter_osm_xml_elements(path)
+
+
+def source_files(src: str) -> List[str]:
+    if os.path.isdir(src):
+        return sorted(glob.glob(os.path.join(src, "*.json")) + glob.glob(os.path.join(src, "*.osm*")))
+    return [src]
+
+
+# =====================================================
+# 🏷️ PHÂN LOẠI + CHUẨN HOÁ (vector hoá theo chunk)
+# =====================================================
+def osm_type_of(df: pd.DataFrame, keys: Iterable[str] = POI_KEYS) -> pd.Series:
+    """Giá trị của key POI đầu tiên có mặt (amenity > tourism > leisure > ...), vector hoá thay cho apply."""
+    out = pd.Series(np.nan, index=df.index, dtype=object)
+    for key in keys:
+        if key in df.columns:
+            out = out.where(out.notna(), df[key])
+    return out
+
+
+def normalize_chunk(rows: List[dict]) -> pd.DataFrame:
+    """List feature thô -> DataFrame theo schema catalog + cột category (bỏ feature không thuộc category nào)."""
+    df = pd.DataFrame.from_records(rows)
+    for col in KEEP_TAGS:
+        if col not in df.columns:
+            df[col] = np.nan
+    osm_type = osm_type_of(df)
+    category = osm_type.map(OSM_CATEGORY)
+    df = df.assign(osm_type=osm_type, category=category)
+    df = df[df["category"].notna() & df["name"].notna()]
+    if df.empty:
+        return df
+
+    cuisine = df["cuisine"].astype(object).str.split(";").str[0].str.replace("_", " ")
+    tag = cuisine.where(df["category"].eq("food") & cuisine.notna(), df["osm_type"])
+    address = (
+        df["addr:housenumber"].fillna("").astype(str) + " " + df["addr:street"].fillna("").astype(str) + ", " +
+        df["addr:district"].fillna("").astype(str) + ", " + df["addr:city"].fillna("").astype(str)
+    ).str.replace(r"(^[\s,]+|[\s,]+$)", "", regex=True).str.replace(r"(,\s*)+", ", ", regex=True)
+    description = df["description"].where(df["description"].notna(),
+                                          df["osm_type"].map(DESCRIPTIONS).fillna(DEFAULT_DESCRIPTION))
+    out = pd.DataFrame({
+        "name": df["name"].astype(str).str.strip(),
+        "tag": tag.astype(str),
+        "avg_cost": df["category"].map(DEFAULT_COST).astype("int64"),
+        "description": description,
+        "lat": df["lat"].astype(float).round(7),
+        "lon": df["lon"].astype(float).round(7),
+        "address": address.replace("", np.nan),
+        "opening_hours": df["opening_hours"],
+        "image_url1": np.nan,
+        "image_url2": np.nan,
+        "rating": np.nan,
+        "reviews": np.nan,
+        "extra_website": df["website"].where(df["website"].notna(), df["contact:website"]),
+        "osm_id": df["osm_id"],
+        "category": df["category"],
+    })
+    return out
+
+
+def assign_city(df: pd.DataFrame, only_city: Optional[str] = None) -> pd.Series:
+    """Slug thành phố theo bbox (vector hoá); NaN nếu ngoài mọi bbox. only_city: chỉ giữ một thành phố."""
+    slug = pd.Series(np.nan, index=df.index, dtype=object)
+    lat, lon = df["lat"].to_numpy(), df["lon"].to_numpy()
+    keys = [city_key(only_city)] if only_city else list(CITIES)
+    for key in keys:
+        if key is None:
+            continue
+        north, south, east, west = CITIES[key]["bbox"]
+        inside = (lat <= north) & (lat >= south) & (lon <= east) & (lon >= west)
+        slug = slug.where(~(inside & slug.isna()), CITIES[key]["slug"])
+    return slug
+
+
+# =====================================================
+# 🧱 PIPELINE
+# =====================================================
+class ShardWriter:
+    """
+    Ghi nối (append) từng chunk vào file tạm <out>/.pois_<slug>_<category>.csv.tmp; khử trùng lặp theo osm_id.
+    commit() khi chạy xong: xoá shard cũ của các slug lần chạy này ghi (chỉ slug của --city nếu có)
+    rồi os.replace file tạm vào chỗ -> shard của thành phố khác và catalog tuyển chọn không bị đụng tới.
+    """
+
+    def __init__(self, out_dir: str, only_city: Optional[str] = None):
+        if os.path.abspath(out_dir) == os.path.abspath(DATA_DIR):
+            raise ValueError(f"Không ghi shard OSM thẳng vào {DATA_DIR} (catalog tuyển chọn); dùng {OUT_DIR}")
+        self.out_dir = out_dir
+        self.only_city = only_city
+        self.only_slug = CITIES[city_key(only_city)]["slug"] if only_city and city_key(only_city) else None
+        self.seen: Set[str] = set()
+        self.written: Dict[str, int] = {}
+        self._tmp: Dict[str, str] = {}  # đường dẫn shard -> file tạm
+        os.makedirs(out_dir, exist_ok=True)
+
+    def write(self, rows: List[dict]):
+        if not rows:
+            return
+        df = normalize_chunk(rows)
+        if df.empty:
+            return
+        df = df[~df["osm_id"].isin(self.seen)].drop_duplicates("osm_id")
+        df = df.assign(slug=assign_city(df, self.only_city)).dropna(subset=["slug"])
+        self.seen.update(df["osm_id"])
+        for (slug, cat), part in df.groupby(["slug", "category"]):
+            path = os.path.join(self.out_dir, f"pois_{slug}_{cat}.csv")
+            tmp = self._tmp.get(path)
+            if tmp is None:
+                tmp = self._tmp[path] = os.path.join(self.out_dir, f".pois_{slug}_{cat}.csv.{os.getpid()}.tmp")
+                part[CATALOG_COLUMNS].to_csv(tmp, index=False)
+            else:
+                part[CATALOG_COLUMNS].to_csv(tmp, mode="a", header=False, index=False)
+            self.written[path] = self.written.get(path, 0) + len(part)
+
+    def commit(self):
+        """Thay shard của các slug đã ghi (và slug của --city, kể cả khi lần này không còn POI nào)."""
+        slugs = {os.path.basename(p)[len("pois_"):].rsplit("_", 1)[0] for p in self._tmp}
+        if self.only_slug:
+            slugs = {self.only_slug}
+        for slug in slugs:
+            for path in glob.glob(os.path.join(self.out_dir, f"pois_{glob.escape(slug)}_*.csv")):
+                if path not in self._tmp:
+                    os.remove(path)
+        for path, tmp in self._tmp.items():
+            os.replace(tmp, path)
+        self._tmp.clear()
+
+    def abort(self):
+        for tmp in self._tmp.values():
+            try:
+                os.remove(tmp)
+            except FileNotFoundError:
+                pass
+        self._tmp.clear()
+
+
+def _poi_record(el: dict, lat: float, lon: float) -> dict:
+    tags = el.get("tags", {})
+    rec = {k: tags[k] for k in KEEP_TAGS if k in tags}
+    rec.update(osm_id=f"{el['type']}/{el['id']}", lat=lat, lon=lon)
+    return rec
+
+
+def _is_poi(el: dict) -> bool:
+    tags = el.get("tags")
+    return bool(tags) and "name" in tags and any(k in tags for k in POI_KEYS)
+
+
+def ingest(paths: List[str], out_dir: str = OUT_DIR, only_city: Optional[str] = None,
+           chunk_rows: int = CHUNK_ROWS) -> Dict[str, int]:
+    """
+    Pass 1: node POI -> ghi theo chunk; way POI chưa có toạ độ -> ghi nhớ id node cần.
+    Pass 2 (chỉ khi cần): đọc lại để lấy toạ độ các node đó, tính tâm way rồi ghi.
+    Bộ nhớ tỉ lệ với số POI dạng way, không phải tổng số node trong file.
+    """
+    writer = ShardWriter(out_dir, only_city)
+    try:
+        _ingest_into(writer, paths, chunk_rows)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.commit()
+    return writer.written
+
+
+def _ingest_into(writer: ShardWriter, paths: List[str], chunk_rows: int):
+    chunk: List[dict] = []
+    pending_ways: List[dict] = []
+    needed: Set[int] = set()
+
+    def flush():
+        writer.write(chunk)
+        chunk.clear()
+
+    for path in paths:
+        for el in iter_elements(path):
+            if not _is_poi(el):
+                continue
+            if el["type"] == "node":
+                chunk.append(_poi_record(el, el["lat"], el["lon"]))
+            elif "center" in el:
+                chunk.append(_poi_record(el, el["center"]["lat"], el["center"]["lon"]))
+            elif el["type"] == "way" and el.get("nodes"):
+                pending_ways.append({"type": "way", "id": el["id"], "tags": el["tags"], "nodes": el["nodes"]})
+                needed.update(el["nodes"])
+            if len(chunk) >= chunk_rows:
+                flush()
+    flush()
+
+    if pending_ways:
+        coords: Dict[int, tuple] = {}
+        for path in paths:
+            for el in iter_elements(path):
+                if el["type"] == "node" and el["id"] in needed:
+                    coords[el["id"]] = (el["lat"], el["lon"])
+        for way in pending_ways:
+            pts = [coords[n] for n in way["nodes"] if n in coords]
+            if not pts:
+                continue
+            arr = np.asarray(pts)
+            lat, lon = arr.mean(axis=0)
+            chunk.append(_poi_record(way, float(lat), float(lon)))
+            if len(chunk) >= chunk_rows:
+                flush()
+        flush()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Ingest POI từ OSM cache/extract local vào shard catalog")
+    ap.add_argument("--src", default=CACHE_DIR, help="thư mục JSON Overpass hoặc file .osm[.gz|.bz2]")
+    ap.add_argument("--out", default=OUT_DIR)
+    ap.add_argument("--city", default=None, help="chỉ giữ POI trong bbox của thành phố này")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = ap.parse_args(argv)
+
+    paths = source_files(args.src)
+    if not paths:
+        print(f"❌ Không tìm thấy dữ liệu OSM tại {args.src}")
+        return 1
+    try:
+        written = ingest(paths, args.out, args.city, args.chunk_rows)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    for path, n in sorted(written.items()):
+        print(f"💾 {path}: {n} POI")
+    print(f"✅ Ingest xong {len(paths)} file -> {sum(written.values())} POI")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""
+Trích tham số lịch trình từ câu người dùng bằng luật + từ điển (tiếng Việt/Anh, có hoặc không dấu).
+
+- Text được fold một lần (lowercase + bỏ dấu như cities.fold), mọi luật là regex đã compile sẵn; riêng số đếm
+  tiếng Việt ("ba ngày", "sáu ngày") khớp trên text còn dấu vì bản fold trùng với từ thường ("từ", "sau", "bay", "nam")
+- Slot: city, days, budget_vnd (triệu/tr/k/nghìn/ngàn/đồng, "1.500.000đ"), taste_tags, activity_tags,
+  transport, walk_tolerance_km; chỉ trả các slot thật sự có trong câu
+- confidence = tổng trọng số các slot tìm được; llm_parser chỉ gọi LLM khi dưới ngưỡng
+"""
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+from .cities import find_city, fold
+
+# Trọng số slot cho confidence (city/days/budget là thứ LLM hay được nhờ nhất)
+SLOT_WEIGHTS = {"city": 0.35, "days": 0.25, "budget_vnd": 0.25, "taste_tags": 0.05, "activity_tags": 0.05,
+                "transport": 0.05}
+
+# Số đếm tiếng Việt giữ nguyên dấu: "từ ngày 20", "sau ngày mai", "bay ra", "miền nam" không phải số ngày.
+# "ba"/"hai" viết không dấu vẫn là số (không trùng bản có dấu "bà", "hài" vì khớp trên text còn dấu).
+_VI_NUMBER_WORDS = {
+    "một": 1, "hai": 2, "ba": 3, "bốn": 4, "năm": 5, "sáu": 6, "bảy": 7, "bẩy": 7, "tám": 8, "chín": 9, "mười": 10,
+}
+_NUMBER_WORDS = {
+    "one": 1, "a": 1, "an": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+    "nine": 9, "ten": 10,
+}
+_NUM = r"\b(\d+|" + "|".join(sorted(_NUMBER_WORDS, key=len, reverse=True)) + r")"
+
+_DAYS = re.compile(_NUM + r"\s*-?\s*(?:ngay|day|days|hom)\b")
+_VI_DAYS = re.compile(r"\b(" + "|".join(sorted(_VI_NUMBER_WORDS, key=len, reverse=True)) + r")\s*-?\s*(?:ngày|ngay|hôm|hom)\b")
+_DAYS_NIGHTS = re.compile(r"\b(\d+)\s*n\s*(\d+)\s*d\b")  # 3N2Đ -> 3 ngày 2 đêm
+_WEEKEND = re.compile(r"\b(cuoi tuan|weekend)\b")
+
+_MONEY = re.compile(
+    r"(\d+(?:[.,]\d+)*)\s*(trieu|tr|million|millions|mil|m|k|nghin|ngan|thousand|vnd|dong|d)?\b"
+)
+_MONEY_SCALE = {"trieu": 1_000_000, "tr": 1_000_000, "million": 1_000_000, "millions": 1_000_000,
+                "mil": 1_000_000, "m": 1_000_000, "k": 1_000, "nghin": 1_000, "ngan": 1_000, "thousand": 1_000,
+                "vnd": 1, "dong": 1, "d": 1}
+_MONEY_HINT = re.compile(r"\b(ngan sach|budget|chi phi|kinh phi|tien|vnd|dong)\b")  # "m"/"mil" dễ là mét
+_BUDGET_HINT = re.compile(r"\b(ngan sach|budget|chi phi|kinh phi|tien|co|voi|duoi|toi da|max|under)\b")
+_TOTAL_HINT = re.compile(r"\b(tong|ca chuyen|ca chuyen di|total|in total|for the trip|whole trip)\b")
+
+_WALK_KM = re.compile(r"(?:di bo|walk\w*)\D{0,20}?(\d+(?:[.,]\d+)?)\s*km\b")
+
+# Từ điển tag: nhãn -> cụm từ đã fold (khớp nguyên từ)
+TASTE_LEXICON = {
+    "Vietnamese": ["mon viet", "am thuc viet", "an pho", "pho bo", "pho ga", "bun bo", "bun cha", "com tam", "banh mi", "banh xeo",
+                   "dac san", "vietnamese", "viet food"],
+    "Japanese": ["mon nhat", "do nhat", "sushi", "ramen", "japanese"],
+    "Italian": ["mon y", "do y", "pizza", "pasta", "italian"],
+    "Cafe": ["ca phe", "cafe", "caphe", "coffee", "tra sua"],
+    "Seafood": ["hai san", "seafood", "an oc", "quan oc", "cua bien", "tom hum"],
+    "Vegetarian": ["an chay", "do chay", "mon chay", "quan chay", "vegetarian", "vegan"],
+}
+ACTIVITY_LEXICON = {
+    "attraction": ["tham quan", "check in", "checkin", "song ao", "di tich", "danh lam", "pho co", "sightseeing",
+                   "attraction", "attractions", "landmark", "landmarks"],
+    "park": ["cong vien", "thien nhien", "da ngoai", "park", "parks", "nature", "picnic"],
+    "museum": ["bao tang", "trien lam", "museum", "museums", "gallery", "galleries", "exhibition"],
+    "shopping": ["mua sam", "shopping", "trung tam thuong mai", "mall", "malls", "market", "markets", "cho ben thanh"],
+    "nightlife": ["ve dem", "di dem", "cho dem", "nhac song", "quan bar", "bar", "bars", "pub", "pubs", "nightlife", "club"],
+    "food": ["an uong", "am thuc", "an ngon", "quan an", "an vat", "food", "eat", "eating", "foodie"],
+}
+TRANSPORT_LEXICON = {
+    "đi bộ": ["di bo", "walk", "walking", "on foot"],
+    "xe máy/ô tô": ["xe may", "o to", "oto", "xe hoi", "taxi", "grab", "motorbike", "scooter", "car", "drive"],
+}
+
+
+def _compile(lexicon: Dict[str, List[str]]) -> List[Tuple[str, "re.Pattern"]]:
+    return [(label, re.compile(r"\b(" + "|".join(map(re.escape, sorted(words, key=len, reverse=True))) + r")\b"))
+            for label, words in lexicon.items()]
+
+
+_TASTES = _compile(TASTE_LEXICON)
+_ACTIVITIES = _compile(ACTIVITY_LEXICON)
+_TRANSPORTS = _compile(TRANSPORT_LEXICON)
+
+
+def _number(token: str) -> Optional[int]:
+    return int(token) if token.isdigit() else _NUMBER_WORDS.get(token)
+
+
+def _amount(digits: str, unit: Optional[str]) -> Optional[float]:
+    if unit in (None, "vnd", "dong", "d"):
+        # 1.500.000 / 1,500,000: dấu phân cách hàng nghìn
+        if re.fullmatch(r"\d{1,3}(?:[.,]\d{3})+", digits):
+            return float(re.sub(r"[.,]", "", digits))
+        if not digits.replace(".", "").replace(",", "").isdigit():
+            return None
+    try:
+        value = float(digits.replace(",", "."))
+    except ValueError:
+        return None
+    return value * _MONEY_SCALE.get(unit or "", 1)
+
+
+def _days(text: str, raw: str) -> Optional[int]:
+    """text: câu đã fold; raw: câu lowercase còn dấu (cho số đếm tiếng Việt)."""
+    m = _DAYS_NIGHTS.search(text)
+    if m:
+        return int(m.group(1))
+    m = _DAYS.search(text)
+    if m:
+        n = _number(m.group(1))
+        if n and 0 < n <= 30:
+            return n
+    m = _VI_DAYS.search(raw)
+    if m:
+        return _VI_NUMBER_WORDS[m.group(1)]
+    if _WEEKEND.search(text):
+        return 2
+    return None
+
+
+def _budget(text: str, days: Optional[int]) -> Optional[int]:
+    best = None
+    for m in _MONEY.finditer(text):
+        digits, unit = m.group(1), m.group(2)
+        # số trơn chỉ là tiền khi đủ lớn (>= 10.000) hoặc đứng sau từ gợi ý ngân sách
+        before = text[max(0, m.start() - 24):m.start()]
+        if unit is None and not _BUDGET_HINT.search(before):
+            continue
+        # "500m" thường là mét ("đi bộ tối đa 500m"): chỉ coi m/mil là triệu khi có từ gợi ý tiền
+        if unit in ("m", "mil") and not _MONEY_HINT.search(text):
+            continue
+        value = _amount(digits, unit)
+        if value is None or value < 10_000 or value > 1_000_000_000:
+            continue
+        best = value
+        break
+    if best is None:
+        return None
+    # "tổng 3 triệu" cho cả chuyến -> budget_vnd là ngân sách mỗi ngày
+    if days and _TOTAL_HINT.search(text):
+        best /= days
+    return int(round(best))
+
+
+def _tags(text: str, patterns) -> List[str]:
+    return [label for label, pattern in patterns if pattern.search(text)]
+
+
+def extract_params(prompt: str) -> Tuple[Dict[str, Any], float]:
+    """
+    (slot tìm được, confidence 0..1). Chỉ chứa các slot có trong câu; caller tự ghép với mặc định.
+    >>> extract_params("Lên lịch trình 3 ngày ở Đà Nẵng, 2 triệu")[0]
+    {'city': 'Đà Nẵng', 'days': 3, 'budget_vnd': 2000000}
+    >>> extract_params("Lên lịch từ ngày 20/11 ở Hà Nội")[0]
+    {'city': 'Hà Nội'}
+    >>> extract_params("Đi Hà Nội sau ngày mai, sáu ngày")[0]
+    {'city': 'Hà Nội', 'days': 6}
+    >>> extract_params("Đi bộ tối đa 500m")[0]
+    {'transport': 'đi bộ'}
+    >>> extract_params("ba ngay, budget 2m")[0]
+    {'days': 3, 'budget_vnd': 2000000}
+    """
+    raw = unicodedata.normalize("NFC", (prompt or "").lower())
+    text = re.sub(r"\s+", " ", re.sub(r"[^a-z0-9.,\- ]+", " ", fold(prompt or "")))
+    out: Dict[str, Any] = {}
+    city = find_city(prompt or "")
+    if city:
+        out["city"] = city
+    days = _days(text, raw)
+    if days:
+        out["days"] = days
+    # bỏ phần "3 ngày"/"3N2Đ" để con số đó không bị đọc thành tiền
+    money_text = _DAYS_NIGHTS.sub(" ", _DAYS.sub(" ", text))
+    budget = _budget(money_text, days)
+    if budget:
+        out["budget_vnd"] = budget
+    taste = _tags(text, _TASTES)
+    if taste:
+        out["taste_tags"] = taste
+    acts = _tags(text, _ACTIVITIES)
+    if acts:
+        out["activity_tags"] = acts
+    transport = _tags(text, _TRANSPORTS)
+    if transport:
+        out["transport"] = transport[0]
+    m = _WALK_KM.search(text)
+    if m:
+        out["walk_tolerance_km"] = float(m.group(1).replace(",", "."))
+    confidence = sum(w for slot, w in SLOT_WEIGHTS.items() if slot in out)
+    return out, round(min(confidence, 1.0), 3)
@@ -1,10 +1,14 @@
+import os
 import pandas as pd
 import requests
 
+# Cho phép trỏ sang server giả lập (load test / dev offline)
+WIKIPEDIA_API_URL = os.getenv("WIKIPEDIA_API_URL", "https://en.wikipedia.org/w/api.php")
+
 def _get_wikipedia_image(name: str):
     """Lấy ảnh minh họa và mô tả từ Wikipedia (miễn phí, không cần API key)."""
     try:
-        url = "https://en.wikipedia.org/w/api.php"
+        url = WIKIPEDIA_API_URL
         params = {
             "action": "query",
             "format": "json",
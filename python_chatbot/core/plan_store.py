@@ -0,0 +1,287 @@
+"""
+Lưu lịch trình phía server để sửa từng ngày mà không phải sinh lại cả chuyến.
+
+Mỗi plan có id và giữ: params, tập POI ứng viên (đã chấm điểm, PoiRecord dùng chung giữa các ngày
+vì không bị sửa sau khi chấm điểm), và với từng ngày
+danh sách POI theo thứ tự tour + ma trận thời gian (phút) và khoảng cách (km) tương ứng theo phương tiện
+của plan. Thêm/thay/xoá một POI chỉ tính thêm một hàng + một cột của ma trận rồi tối ưu lại tour của ngày đó.
+"""
+import math
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from . import metrics
+from .catalog import get_shard
+from .graph_compiler import travel_mode
+from .itinerary import _select_pois_for_days, gather_candidates, optimize_day, order_day
+from .metrics import stage
+from .poi_record import records_from_frame
+from .route_optimizer import haversine_km, travel_block
+
+PLAN_TTL_S = float(os.getenv("TRIPIZ_PLAN_TTL_S", "3600"))
+PLAN_MAX = int(os.getenv("TRIPIZ_PLAN_MAX", "1000"))
+MAX_PER_DAY = 6
+
+PLANS_ACTIVE = metrics.gauge("tripiz_plans_active", "Số plan đang lưu")
+PLAN_OPS = metrics.counter("tripiz_plan_ops_total", "Số thao tác trên plan", ("op",))
+
+
+class PlanNotFound(KeyError):
+    pass
+
+
+def _poi_key(poi: Dict) -> str:
+    return str(poi.get("poi_id") or poi.get("name"))
+
+
+def _drop(matrix: list, idx: int) -> list:
+    return [row[:idx] + row[idx + 1:] for k, row in enumerate(matrix) if k != idx]
+
+
+def _grow(matrix: list, col: list, row: list) -> list:
+    """Thêm một điểm cuối: col = từ các điểm cũ tới điểm mới, row = từ điểm mới tới các điểm cũ."""
+    return [r + [c] for r, c in zip(matrix, col)] + [row + [0.0]]
+
+
+class DayState:
+    """
+    Một ngày: POI theo thứ tự tour, ma trận thời gian (phút) + khoảng cách (km) theo đúng thứ tự đó,
+    tổng phút di chuyển và tổng km. minutes/km là None khi chưa tính được (lỗi định tuyến).
+    """
+
+    def __init__(self, pois: List[Dict], minutes: Optional[list], km: Optional[list],
+                 travel_min: float = 0.0, distance: float = 0.0):
+        self.pois = pois
+        self.minutes = minutes
+        self.km = km
+        self.travel_min = travel_min
+        self.distance = distance
+
+    @classmethod
+    def build(cls, city: str, pois: List[Dict], mode: str = "drive") -> "DayState":
+        try:
+            return cls(*optimize_day(city, pois, mode))
+        except Exception as e:
+            print(f"⚠️ Error optimizing route: {e}")
+            return cls(list(pois), None, None)
+
+    def assign(self, other: "DayState"):
+        self.pois, self.minutes, self.km = other.pois, other.minutes, other.km
+        self.travel_min, self.distance = other.travel_min, other.distance
+
+    def cost(self) -> float:
+        return sum(float(p.get("avg_cost") or 0) for p in self.pois)
+
+
+class Plan:
+    def __init__(self, params: Dict, weather_desc: str, candidates: List[Dict]):
+        self.id = uuid.uuid4().hex
+        self.params = dict(params)
+        self.city = params["city"]
+        self.mode = travel_mode(params.get("transport"))
+        self.budget = float(params.get("budget_vnd", 1_500_000))
+        self.weather_desc = weather_desc
+        self.candidates = candidates
+        self.days: List[DayState] = []
+        self.created_at = self.updated_at = time.time()
+        self.version = 0
+        self.lock = threading.Lock()
+
+    # ---------- đọc ----------
+    def days_output(self) -> List[Dict]:
+        """Cùng định dạng với build_itinerary()."""
+        return [{
+            "title": f"Ngày {i + 1}",
+            "pois": d.pois,
+            "distance": round(d.distance, 2),
+            "travel_minutes": round(d.travel_min, 1),
+            "transport": self.mode,
+            "weather": self.weather_desc,
+        } for i, d in enumerate(self.days)]
+
+    def _day(self, day: int) -> DayState:
+        if not 1 <= day <= len(self.days):
+            raise IndexError(f"Ngày {day} không tồn tại (plan có {len(self.days)} ngày)")
+        return self.days[day - 1]
+
+    def _used(self, skip_day: Optional[int] = None) -> set:
+        return {_poi_key(p) for i, d in enumerate(self.days, start=1) if i != skip_day for p in d.pois}
+
+    # ---------- chọn POI ----------
+    def resolve_poi(self, poi_id: Optional[str] = None, poi: Optional[Dict] = None) -> Optional[Dict]:
+        """POI theo poi_id (ứng viên của plan, rồi toàn bộ catalog thành phố) hoặc POI tự do có lat/lon."""
+        if poi_id:
+            for c in self.candidates:
+                if c.get("poi_id") == poi_id:
+                    return c
+            df = get_shard(self.city).combined()
+            match = df[df["poi_id"] == poi_id] if "poi_id" in df.columns else df.iloc[0:0]
+            if match.empty:
+                raise ValueError(f"Không tìm thấy POI {poi_id}")
+            return records_from_frame(match.head(1))[0]
+        if poi:
+            try:
+                lat, lon = float(poi["lat"]), float(poi["lon"])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError("POI cần có lat/lon hợp lệ")
+            if not (math.isfinite(lat) and math.isfinite(lon)):
+                raise ValueError("POI cần có lat/lon hợp lệ")
+            return {**poi, "lat": lat, "lon": lon, "name": poi.get("name", "Unnamed")}
+        return None
+
+    def _pick_for_day(self, ds: DayState, day: int) -> Dict:
+        """Ứng viên chưa dùng, vừa ngân sách còn lại; trong top 10 theo điểm chọn cái gần ngày nhất."""
+        used = self._used()
+        room = self.budget - ds.cost()
+        pool = [c for c in self.candidates
+                if _poi_key(c) not in used and float(c.get("avg_cost") or 0) <= room]
+        if not pool:
+            raise ValueError(f"Không còn địa điểm phù hợp cho ngày {day}")
+        pool = sorted(pool, key=lambda c: c.get("final", 0), reverse=True)[:10]
+        if not ds.pois:
+            return pool[0]
+        lat = sum(p["lat"] for p in ds.pois) / len(ds.pois)
+        lon = sum(p["lon"] for p in ds.pois) / len(ds.pois)
+        return min(pool, key=lambda c: haversine_km(lat, lon, c["lat"], c["lon"]))
+
+    # ---------- sửa ----------
+    def _reorder(self, ds: DayState, day: DayState):
+        if day.minutes is None:
+            ds.assign(DayState.build(self.city, day.pois, self.mode))
+        else:
+            ds.assign(DayState(*order_day(day.pois, day.minutes, day.km)))
+        self.version += 1
+        self.updated_at = time.time()
+
+    def _without(self, ds: DayState, idx: int) -> DayState:
+        if not 0 <= idx < len(ds.pois):
+            raise IndexError(f"POI #{idx} không có trong ngày")
+        pois = ds.pois[:idx] + ds.pois[idx + 1:]
+        if ds.minutes is None:
+            return DayState(pois, None, None)
+        return DayState(pois, _drop(ds.minutes, idx), _drop(ds.km, idx))
+
+    def _with(self, day: DayState, new: Dict) -> DayState:
+        """Thêm new vào cuối: chỉ tính hàng new -> pois và cột pois -> new (phút + km)."""
+        pois = day.pois
+        if day.minutes is None:
+            return DayState(pois + [new], None, None)
+        row_min = row_km = col_min = col_km = []
+        if pois:
+            with stage("distance_matrix"):
+                (row_min,), (row_km,) = travel_block(self.city, [new], pois, self.mode)
+                to_new = travel_block(self.city, pois, [new], self.mode)
+            col_min, col_km = [r[0] for r in to_new[0]], [r[0] for r in to_new[1]]
+        return DayState(pois + [new], _grow(day.minutes, col_min, row_min), _grow(day.km, col_km, row_km))
+
+    def insert(self, day: int, poi_id: Optional[str] = None, poi: Optional[Dict] = None):
+        ds = self._day(day)
+        new = self.resolve_poi(poi_id, poi)
+        if new is None:
+            new = self._pick_for_day(ds, day)
+        elif _poi_key(new) in self._used():
+            raise ValueError(f"POI {_poi_key(new)} đã có trong lịch trình")
+        self._reorder(ds, self._with(ds, new))
+        PLAN_OPS.inc(op="insert")
+
+    def replace(self, day: int, idx: int, poi_id: Optional[str] = None, poi: Optional[Dict] = None):
+        ds = self._day(day)
+        rest = self._without(ds, idx)
+        new = self.resolve_poi(poi_id, poi)
+        if new is None:
+            new = self._pick_for_day(rest, day)
+        elif _poi_key(new) in self._used() - {_poi_key(ds.pois[idx])}:  # thay một POI bằng chính nó vẫn được
+            raise ValueError(f"POI {_poi_key(new)} đã có trong lịch trình")
+        self._reorder(ds, self._with(rest, new))
+        PLAN_OPS.inc(op="replace")
+
+    def remove(self, day: int, idx: int):
+        ds = self._day(day)
+        self._reorder(ds, self._without(ds, idx))
+        PLAN_OPS.inc(op="remove")
+
+    def regenerate(self, day: int):
+        """Chọn lại POI cho một ngày từ ứng viên chưa dùng ở các ngày khác (ưu tiên khác ngày hiện tại)."""
+        ds = self._day(day)
+        others = self._used(skip_day=day)
+        current = {_poi_key(p) for p in ds.pois}
+        pool = [c for c in self.candidates if _poi_key(c) not in others]
+        fresh = [c for c in pool if _poi_key(c) not in current]
+        if len(fresh) >= min(MAX_PER_DAY, len(ds.pois) or MAX_PER_DAY):
+            pool = fresh
+        chosen = _select_pois_for_days(pool, 1, max_per_day=MAX_PER_DAY, budget_per_day=self.budget)[0]
+        ds.assign(DayState.build(self.city, list(chosen), self.mode))
+        self.version += 1
+        self.updated_at = time.time()
+        PLAN_OPS.inc(op="regenerate")
+
+
+class PlanStore:
+    """LRU + TTL trong bộ nhớ cho các Plan (mỗi worker một store)."""
+
+    def __init__(self, max_plans: int = PLAN_MAX, ttl_s: float = PLAN_TTL_S):
+        self.max_plans = max_plans
+        self.ttl_s = ttl_s
+        self._plans: "OrderedDict[str, Plan]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, plan: Plan):
+        with self._lock:
+            self._plans[plan.id] = plan
+            self._plans.move_to_end(plan.id)
+            self._expire()
+            while len(self._plans) > self.max_plans:
+                self._plans.popitem(last=False)
+            PLANS_ACTIVE.set(len(self._plans))
+
+    def get(self, plan_id: str) -> Plan:
+        with self._lock:
+            self._expire()
+            plan = self._plans.get(plan_id)
+            if plan is None:
+                raise PlanNotFound(plan_id)
+            self._plans.move_to_end(plan_id)
+            return plan
+
+    def delete(self, plan_id: str):
+        with self._lock:
+            self._plans.pop(plan_id, None)
+            PLANS_ACTIVE.set(len(self._plans))
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl_s
+        for pid in [pid for pid, p in self._plans.items() if p.updated_at < cutoff]:
+            del self._plans[pid]
+
+    def __len__(self):
+        return len(self._plans)
+
+
+_STORE = PlanStore()
+
+
+def create_plan(params: Dict, weather_now: Dict) -> Plan:
+    """Sinh lịch trình như build_itinerary() nhưng giữ lại trạng thái từng ngày để sửa sau."""
+    weather_desc = weather_now.get("description", "")
+    days = int(params.get("days", 2))
+    plan = Plan(params, weather_desc, gather_candidates(params, weather_desc))
+    if plan.candidates:
+        with stage("partition"):
+            days_pois = _select_pois_for_days(plan.candidates, days, max_per_day=MAX_PER_DAY,
+                                              budget_per_day=plan.budget)
+        plan.days = [DayState.build(plan.city, dpois, plan.mode) for dpois in days_pois]
+    _STORE.put(plan)
+    PLAN_OPS.inc(op="create")
+    return plan
+
+
+def get_plan(plan_id: str) -> Plan:
+    return _STORE.get(plan_id)
+
+
+def delete_plan(plan_id: str):
+    _STORE.delete(plan_id)
@@ -1,6 +1,7 @@
 # core/planner.py
 from core.weather import get_weather
 from core.recommender import recommend_pois
+from core.catalog import CATEGORIES
 from core.routing import build_routes
 
 def generate_travel_plans(params):
@@ -14,16 +15,23 @@ def generate_travel_plans(params):
     walk_tolerance_km = params.get("walk_tolerance_km", 5.0)
 
     weather = get_weather(city)
-    pois = recommend_pois(
-        city=city,
-        poi_df=params.get("poi_df"),
-        user_query=" ".join(taste + activities + [city]),
-        taste_tags=taste,
-        activity_tags=activities,
-        budget_per_day=budget,
-        walk_tolerance_km=walk_tolerance_km,
-        weather_desc=weather.get("description", "")
-    )
-    routes = build_routes(pois, budget, "normal")
+    # Ứng viên từ mọi category để mỗi phong cách tuyến (cafe / ẩm thực / tham quan) đều có POI phù hợp
+    pois = []
+    for category in CATEGORIES:
+        try:
+            pois += recommend_pois(
+                city=city,
+                poi_df=params.get("poi_df"),
+                category=category,
+                user_query=" ".join(taste + activities + [city]),
+                taste_tags=taste,
+                activity_tags=activities,
+                budget_per_day=budget,
+                walk_tolerance_km=walk_tolerance_km,
+                weather_desc=weather.get("description", "")
+            )
+        except (ValueError, FileNotFoundError):
+            continue  # thành phố không có dữ liệu category này
+    routes = build_routes(pois, budget, "normal", city=city, transport=params.get("transport"))
     return {"weather": weather, "routes": routes}
 
@@ -0,0 +1,130 @@
+"""
+JSON công khai của POI (dạng trả về trong /api/chat, /api/plans) serialise sẵn theo shard.
+
+- Mỗi trường công khai là một cột JSON: blob bytes nối liền + offset theo dòng (dựng lúc load shard)
+- Response ghép object từ các cột cần thiết (`fields`) thành Fragment, không dựng dict/encode lại
+- POI không có trong catalog (POI tự do trong plan) đi đường dict qua public_poi()
+"""
+import json
+import math
+import time
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .fastjson import Fragment
+
+PUBLIC_POI_FIELDS = ("poi_id", "name", "category", "image_url1", "image_url2", "address", "avg_cost",
+                     "description", "lat", "lon", "rating")
+_FIELD_DEFAULTS = {"name": "Unnamed", "category": "N/A"}
+_KEYS = {f: json.dumps(f).encode() + b":" for f in PUBLIC_POI_FIELDS}
+_encode_str = json.encoder.encode_basestring  # bản C, giữ nguyên Unicode như ensure_ascii=False
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """'name,lat,lon' -> tuple theo thứ tự PUBLIC_POI_FIELDS; None/rỗng = đủ trường; ValueError nếu trường lạ."""
+    if not fields:
+        return None
+    wanted = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = wanted - set(PUBLIC_POI_FIELDS)
+    if unknown:
+        raise ValueError(f"Trường không hỗ trợ: {', '.join(sorted(unknown))} "
+                         f"(hợp lệ: {', '.join(PUBLIC_POI_FIELDS)})")
+    return tuple(f for f in PUBLIC_POI_FIELDS if f in wanted) or None
+
+
+def _clean(v: Any) -> Any:
+    if isinstance(v, (float, np.floating)):
+        return float(v) if math.isfinite(v) else None
+    if isinstance(v, np.integer):
+        return int(v)
+    return v
+
+
+def public_poi(poi: Mapping[str, Any], fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """Dict công khai của một POI bất kỳ (NaN -> None), cùng nội dung với fragment của catalog."""
+    out = {}
+    for f in fields or PUBLIC_POI_FIELDS:
+        v = _clean(poi.get(f))
+        out[f] = _FIELD_DEFAULTS.get(f) if v is None else v
+    return out
+
+
+def _encode_column(values: pd.Series) -> List[bytes]:
+    """JSON của từng giá trị trong cột (null cho thiếu/NaN)."""
+    if pd.api.types.is_bool_dtype(values):
+        return [b"true" if v else b"false" for v in values.tolist()]
+    if pd.api.types.is_integer_dtype(values):
+        return [str(v).encode() for v in values.tolist()]
+    if values.dtype == np.float32:
+        # catalog gọn (poi_record.compact_frame): str của float32 là dạng ngắn nhất (10.7769, không phải 10.776900291...)
+        return [str(v).encode() if math.isfinite(v) else b"null" for v in values.to_numpy()]
+    if pd.api.types.is_float_dtype(values):
+        # repr float giống json chuẩn (200000.0 giữ dạng float)
+        return [repr(v).encode() if math.isfinite(v) else b"null" for v in values.tolist()]
+    out = []
+    for v in values.tolist():
+        if isinstance(v, str):
+            out.append(_encode_str(v).encode())
+        elif v is None or (isinstance(v, float) and not math.isfinite(v)):
+            out.append(b"null")
+        else:
+            out.append(json.dumps(_clean(v), ensure_ascii=False, default=str).encode())
+    return out
+
+
+class PoiFragments:
+    """Cột JSON cho từng trường công khai của mọi POI trong shard, tra theo poi_id."""
+
+    def __init__(self, ids: pd.Index, blobs: Dict[str, bytes], offsets: Dict[str, np.ndarray],
+                 build_s: float = 0.0):
+        self.ids = ids
+        self.blobs = blobs
+        self.offsets = offsets  # field -> (n + 1,) int64
+        self.build_s = build_s
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(len(b) for b in self.blobs.values()) + sum(o.nbytes for o in self.offsets.values())
+                   + self.ids.memory_usage(deep=True))
+
+    @classmethod
+    def build(cls, df: pd.DataFrame) -> "PoiFragments":
+        t0 = time.perf_counter()
+        df = df.drop_duplicates("poi_id")
+        n = len(df)
+        blobs, offsets = {}, {}
+        for f in PUBLIC_POI_FIELDS:
+            default = _FIELD_DEFAULTS.get(f)
+            if f in df:
+                values = df[f]
+                if default is not None:
+                    values = values.astype(object).fillna(default) if isinstance(values.dtype, pd.CategoricalDtype) \
+                        else values.fillna(default)
+                encoded = _encode_column(values)
+            else:
+                encoded = [_encode_str(default).encode() if default is not None else b"null"] * n
+            blobs[f] = b"".join(encoded)
+            offsets[f] = np.concatenate([[0], np.cumsum([len(e) for e in encoded], dtype=np.int64)])
+        return cls(pd.Index(df["poi_id"].astype(str)), blobs, offsets, time.perf_counter() - t0)
+
+    def row(self, poi_id: str) -> int:
+        """Dòng của poi_id, -1 nếu không có."""
+        try:
+            return int(self.ids.get_loc(poi_id))
+        except (KeyError, TypeError):
+            return -1
+
+    def fragment(self, row: int, fields: Optional[Sequence[str]] = None) -> Fragment:
+        parts = []
+        for f in fields or PUBLIC_POI_FIELDS:
+            o = self.offsets[f]
+            parts.append(_KEYS[f] + bytes(self.blobs[f][o[row]:o[row + 1]]))  # blob: bytes hoặc mmap uint8
+        return Fragment(b"{" + b",".join(parts) + b"}")
+
+
+def build_poi_fragments(df: Optional[pd.DataFrame]) -> Optional[PoiFragments]:
+    if df is None or not len(df) or "poi_id" not in df:
+        return None
+    return PoiFragments.build(df)
@@ -0,0 +1,209 @@
+"""
+Biểu diễn gọn của POI trong catalog và trong pipeline gợi ý / lịch trình.
+
+- Catalog: toạ độ + rating float32, avg_cost int32, tag/category/city... là cột categorical,
+  chuỗi còn lại được intern (compact_frame, gọi lúc load shard)
+- Pipeline (recommend_pois -> _penalize_by_weather -> _select_pois_for_days -> build_itinerary / plan):
+  PoiRecord có __slots__ thay cho dict từ to_dict(orient="records") (không lặp lại key mỗi POI),
+  vẫn đọc/ghi như dict (get, [], in, keys) nên code cũ và POI tự do dạng dict dùng chung được
+- Dict chỉ được dựng ở biên response (fragment JSON của shard hoặc public_poi)
+
+Báo cáo bộ nhớ mỗi POI trước/sau:
+    python -m core.poi_record --city "Hồ Chí Minh"
+"""
+import argparse
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+POI_FIELDS = ("poi_id", "name", "tag", "category", "city", "avg_cost", "description", "lat", "lon",
+              "image_url1", "image_url2", "address", "rating", "reviews", "final")
+CATEGORICAL_COLUMNS = ("tag", "category", "city", "city_norm", "source_file")
+INTERNED_COLUMNS = ("name", "address", "description", "image_url1", "image_url2")
+FLOAT32_COLUMNS = ("lat", "lon", "rating", "reviews")
+FLOAT_DECIMALS = 6  # float32 -> float Python: làm tròn để JSON không có đuôi 10.777000427246094
+
+_MISSING = object()
+
+
+class PoiRecord:
+    """Một POI gọn: trường cố định trong slot, trường lạ (vd thêm ở API) trong `extra`."""
+
+    __slots__ = POI_FIELDS + ("extra",)
+
+    def __init__(self, values: Optional[Dict[str, Any]] = None, **kwargs):
+        self.extra = None
+        for k, v in {**(values or {}), **kwargs}.items():
+            self[k] = v
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in _SLOTS:
+            return getattr(self, key, default)
+        return self.extra.get(key, default) if self.extra else default
+
+    def __getitem__(self, key: str) -> Any:
+        v = self.get(key, _MISSING)
+        if v is _MISSING:
+            raise KeyError(key)
+        return v
+
+    def __setitem__(self, key: str, value: Any):
+        if key in _SLOTS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def keys(self) -> List[str]:
+        return [k for k in POI_FIELDS if hasattr(self, k)] + list(self.extra or ())
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+    def copy(self) -> "PoiRecord":
+        rec = PoiRecord.__new__(PoiRecord)
+        for k in POI_FIELDS:
+            v = getattr(self, k, _MISSING)
+            if v is not _MISSING:
+                setattr(rec, k, v)
+        rec.extra = dict(self.extra) if self.extra else None
+        return rec
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (PoiRecord, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"PoiRecord({self.to_dict()!r})"
+
+
+_SLOTS = frozenset(POI_FIELDS)
+
+
+def _column_values(s: pd.Series) -> list:
+    if s.dtype == np.float32:
+        return np.round(s.to_numpy(np.float64), FLOAT_DECIMALS).tolist()
+    return s.tolist()  # categorical -> str, số -> int/float Python
+
+
+def records_from_frame(df: pd.DataFrame) -> List[PoiRecord]:
+    """Các dòng của df -> PoiRecord (chỉ các cột trong POI_FIELDS), theo cột chứ không theo dòng."""
+    cols = [c for c in POI_FIELDS if c in df.columns]
+    values = [_column_values(df[c]) for c in cols]
+    new = PoiRecord.__new__
+    out = []
+    for row in zip(*values):
+        rec = new(PoiRecord)
+        rec.extra = None
+        for c, v in zip(cols, row):
+            setattr(rec, c, v)
+        out.append(rec)
+    return out
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Kiểu gọn cho frame catalog đã chuẩn hoá (gọi cuối catalog._normalize)."""
+    for col in FLOAT32_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(np.float32)
+    if "avg_cost" in df.columns:
+        df["avg_cost"] = df["avg_cost"].round().astype(np.int32)
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    for col in INTERNED_COLUMNS:
+        if col in df.columns and df[col].dtype == object:
+            df[col] = [sys.intern(v) if isinstance(v, str) else v for v in df[col].tolist()]
+    return df
+
+
+def deep_size(objs: Iterable[Any]) -> int:
+    """Byte của một list POI (dict/PoiRecord) kể cả key/giá trị; object dùng chung chỉ tính một lần."""
+    seen = set()
+
+    def size(o) -> int:
+        if id(o) in seen:
+            return 0
+        seen.add(id(o))
+        n = sys.getsizeof(o)
+        if isinstance(o, dict):
+            n += sum(size(k) + size(v) for k, v in o.items())
+        elif isinstance(o, PoiRecord):
+            n += sum(size(getattr(o, k)) for k in PoiRecord.__slots__ if hasattr(o, k))
+        return n
+
+    objs = list(objs)
+    return sys.getsizeof(objs) + sum(size(o) for o in objs)
+
+
+def memory_report(city: str, data_dir: str = "data") -> List[Dict[str, Any]]:
+    """Byte/POI của frame catalog và của list POI trong pipeline: dạng cũ (float64/object, dict) và dạng gọn."""
+    from .catalog import CATEGORIES, _normalize, shard_sources
+    from .cities import city_name, city_slug
+
+    slug, name = city_slug(city), city_name(city)
+    sources = shard_sources(slug, data_dir)
+    if not sources or "*" in sources:
+        raise FileNotFoundError(f"Không có CSV theo category cho {name} trong {data_dir}")
+    rows = []
+    for cat in CATEGORIES:
+        if cat not in sources:
+            continue
+        raw = pd.read_csv(sources[cat])
+        before = _normalize(raw, cat, name, slug, sources[cat], compact=False)
+        after = _normalize(raw, cat, name, slug, sources[cat])
+        n = max(len(after), 1)
+        rows.append({
+            "category": cat,
+            "pois": len(after),
+            "frame_before": int(before.memory_usage(deep=True).sum()) / n,
+            "frame_after": int(after.memory_usage(deep=True).sum()) / n,
+            "records_before": deep_size(before.to_dict(orient="records")) / n,
+            "records_after": deep_size(records_from_frame(after)) / n,
+        })
+    return rows
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Byte mỗi POI: catalog + list POI trong pipeline, trước/sau khi gọn")
+    ap.add_argument("--city", default="Hồ Chí Minh")
+    ap.add_argument("--data-dir", default="data")
+    args = ap.parse_args(argv)
+
+    try:
+        rows = memory_report(args.city, args.data_dir)
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"{'category':<14}{'POIs':>7}{'frame trước':>14}{'frame sau':>12}{'records trước':>16}{'records sau':>14}")
+    for r in rows:
+        print(f"{r['category']:<14}{r['pois']:>7}{r['frame_before']:>14.0f}{r['frame_after']:>12.0f}"
+              f"{r['records_before']:>16.0f}{r['records_after']:>14.0f}")
+    total = sum(r["pois"] for r in rows) or 1
+    avg = {k: sum(r[k] * r["pois"] for r in rows) / total
+           for k in ("frame_before", "frame_after", "records_before", "records_after")}
+    print(f"{'tổng (B/POI)':<14}{total:>7}{avg['frame_before']:>14.0f}{avg['frame_after']:>12.0f}"
+          f"{avg['records_before']:>16.0f}{avg['records_after']:>14.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Vector sở thích theo user (tag + category của POI) cập nhật tăng dần từ event tương tác.
+
+- Cập nhật O(event): mỗi event cộng trọng số vào feature tag/category của POI,
+  vector giảm dần theo thời gian (half-life) và bị cắt còn PREF_MAX_FEATURES feature
+- Lưu trong context store (trường "tasteVector"), chạy trên thread ghi event
+- Re-rank O(candidates): map tag/category của cả DataFrame ứng viên qua dict trọng số
+"""
+import json
+import os
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .catalog import get_shard
+from .context_store import apply_context, peek_context
+
+PREF_HALF_LIFE_DAYS = float(os.getenv("TRIPIZ_PREF_HALF_LIFE_DAYS", "14"))
+PREF_WEIGHT = float(os.getenv("TRIPIZ_PREF_WEIGHT", "0.15"))
+PREF_MAX_FEATURES = 64
+PREF_CLIP = 5.0
+
+# Trọng số theo loại event (âm = không thích)
+EVENT_WEIGHTS = {
+    "view": 0.2,
+    "click": 0.5,
+    "open": 0.5,
+    "save": 1.0,
+    "like": 1.0,
+    "share": 1.0,
+    "add_to_plan": 1.5,
+    "visit": 2.0,
+    "book": 2.0,
+    "dismiss": -0.7,
+    "remove_from_plan": -0.7,
+    "dislike": -1.0,
+}
+
+_HALF_LIFE_S = PREF_HALF_LIFE_DAYS * 86400
+
+
+def _decay(weights: Dict[str, float], since: float, now: float) -> float:
+    return 0.5 ** (max(now - since, 0.0) / _HALF_LIFE_S) if weights else 1.0
+
+
+def apply_deltas(ctx: Dict, deltas: Dict[str, float], now: float):
+    """Cộng deltas vào ctx["tasteVector"] (sau khi giảm theo thời gian), giữ tối đa PREF_MAX_FEATURES."""
+    tv = ctx.get("tasteVector") or {"w": {}, "t": now}
+    factor = _decay(tv["w"], tv["t"], now)
+    w = {k: v * factor for k, v in tv["w"].items()}
+    for k, d in deltas.items():
+        w[k] = max(-PREF_CLIP, min(PREF_CLIP, w.get(k, 0.0) + d))
+    if len(w) > PREF_MAX_FEATURES:
+        w = dict(sorted(w.items(), key=lambda kv: -abs(kv[1]))[:PREF_MAX_FEATURES])
+    ctx["tasteVector"] = {"w": {k: round(v, 4) for k, v in w.items() if abs(v) >= 1e-3}, "t": now}
+
+
+def _poi_features(poi_id: Optional[str], payload: Dict) -> Optional[Tuple[str, str]]:
+    """(tag, category) từ payload event, nếu thiếu thì tra theo poi_id (<slug>:<category>:<key>)."""
+    tag, category = payload.get("tag"), payload.get("category")
+    if (tag is None or category is None) and poi_id and poi_id.count(":") == 2:
+        slug, cat, _ = poi_id.split(":")
+        try:
+            meta = get_shard(slug).poi_meta(poi_id)
+        except (FileNotFoundError, ValueError):
+            meta = None
+        if meta:
+            tag, category = tag or meta[0], category or meta[1]
+        category = category or cat
+    if tag is None and category is None:
+        return None
+    return (str(tag).lower() if tag is not None else None, str(category).lower() if category is not None else None)
+
+
+def update_from_events(rows: List[tuple]):
+    """Listener cho event_log: rows = (ts, received_at, user_id, type, poi_id, payload JSON)."""
+    per_user: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    for ts, _, user_id, etype, poi_id, payload in rows:
+        weight = EVENT_WEIGHTS.get(etype)
+        if not user_id or weight is None:
+            continue
+        feats = _poi_features(poi_id, json.loads(payload))
+        if feats is None:
+            continue
+        tag, category = feats
+        if tag:
+            per_user[user_id][f"tag:{tag}"] += weight
+        if category:
+            per_user[user_id][f"cat:{category}"] += weight
+
+    now = time.time()
+    for user_id, deltas in per_user.items():
+        apply_context(user_id, lambda ctx, d=deltas: apply_deltas(ctx, d, now))
+
+
+def user_weights(user_id: Optional[str]) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """(trọng số tag, trọng số category) hiện tại của user (đã giảm theo thời gian)."""
+    if not user_id:
+        return {}, {}
+    tv = peek_context(user_id, "tasteVector")
+    if not tv or not tv.get("w"):
+        return {}, {}
+    factor = _decay(tv["w"], tv["t"], time.time())
+    tags, cats = {}, {}
+    for k, v in tv["w"].items():
+        kind, _, name = k.partition(":")
+        (tags if kind == "tag" else cats)[name] = v * factor
+    return tags, cats
+
+
+def preference_term(df: pd.DataFrame, user_id: Optional[str]) -> Optional[np.ndarray]:
+    """Điểm cá nhân hoá cho từng dòng df trong [-PREF_WEIGHT, PREF_WEIGHT]; None nếu user chưa có vector."""
+    tags, cats = user_weights(user_id)
+    if not tags and not cats:
+        return None
+    score = np.zeros(len(df))
+    if tags and "tag" in df.columns:
+        # lowercase theo giá trị tag duy nhất (ít) rồi map cả cột
+        lookup = {t: tags.get(str(t).lower(), 0.0) for t in df["tag"].unique()}
+        score += df["tag"].astype(object).map(lookup).fillna(0.0).to_numpy(dtype=float)
+    if cats and "category" in df.columns:
+        score += df["category"].astype(str).map(cats).fillna(0.0).to_numpy(dtype=float)
+    return PREF_WEIGHT * np.tanh(score / 2.0)
@@ -0,0 +1,159 @@
+"""
+Profile cProfile theo request, bật có chọn lọc (không cần deploy lại bản debug).
+
+- Bật khi request có header X-Tripiz-Profile = TRIPIZ_ADMIN_TOKEN, hoặc ngẫu nhiên theo TRIPIZ_PROFILE_SAMPLE
+- cProfile chỉ đo thread đang chạy handler (handler đồng bộ chạy trong threadpool);
+  mỗi lúc chỉ một request được profile, request khác chạy bình thường
+- Kết quả ghi vào vòng file trên đĩa (TRIPIZ_PROFILE_DIR, giữ TRIPIZ_PROFILE_KEEP bản mới nhất):
+  <id>.prof (pstats, mở bằng snakeviz/pstats) + <id>.json (route, thời gian, top hàm theo cumtime)
+"""
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Mapping, Optional
+
+from . import metrics
+
+ADMIN_TOKEN = os.getenv("TRIPIZ_ADMIN_TOKEN", "")
+PROFILE_HEADER = "x-tripiz-profile"
+PROFILE_SAMPLE_RATE = float(os.getenv("TRIPIZ_PROFILE_SAMPLE", "0"))
+PROFILE_DIR = os.getenv("TRIPIZ_PROFILE_DIR", "data/profiles")
+PROFILE_KEEP = int(os.getenv("TRIPIZ_PROFILE_KEEP", "50"))
+PROFILE_TOP = 25  # số hàm trong bản tóm tắt JSON
+
+PROFILES_CAPTURED = metrics.counter("tripiz_profiles_captured_total", "Số profile đã ghi", ("trigger",))
+PROFILES_SKIPPED = metrics.counter("tripiz_profiles_skipped_total", "Số request được chọn nhưng bỏ qua vì đang profile request khác")
+
+_ID = re.compile(r"^[0-9]{8}T[0-9]{9}-[0-9a-f]{8}$")
+_busy = threading.Lock()  # cProfile không chạy lồng/đồng thời được -> một request mỗi lúc
+_ring_lock = threading.Lock()
+
+
+def _trigger(headers: Mapping[str, str]) -> Optional[str]:
+    """Lý do profile request này (header/sample), None nếu không."""
+    if authorized(headers.get(PROFILE_HEADER)):
+        return "header"
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return "sample"
+    return None
+
+
+def _summary(prof: cProfile.Profile) -> List[Dict[str, Any]]:
+    stats = pstats.Stats(prof, stream=io.StringIO())
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():  # type: ignore[attr-defined]
+        rows.append({"function": f"{func} ({os.path.basename(filename)}:{line})", "calls": nc,
+                     "tottime_ms": round(tt * 1000, 3), "cumtime_ms": round(ct * 1000, 3)})
+    rows.sort(key=lambda r: -r["cumtime_ms"])
+    return rows[:PROFILE_TOP]
+
+
+def _save(prof: cProfile.Profile, meta: Dict[str, Any]) -> str:
+    started = meta["startedAt"]
+    profile_id = (time.strftime("%Y%m%dT%H%M%S", time.gmtime(started)) + f"{int(started * 1000) % 1000:03d}-"
+                  + uuid.uuid4().hex[:8])
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    prof.dump_stats(os.path.join(PROFILE_DIR, profile_id + ".prof"))
+    meta = {"id": profile_id, **meta, "top": _summary(prof)}
+    tmp = os.path.join(PROFILE_DIR, f".{profile_id}.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp, os.path.join(PROFILE_DIR, profile_id + ".json"))
+    _trim()
+    return profile_id
+
+
+def _trim():
+    """Giữ PROFILE_KEEP profile mới nhất (id bắt đầu bằng thời gian UTC nên sort theo tên là đủ)."""
+    with _ring_lock:
+        ids = sorted(n[:-5] for n in os.listdir(PROFILE_DIR) if n.endswith(".json") and _ID.match(n[:-5]))
+        for old in ids[:max(0, len(ids) - PROFILE_KEEP)]:
+            for ext in (".json", ".prof"):
+                try:
+                    os.remove(os.path.join(PROFILE_DIR, old + ext))
+                except FileNotFoundError:
+                    pass
+
+
+@contextmanager
+def maybe_profile(headers: Mapping[str, str], route: str):
+    """Profile khối code nếu request được chọn; id profile gắn vào label "profile" của request."""
+    trigger = _trigger(headers)
+    if trigger is None:
+        yield
+        return
+    if not _busy.acquire(blocking=False):
+        PROFILES_SKIPPED.inc()
+        yield
+        return
+    prof = cProfile.Profile()
+    started = time.time()
+    t0 = time.perf_counter()
+    try:
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+        timings = metrics.current()
+        profile_id = _save(prof, {
+            "route": route,
+            "trigger": trigger,
+            "startedAt": started,
+            "durationMs": round((time.perf_counter() - t0) * 1000, 1),
+            "intent": timings.labels.get("intent") if timings is not None else None,
+            "stages": dict(timings.stages) if timings is not None else {},
+        })
+        metrics.set_label("profile", profile_id)
+        PROFILES_CAPTURED.inc(trigger=trigger)
+    finally:
+        _busy.release()
+
+
+def authorized(token: Optional[str]) -> bool:
+    """Endpoint admin chỉ mở khi đã cấu hình TRIPIZ_ADMIN_TOKEN và token khớp (so sánh thời gian hằng)."""
+    if not ADMIN_TOKEN or token is None:
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Tóm tắt các profile trong vòng, mới nhất trước (không kèm danh sách hàm)."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    out = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not (name.endswith(".json") and _ID.match(name[:-5])):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue  # vừa bị xoay vòng
+        meta.pop("top", None)
+        out.append(meta)
+    return out
+
+
+def profile_path(profile_id: str, ext: str = ".prof") -> str:
+    """Đường dẫn file của profile; KeyError nếu id sai dạng hoặc đã bị xoay vòng."""
+    if not _ID.match(profile_id):
+        raise KeyError(profile_id)
+    path = os.path.join(PROFILE_DIR, profile_id + ext)
+    if not os.path.exists(path):
+        raise KeyError(profile_id)
+    return path
+
+
+def profile_summary(profile_id: str) -> Dict[str, Any]:
+    with open(profile_path(profile_id, ".json"), encoding="utf-8") as f:
+        return json.load(f)
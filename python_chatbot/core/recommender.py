@@ -1,46 +1,42 @@
 import pandas as pd
-from typing import List, Dict
+from typing import List, Dict, Optional
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-import unidecode
+
+from .catalog import CATEGORIES, DATA_DIR, get_shard
+from .preferences import preference_term
+from .ann_index import ANN_NPROBE
+from .poi_record import PoiRecord, records_from_frame
 
 OUTDOOR = {"park", "garden", "viewpoint", "attraction"}
 FOOD = {"restaurant", "cafe", "fast_food", "bar", "pub", "food"}
 
 
-def load_category_data(city: str, category: str, base_dir="data/") -> pd.DataFrame:
-    """Tải dữ liệu offline tương ứng với category người dùng chọn."""
+def load_category_data(city: str, category: str, base_dir=DATA_DIR) -> pd.DataFrame:
+    """Tải dữ liệu offline tương ứng với category người dùng chọn (bản copy từ shard của thành phố)."""
     category = category.lower()
-    mapping = {
-        "food": "pois_hcm_food.csv",
-        "cafe": "pois_hcm_cafe.csv",
-        "entertainment": "pois_hcm_entertainment.csv",
-        "shopping": "pois_hcm_shopping.csv",
-        "attraction": "pois_hcm_attraction.csv",
-    }
-    file_name = mapping.get(category)
-    if not file_name:
+    if category not in CATEGORIES:
         raise ValueError(f"Không có dữ liệu cho category: {category}")
 
-    path = f"{base_dir}/{file_name}"
-    df = pd.read_csv(path)
+    df = get_shard(city, base_dir).category(category).copy()
     df["city"] = city
-    df["source_file"] = file_name
-    
-    # Add missing columns with defaults
-    if "tag" not in df.columns:
-        df["tag"] = category
-    if "avg_cost" not in df.columns:
-        df["avg_cost"] = 200000
-    
-    # Ensure avg_cost is numeric
-    if "avg_cost" in df.columns:
-        df["avg_cost"] = pd.to_numeric(df["avg_cost"], errors='coerce').fillna(200000)
-    
     return df
 
 
-def _cosine_rank(df: pd.DataFrame, query: str) -> pd.Series:
+def _cosine_rank(df: pd.DataFrame, query: str, index=None) -> pd.Series:
+    """
+    Cosine similarity giữa query và text (name + tag + description) của từng POI.
+    `index` = (vectorizer, matrix) đã fit sẵn trên đúng các dòng của df (xem CityShard.text_index).
+    """
+    if index is not None:
+        vec, M = index
+        if vec is None or M.shape[1] == 0:
+            return pd.Series([0.0] * len(df), index=df.index)
+        # TF-IDF đã L2-normalize nên cosine = tích vô hướng
+        q = vec.transform([query or ""])
+        sims = (M @ q.T).toarray().ravel()
+        return pd.Series(sims, index=df.index)
+
     text = (
         df["name"].fillna("") + " " +
         df.get("tag", pd.Series([""] * len(df))) + " " +
@@ -79,19 +75,30 @@ def recommend_pois(
     activity_tags: List[str] = [],
     budget_per_day: int = 500000,
     walk_tolerance_km: float = 5.0,
-    weather_desc: str = ""
-) -> List[Dict]:
+    weather_desc: str = "",
+    user_id: Optional[str] = None,
+    nprobe: Optional[int] = None
+) -> List[PoiRecord]:
     """Gợi ý địa điểm dựa trên loại file CSV tương ứng"""
-    df = load_category_data(city, category)
-
-    # Normalize tên thành phố
-    df["city_norm"] = df["city"].apply(lambda x: unidecode.unidecode(str(x).lower()))
-    if "ho chi minh" not in df["city_norm"].iloc[0]:
-        df = df[df["city_norm"].str.contains("ho chi minh")]
-
-    # Cosine similarity cho truy vấn
+    # Shard đã tách theo thành phố (city_norm chuẩn hoá lúc load) nên không cần lọc lại theo city
+    shard = get_shard(city)
     query = " ".join([user_query] + taste_tags + activity_tags + [city])
-    df["sim"] = _cosine_rank(df, query)
+    index = shard.text_index(category.lower())
+
+    # Catalog lớn: truy hồi ứng viên qua IVF (cosine chính xác trên shortlist), chỉ chấm điểm các dòng đó
+    rows, sims = None, None
+    ann = shard.ann_index(category.lower())
+    if ann is not None:
+        vec, M = index
+        rows, sims = ann.search(M, vec.transform([query]), nprobe or ANN_NPROBE)
+    if rows is not None and len(rows) >= 12:
+        df = shard.category(category).iloc[rows].copy()
+        df["city"] = city
+        df["sim"] = sims
+    else:
+        df = load_category_data(city, category)
+        # Cosine similarity cho truy vấn (TF-IDF cache theo shard/category)
+        df["sim"] = _cosine_rank(df, query, index)
 
     # Ngân sách
     if "avg_cost" in df.columns:
@@ -102,13 +109,16 @@ def recommend_pois(
 
 
     # Thời tiết
-    df["weather_score"] = df["tag"].apply(lambda c: _weather_penalty(str(c), weather_desc))
+    df["weather_score"] = df["tag"].astype(object).map(lambda c: _weather_penalty(str(c), weather_desc)).astype(float)
     df["final"] = 0.55 * df["sim"] + 0.2 * df["budget_score"] + 0.25 * df["weather_score"]
 
     if any(t in ["Vietnamese", "Japanese", "Italian", "Cafe", "Seafood", "Vegetarian"] for t in taste_tags):
         df.loc[df["tag"].isin(FOOD), "final"] += 0.05
 
-    df = df.sort_values("final", ascending=False)
-    cols = [c for c in ["name", "tag", "city", "avg_cost", "description", "lat", "lon",
-                        "image_url1", "image_url2", "address", "rating", "reviews", "final"] if c in df.columns]
-    return df[cols].head(12).to_dict(orient="records")
+    # Cá nhân hoá: vector sở thích của user (cập nhật từ /api/events)
+    personal = preference_term(df, user_id)
+    if personal is not None:
+        df["final"] += personal
+
+    # PoiRecord có slot thay cho dict mỗi dòng; dict chỉ dựng ở biên response
+    return records_from_frame(df.nlargest(12, "final"))
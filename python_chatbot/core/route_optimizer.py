@@ -1,7 +1,9 @@
 import math
 import networkx as nx
 from typing import List, Dict, Tuple, Optional
-from .geo_graph import road_graph_for_city, shortest_distance_km
+from .geo_graph import shortest_distance_km
+from .catalog import road_graph_for_city
+from .graph_compiler import FALLBACK_SPEED_KMH, CompiledGraph
 
 def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Calculate haversine distance in km between two lat/lon points."""
@@ -22,13 +24,18 @@ def pairwise_distance_matrix(city: str, pois: List[Dict]) -> Tuple[list, list, O
     try:
         G = road_graph_for_city(city)
         print(f"✅ Using road network graph for {city}")
+        if isinstance(G, CompiledGraph):
+            # Graph đã biên dịch là liên thông mạnh -> mọi cặp đều có đường, ma trận có hướng
+            return G.distance_matrix_km(coords).tolist(), coords, G
         for i in range(n):
             for j in range(i+1, n):
                 d = shortest_distance_km(G, coords[i], coords[j])
+                if not math.isfinite(d):
+                    d = haversine_km(coords[i][0], coords[i][1], coords[j][0], coords[j][1])
                 dist[i][j] = dist[j][i] = d
         return dist, coords, G
-    except (FileNotFoundError, RuntimeError) as e:
-        # Fallback to haversine distance (straight-line)
+    except (FileNotFoundError, RuntimeError, ValueError) as e:
+        # Fallback to haversine distance (straight-line); ValueError: POI thiếu toạ độ / không snap được
         print(f"⚠️ Road graph not available, using haversine distance: {e}")
         for i in range(n):
             for j in range(i+1, n):
@@ -36,6 +43,84 @@ def pairwise_distance_matrix(city: str, pois: List[Dict]) -> Tuple[list, list, O
                 dist[i][j] = dist[j][i] = d
         return dist, coords, None
 
+def distance_block(city: str, src_pois: List[Dict], dst_pois: List[Dict]) -> list:
+    """
+    Khoảng cách (km) từ từng POI src tới từng POI dst (ma trận len(src) x len(dst)).
+    Dùng khi chỉ cần thêm/sửa một hàng/cột của ma trận đã có thay vì tính lại toàn bộ.
+    """
+    src = [(p["lat"], p["lon"]) for p in src_pois]
+    dst = [(p["lat"], p["lon"]) for p in dst_pois]
+    if not src or not dst:
+        return [[] for _ in src]
+    try:
+        G = road_graph_for_city(city)
+        if isinstance(G, CompiledGraph):
+            return G.distance_km(src, dst).tolist()
+        out = []
+        for a in src:
+            row = []
+            for b in dst:
+                d = shortest_distance_km(G, a, b)
+                row.append(d if math.isfinite(d) else haversine_km(a[0], a[1], b[0], b[1]))
+            out.append(row)
+        return out
+    except (FileNotFoundError, RuntimeError, ValueError):
+        return [[haversine_km(a[0], a[1], b[0], b[1]) for b in dst] for a in src]
+
+def _minutes(km: list, mode: str) -> list:
+    """Không có graph thời gian: phút = km / tốc độ trung bình của phương tiện."""
+    per_km = 60.0 / FALLBACK_SPEED_KMH.get(mode, FALLBACK_SPEED_KMH["drive"])
+    return [[d * per_km for d in row] for row in km]
+
+
+def pairwise_travel_matrix(city: str, pois: List[Dict], mode: str = "drive") -> Tuple[list, list]:
+    """
+    (phút, km) giữa các POI theo đường nhanh nhất bằng `mode` ("drive" | "walk").
+    Graph đã biên dịch: Dijkstra trên CSR thời gian tính sẵn của phương tiện; không có graph: haversine / tốc độ.
+    """
+    coords = [(p["lat"], p["lon"]) for p in pois]
+    try:
+        G = road_graph_for_city(city)
+    except (FileNotFoundError, RuntimeError) as e:
+        print(f"⚠️ Road graph not available, using haversine distance: {e}")
+        G = None
+    if isinstance(G, CompiledGraph):
+        try:
+            minutes, km = G.travel_matrix(coords, mode)
+            return minutes.tolist(), km.tolist()
+        except ValueError as e:  # POI thiếu toạ độ / không snap được vào graph
+            print(f"⚠️ Cannot snap POIs to road graph, using haversine distance: {e}")
+            G = None
+    if G is None:
+        km = [[haversine_km(a[0], a[1], b[0], b[1]) for b in coords] for a in coords]
+    else:
+        km = pairwise_distance_matrix(city, pois)[0]  # graph NetworkX chưa biên dịch: chỉ có length
+    return _minutes(km, mode), km
+
+
+def travel_block(city: str, src_pois: List[Dict], dst_pois: List[Dict], mode: str = "drive") -> Tuple[list, list]:
+    """(phút, km) từ từng POI src tới từng POI dst – như distance_block nhưng theo thời gian của `mode`."""
+    src = [(p["lat"], p["lon"]) for p in src_pois]
+    dst = [(p["lat"], p["lon"]) for p in dst_pois]
+    if not src or not dst:
+        return [[] for _ in src], [[] for _ in src]
+    try:
+        G = road_graph_for_city(city)
+    except (FileNotFoundError, RuntimeError):
+        G = None
+    if isinstance(G, CompiledGraph):
+        try:
+            minutes, km = G.travel(src, dst, mode)
+            return minutes.tolist(), km.tolist()
+        except ValueError:
+            G = None
+    if G is None:
+        km = [[haversine_km(a[0], a[1], b[0], b[1]) for b in dst] for a in src]
+    else:
+        km = distance_block(city, src_pois, dst_pois)
+    return _minutes(km, mode), km
+
+
 def mst_order(dist: list) -> list:
     """Trích đường đi dựa trên MST (Prim) + DFS order để có chu trình nhẹ."""
     n = len(dist)
@@ -43,8 +128,8 @@ def mst_order(dist: list) -> list:
     G = nx.Graph()
     for i in range(n):
         for j in range(i+1, n):
-            w = dist[i][j] if math.isfinite(dist[i][j]) else 1e9
-            G.add_edge(i, j, weight=w)
+            # ma trận có thể bất đối xứng (đường một chiều) -> lấy chiều ngắn hơn cho MST
+            G.add_edge(i, j, weight=min(dist[i][j], dist[j][i]))
     T = nx.minimum_spanning_tree(G, weight="weight")
     # DFS từ 0 -> lấy thứ tự thăm
     order = list(nx.dfs_preorder_nodes(T, source=0))
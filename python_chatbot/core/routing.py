@@ -1,25 +1,173 @@
 # core/routing.py
-import random
+"""
+Sinh tuyến theo phong cách (Chill / Ẩm thực / Check-in) bằng beam search.
 
-def build_routes(pois, budget, mood):
+- Điểm phù hợp phong cách: ma trận styles x POI (category + từ khoá trong tag/mô tả + điểm gợi ý `final`)
+- Ma trận thời gian di chuyển theo phương tiện (CSR thời gian tính sẵn của road graph nếu có city,
+  không thì haversine / tốc độ trung bình)
+- Mỗi phong cách mở rộng tối đa ROUTE_BEAM_WIDTH tuyến một phần mỗi bước, ràng buộc ngân sách và
+  tổng thời gian (tham quan + di chuyển) -> chi phí tìm kiếm bị chặn bởi width x pool x stops
+- Xác định: cùng input cho cùng tuyến (hoà điểm tách theo thứ tự POI)
+"""
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .graph_compiler import FALLBACK_SPEED_KMH, haversine_m, travel_mode
+from .route_optimizer import pairwise_travel_matrix
+
+ROUTE_STOPS = int(os.getenv("TRIPIZ_ROUTE_STOPS", "3"))
+ROUTE_BEAM_WIDTH = int(os.getenv("TRIPIZ_ROUTE_BEAM_WIDTH", "8"))
+ROUTE_POOL = int(os.getenv("TRIPIZ_ROUTE_POOL", "24"))          # số POI ứng viên tối đa mỗi phong cách
+ROUTE_MAX_HOURS = float(os.getenv("TRIPIZ_ROUTE_MAX_HOURS", "6"))
+ROUTE_TRAVEL_WEIGHT = 0.3   # phạt điểm mỗi giờ di chuyển
+ROUTE_REUSE_PENALTY = 0.15  # phạt POI đã dùng ở tuyến phong cách trước -> các tuyến khác nhau hơn
+DEFAULT_COST = 100000
+DEFAULT_VISIT_MIN = 60
+VISIT_MIN = {"food": 60, "cafe": 60, "attraction": 75, "entertainment": 90, "shopping": 60}
+
+# Trọng số category + từ khoá (so khớp trên tag/mô tả viết thường) cho từng phong cách
+STYLE_PROFILES = {
+    "Chill": {
+        "categories": {"cafe": 1.0, "attraction": 0.5, "shopping": 0.3, "food": 0.3, "entertainment": 0.2},
+        "keywords": ("coffee", "cafe", "cà phê", "park", "garden", "nature", "book", "yên tĩnh", "chill"),
+    },
+    "Ẩm thực": {
+        "categories": {"food": 1.0, "cafe": 0.5, "shopping": 0.2, "attraction": 0.1, "entertainment": 0.1},
+        "keywords": ("vietnamese", "street food", "seafood", "ẩm thực", "món", "market", "chợ", "dining"),
+    },
+    "Check-in": {
+        "categories": {"attraction": 1.0, "entertainment": 0.6, "shopping": 0.4, "cafe": 0.3, "food": 0.1},
+        "keywords": ("landmark", "viewpoint", "museum", "cultural", "religious", "view", "check-in", "sống ảo"),
+    },
+}
+
+
+def _cost(p: Dict) -> int:
+    try:
+        v = float(p.get("avg_cost"))
+    except (TypeError, ValueError):
+        return DEFAULT_COST
+    return int(v) if np.isfinite(v) and v > 0 else DEFAULT_COST
+
+
+def style_scores(pois: List[Dict], styles: Sequence[str]) -> np.ndarray:
+    """Ma trận (len(styles), len(pois)) điểm phù hợp phong cách trong [0, 1]."""
+    final = np.array([float(p.get("final") or 0.0) for p in pois])
+    span = final.max() - final.min() if len(final) else 0.0
+    final = (final - final.min()) / span if span > 0 else np.full(len(pois), 0.5)
+    cats = [str(p.get("category") or "").lower() for p in pois]
+    texts = [f"{p.get('tag') or ''} {p.get('description') or ''}".lower() for p in pois]
+
+    out = np.zeros((len(styles), len(pois)))
+    for s, style in enumerate(styles):
+        prof = STYLE_PROFILES.get(style, {})
+        weights = prof.get("categories", {})
+        cat = np.array([weights.get(c, 0.0) for c in cats])
+        kw = np.array([any(k in t for k in prof.get("keywords", ())) for t in texts], dtype=float)
+        out[s] = 0.5 * cat + 0.2 * kw + 0.3 * final
+    return out
+
+
+def travel_minutes(pois: List[Dict], city: Optional[str] = None, mode: str = "drive") -> np.ndarray:
+    """Ma trận thời gian di chuyển (phút) giữa các POI bằng `mode`; POI thiếu toạ độ coi như cách 0."""
+    lat = pd.to_numeric(pd.Series([p.get("lat") for p in pois], dtype=object), errors="coerce").to_numpy(float, copy=True)
+    lon = pd.to_numeric(pd.Series([p.get("lon") for p in pois], dtype=object), errors="coerce").to_numpy(float, copy=True)
+    ok = np.isfinite(lat) & np.isfinite(lon)
+    if city and ok.all():
+        return np.asarray(pairwise_travel_matrix(city, pois, mode)[0], dtype=float)
+    km = haversine_m(lat[:, None], lon[:, None], lat[None, :], lon[None, :]) / 1000.0
+    km[~(ok[:, None] & ok[None, :])] = 0.0
+    return km / FALLBACK_SPEED_KMH.get(mode, FALLBACK_SPEED_KMH["drive"]) * 60.0
+
+
+def beam_route(fit: np.ndarray, cost: np.ndarray, visit: np.ndarray, travel: np.ndarray,
+               budget: float, max_min: float, stops: int = ROUTE_STOPS,
+               width: int = ROUTE_BEAM_WIDTH) -> Tuple[List[int], float]:
+    """
+    Beam search tuyến tối đa `stops` điểm: điểm = tổng fit - ROUTE_TRAVEL_WEIGHT x giờ di chuyển,
+    với tổng chi phí <= budget và tổng phút (tham quan + di chuyển) <= max_min.
+    Trả về (chỉ số POI theo thứ tự, điểm); tuyến rỗng nếu không POI nào thoả ràng buộc.
+    """
+    n = len(fit)
+    # Mỗi beam: (path, score, spent, minutes); bước đầu là từng POI đơn lẻ khả thi
+    ok = (cost <= budget) & (visit <= max_min)
+    first = np.flatnonzero(ok)
+    first = first[np.argsort(-fit[first], kind="stable")][:width]
+    beams = [([int(i)], float(fit[i]), float(cost[i]), float(visit[i])) for i in first]
+    best = max(beams, key=lambda b: b[1], default=([], 0.0, 0.0, 0.0))
+
+    for _ in range(stops - 1):
+        cand_score, cand_beam, cand_next = [], [], []
+        for b, (path, score, spent, minutes) in enumerate(beams):
+            last = path[-1]
+            move = travel[last]
+            new_min = minutes + move + visit
+            new_score = score + fit - ROUTE_TRAVEL_WEIGHT * move / 60.0
+            feasible = (spent + cost <= budget) & (new_min <= max_min)
+            feasible[path] = False
+            idx = np.flatnonzero(feasible)
+            cand_score.append(new_score[idx])
+            cand_beam.append(np.full(len(idx), b))
+            cand_next.append(idx)
+        if not cand_score or not sum(len(c) for c in cand_score):
+            break
+        score_all = np.concatenate(cand_score)
+        beam_all, next_all = np.concatenate(cand_beam), np.concatenate(cand_next)
+        top = np.argsort(-score_all, kind="stable")[:width]
+        new_beams = []
+        for t in top:
+            path, _, spent, minutes = beams[beam_all[t]]
+            j = int(next_all[t])
+            new_beams.append((path + [j], float(score_all[t]), spent + float(cost[j]),
+                              minutes + float(travel[path[-1], j]) + float(visit[j])))
+        beams = new_beams
+        if beams[0][1] > best[1]:
+            best = beams[0]
+    return best[0], best[1]
+
+
+def build_routes(pois, budget, mood, city: Optional[str] = None, transport: Optional[str] = None):
     """
     Ghép vài kịch bản tuyến đường: Chill / Ẩm thực / Check-in
-    mỗi tuyến 3 điểm (hoặc ít hơn nếu dữ liệu ít).
+    mỗi tuyến tối đa ROUTE_STOPS điểm chọn bằng beam search (ít hơn nếu dữ liệu/ngân sách không đủ).
+    `estimated_duration` (giờ) = thời gian tham quan + di chuyển thật bằng phương tiện `transport`.
     """
     routes = []
     if not pois:
         return routes
 
-    styles = ["Chill", "Ẩm thực", "Check-in"]
-    for style in styles:
-        k = min(3, len(pois))
-        selected = random.sample(pois, k) if k > 0 else []
-        total_cost = sum(int(p.get("avg_cost", 100000) or 100000) for p in selected)
+    styles = list(STYLE_PROFILES)
+    fit_all = style_scores(pois, styles)
+    cost_all = np.array([_cost(p) for p in pois], dtype=float)
+    visit_all = np.array([VISIT_MIN.get(str(p.get("category") or "").lower(), DEFAULT_VISIT_MIN)
+                          for p in pois], dtype=float)
+    budget = float(budget) if budget and budget > 0 else float("inf")
+    max_min = ROUTE_MAX_HOURS * 60.0
+
+    # Pool ứng viên = hợp các top-ROUTE_POOL theo từng phong cách -> một ma trận di chuyển cho mọi tuyến
+    pool = sorted({int(i) for s in range(len(styles))
+                   for i in np.argsort(-fit_all[s], kind="stable")[:ROUTE_POOL]})
+    mode = travel_mode(transport)
+    travel = travel_minutes([pois[i] for i in pool], city, mode)
+    used = np.zeros(len(pool))
+
+    for s, style in enumerate(styles):
+        fit = fit_all[s, pool] - ROUTE_REUSE_PENALTY * used
+        path, _ = beam_route(fit, cost_all[pool], visit_all[pool], travel, budget, max_min)
+        used[path] = 1.0
+        selected = [pois[pool[i]] for i in path]
+        move_min = float(sum(travel[a, b] for a, b in zip(path, path[1:])))
+        total_min = move_min + float(visit_all[pool][path].sum()) if path else 0.0
         routes.append({
             "style": style,
             "mood": mood,
             "places": selected,
-            "total_cost": total_cost,
-            "estimated_duration": random.randint(3, 6)  # giờ
+            "total_cost": int(cost_all[pool][path].sum()) if path else 0,
+            "travel_minutes": round(move_min, 1),
+            "transport": mode,
+            "estimated_duration": round(total_min / 60.0, 1)  # giờ
         })
     return routes
@@ -0,0 +1,361 @@
+"""
+Chia sẻ catalog + road graph giữa các worker (uvicorn/gunicorn --workers N) qua file mmap.
+
+- Loader publish một bundle có version: <TRIPIZ_SHARED_DIR>/<slug>/<version>/*.npy + manifest.json,
+  sau đó đổi con trỏ <slug>/CURRENT một cách nguyên tử (ghi file tạm + os.replace)
+- Worker attach bằng np.load(mmap_mode="r"): trang dữ liệu nằm trong page cache, dùng chung giữa
+  các process (cột số của catalog, TF-IDF, index autocomplete, JSON fragment của POI, graph + CSR
+  length/thời gian theo phương tiện)
+- Cột chuỗi mã hoá từ điển (giá trị duy nhất UTF-8 + code); worker giải mã thành str
+  (phần duy nhất bị copy theo worker, mỗi giá trị một lần)
+- Publish lại -> worker thấy CURRENT đổi (kiểm tra mỗi TRIPIZ_SHARED_POLL_S giây) và attach bản mới
+  mà không cần restart; bản cũ bị xoá khỏi đĩa nhưng vẫn đọc được với worker đang map (giữ inode)
+- Tắt khi không đặt TRIPIZ_SHARED_DIR (nên đặt trên tmpfs, vd /dev/shm/tripiz)
+
+Chạy từ thư mục python_chatbot (publish trước khi khởi động worker, hoặc để worker đầu tiên tự publish):
+    TRIPIZ_SHARED_DIR=/dev/shm/tripiz python -m core.shared_store --city "Hồ Chí Minh"
+"""
+import contextlib
+import json
+import os
+import pickle
+import shutil
+import time
+import uuid
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+try:
+    import fcntl
+except ImportError:  # Windows: không có flock -> không khoá liên process
+    fcntl = None
+
+from . import metrics
+from .graph_compiler import MODES, CompiledGraph, ModeWeights
+from .poi_json import PUBLIC_POI_FIELDS, PoiFragments
+from .suggest import PrefixIndex
+
+SHARED_DIR = os.getenv("TRIPIZ_SHARED_DIR", "")
+SHARED_POLL_S = float(os.getenv("TRIPIZ_SHARED_POLL_S", "2"))
+SHARED_KEEP_VERSIONS = 2
+CURRENT = "CURRENT"
+MANIFEST = "manifest.json"
+
+SHARED_PUBLISHES = metrics.counter("tripiz_shared_publish_total", "Số lần publish bundle dùng chung", ("city",))
+SHARED_ATTACHES = metrics.counter("tripiz_shared_attach_total", "Số lần worker attach bundle dùng chung", ("city",))
+
+
+def enabled() -> bool:
+    return bool(SHARED_DIR)
+
+
+def _city_dir(slug: str, root: Optional[str] = None) -> str:
+    return os.path.join(root or SHARED_DIR, slug)
+
+
+def current_version(slug: str, root: Optional[str] = None) -> Optional[str]:
+    """Version mà CURRENT đang trỏ tới (None nếu chưa publish)."""
+    try:
+        with open(os.path.join(_city_dir(slug, root), CURRENT), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+@contextlib.contextmanager
+def publish_lock(slug: str, root: Optional[str] = None):
+    """Khoá liên process (flock) để chỉ một worker/loader publish một thành phố tại một thời điểm."""
+    path = _city_dir(slug, root)
+    os.makedirs(path, exist_ok=True)
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(path, ".lock"), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# =====================================================
+# ✍️ GHI BUNDLE
+# =====================================================
+class BundleWriter:
+    """Ghi mảng/chuỗi vào thư mục version tạm; commit() đổi CURRENT sang version này."""
+
+    def __init__(self, slug: str, version: str, root: Optional[str] = None):
+        self.slug = slug
+        self.version = f"{version}-{int(time.time())}-{uuid.uuid4().hex[:6]}"
+        self.city_dir = _city_dir(slug, root)
+        self.path = os.path.join(self.city_dir, self.version)
+        os.makedirs(self.path)
+        self.manifest: Dict = {"version": self.version, "slug": slug, "created_at": time.time()}
+
+    def array(self, name: str, arr: np.ndarray):
+        np.save(os.path.join(self.path, f"{name}.npy"), np.ascontiguousarray(arr), allow_pickle=False)
+
+    def strings(self, name: str, values: Iterable):
+        """Chuỗi mã hoá từ điển: giá trị duy nhất (blob UTF-8 + offset) + code int32 theo dòng (-1 = null)."""
+        codes, uniques = pd.factorize(pd.Series(list(values), dtype=object), use_na_sentinel=True)
+        encoded = [str(v).encode("utf-8") for v in uniques]
+        self.array(f"{name}.blob", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        self.array(f"{name}.off", np.concatenate([[0], np.cumsum([len(e) for e in encoded], dtype=np.int64)]))
+        self.array(f"{name}.codes", codes.astype(np.int32))
+
+    def pickle(self, name: str, obj):
+        with open(os.path.join(self.path, f"{name}.pkl"), "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def commit(self) -> str:
+        with open(os.path.join(self.path, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+        tmp = os.path.join(self.city_dir, f".{CURRENT}.{os.getpid()}")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.city_dir, CURRENT))
+        _prune(self.city_dir, keep=self.version)
+        SHARED_PUBLISHES.inc(city=self.slug)
+        return self.version
+
+    def abort(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def _prune(city_dir: str, keep: str):
+    """Giữ SHARED_KEEP_VERSIONS version mới nhất (worker đang map bản cũ vẫn đọc được sau khi xoá)."""
+    versions = sorted((e for e in os.scandir(city_dir) if e.is_dir()), key=lambda e: e.stat().st_mtime, reverse=True)
+    for e in versions[SHARED_KEEP_VERSIONS:]:
+        if e.name != keep:
+            shutil.rmtree(e.path, ignore_errors=True)
+
+
+# =====================================================
+# 📖 ĐỌC BUNDLE (mmap)
+# =====================================================
+class Bundle:
+    """Một version đã publish; mảng được map read-only khi đọc."""
+
+    def __init__(self, path: str, manifest: Dict):
+        self.path = path
+        self.manifest = manifest
+        self.version = manifest["version"]
+
+    def array(self, name: str) -> np.ndarray:
+        return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+
+    def strings(self, name: str) -> np.ndarray:
+        """Mảng object; giá trị lặp lại dùng chung một object str (như parser CSV của pandas)."""
+        raw = self.array(f"{name}.blob").tobytes()
+        off = self.array(f"{name}.off").tolist()
+        uniques = np.empty(len(off), dtype=object)  # phần tử cuối = None cho code -1
+        uniques[:-1] = [raw[off[i]:off[i + 1]].decode("utf-8") for i in range(len(off) - 1)]
+        return uniques[self.array(f"{name}.codes")]
+
+    def unpickle(self, name: str):
+        with open(os.path.join(self.path, f"{name}.pkl"), "rb") as f:
+            return pickle.load(f)
+
+
+def attach(slug: str, root: Optional[str] = None) -> Optional[Bundle]:
+    """Bundle mà CURRENT đang trỏ tới, None nếu chưa có (hoặc vừa bị xoá giữa chừng)."""
+    version = current_version(slug, root)
+    if version is None:
+        return None
+    path = os.path.join(_city_dir(slug, root), version)
+    try:
+        with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    SHARED_ATTACHES.inc(city=slug)
+    return Bundle(path, manifest)
+
+
+# =====================================================
+# 🔁 CODEC: catalog, TF-IDF, JSON fragment, graph
+# =====================================================
+def write_frames(w: BundleWriter, frames: Dict[str, pd.DataFrame]):
+    spec = {}
+    for cat, df in frames.items():
+        cols = []
+        for col in df.columns:
+            s = df[col]
+            name = f"frame.{cat}.{col}"
+            if pd.api.types.is_numeric_dtype(s) or pd.api.types.is_bool_dtype(s):
+                w.array(name, s.to_numpy())
+                cols.append([col, "num"])
+            else:
+                w.strings(name, s.tolist())
+                cols.append([col, str(s.dtype)])
+        spec[cat] = {"rows": len(df), "columns": cols}
+    w.manifest["frames"] = spec
+
+
+def read_frames(b: Bundle) -> Dict[str, pd.DataFrame]:
+    frames = {}
+    for cat, spec in b.manifest["frames"].items():
+        data = {}
+        for col, kind in spec["columns"]:
+            name = f"frame.{cat}.{col}"
+            if kind == "num":
+                data[col] = pd.Series(b.array(name), copy=False)
+            else:
+                data[col] = pd.Series(b.strings(name), dtype=kind if kind in ("str", "category") else object)
+        frames[cat] = pd.DataFrame(data, copy=False)
+    return frames
+
+
+def write_text(w: BundleWriter, text: Dict[str, Tuple]):
+    cats = []
+    for cat, (vec, M) in text.items():
+        if vec is None:
+            continue
+        M = M.tocsr()
+        w.array(f"text.{cat}.data", M.data)
+        w.array(f"text.{cat}.indices", M.indices)
+        w.array(f"text.{cat}.indptr", M.indptr)
+        if hasattr(vec, "stop_words_"):
+            vec.stop_words_ = None  # chỉ để tra cứu, có thể rất lớn
+        w.pickle(f"text.{cat}.vectorizer", vec)
+        cats.append([cat, list(M.shape)])
+    w.manifest["text"] = cats
+
+
+def read_text(b: Bundle) -> Dict[str, Tuple]:
+    text = {}
+    for cat, shape in b.manifest.get("text", []):
+        M = csr_matrix((b.array(f"text.{cat}.data"), b.array(f"text.{cat}.indices"), b.array(f"text.{cat}.indptr")),
+                       shape=tuple(shape), copy=False)
+        text[cat] = (b.unpickle(f"text.{cat}.vectorizer"), M)
+    return text
+
+
+def write_fragments(w: BundleWriter, fragments: Optional[PoiFragments]):
+    if fragments is None:
+        return
+    w.strings("fragments.ids", fragments.ids.tolist())
+    for f in PUBLIC_POI_FIELDS:
+        w.array(f"fragments.{f}.blob", np.frombuffer(bytes(fragments.blobs[f]), dtype=np.uint8))
+        w.array(f"fragments.{f}.off", fragments.offsets[f])
+    w.manifest["fragments"] = True
+
+
+def _frame_column(frames: Dict[str, pd.DataFrame], col: str) -> Optional[np.ndarray]:
+    """Cột nối các frame theo thứ tự (như pd.concat) dạng object, dùng lại object str của frame."""
+    if not frames or not all(col in df for df in frames.values()):
+        return None
+    return np.concatenate([df[col].to_numpy(dtype=object) for df in frames.values()])
+
+
+def read_fragments(b: Bundle, frames: Dict[str, pd.DataFrame]) -> Optional[PoiFragments]:
+    if not b.manifest.get("fragments"):
+        return None
+    blobs = {f: b.array(f"fragments.{f}.blob") for f in PUBLIC_POI_FIELDS}
+    offsets = {f: b.array(f"fragments.{f}.off") for f in PUBLIC_POI_FIELDS}
+    ids = _frame_column(frames, "poi_id")
+    ids = pd.Index(ids).drop_duplicates() if ids is not None else None
+    if ids is None or len(ids) != len(offsets["poi_id"]) - 1:
+        ids = pd.Index(b.strings("fragments.ids"))
+    return PoiFragments(ids, blobs, offsets)
+
+
+_SUGGEST_ARRAYS = ("vocab", "start", "post_poi", "post_score", "row_start", "row_tok")
+
+
+def write_suggest(w: BundleWriter, index: Optional[PrefixIndex]):
+    if index is None:
+        return
+    for name in _SUGGEST_ARRAYS:
+        w.array(f"suggest.{name}", getattr(index, name))
+    heavy = list(index.heavy.items())
+    w.strings("suggest.heavy.keys", [k for k, _ in heavy])
+    w.array("suggest.heavy.rows", np.concatenate([v for _, v in heavy]) if heavy else np.zeros(0, np.int32))
+    w.array("suggest.heavy.off", np.concatenate([[0], np.cumsum([len(v) for _, v in heavy], dtype=np.int64)]))
+    w.strings("suggest.names", index.names)
+    for k, col in index.columns.items():
+        if col.dtype == object:
+            w.strings(f"suggest.col.{k}", col)
+        else:
+            w.array(f"suggest.col.{k}", col)
+    w.manifest["suggest"] = [[k, col.dtype == object] for k, col in index.columns.items()]
+
+
+def read_suggest(b: Bundle, frames: Dict[str, pd.DataFrame]) -> Optional[PrefixIndex]:
+    if "suggest" not in b.manifest:
+        return None
+    arrays = {name: b.array(f"suggest.{name}") for name in _SUGGEST_ARRAYS}
+    rows, off = b.array("suggest.heavy.rows"), b.array("suggest.heavy.off")
+    heavy = {k: rows[off[i]:off[i + 1]] for i, k in enumerate(b.strings("suggest.heavy.keys"))}
+    columns = {}
+    for k, is_str in b.manifest["suggest"]:
+        col = _frame_column(frames, k) if is_str else None
+        columns[k] = col if col is not None else \
+            b.strings(f"suggest.col.{k}") if is_str else b.array(f"suggest.col.{k}")
+    return PrefixIndex(heavy=heavy, names=b.strings("suggest.names"), columns=columns, **arrays)
+
+
+def write_graph(w: BundleWriter, G: Optional[CompiledGraph]):
+    if G is None:
+        return
+    for name in G.ARRAYS:
+        w.array(f"graph.{name}", getattr(G, name))
+    for tag, m in (("csr", G.csr()), ("csr_t", G.csr_reverse())):
+        w.array(f"graph.{tag}.data", m.data)
+        w.array(f"graph.{tag}.indices", m.indices)
+        w.array(f"graph.{tag}.indptr", m.indptr)
+    for mode in MODES:
+        for name, arr in G.weights(mode).arrays().items():
+            w.array(f"graph.{mode}.{name}", arr)
+    w.manifest["graph_modes"] = list(MODES)
+    w.manifest["graph_arrays"] = list(G.ARRAYS)
+    w.manifest["graph"] = {k: str(v) for k, v in G.meta.items()}
+
+
+def read_graph(b: Bundle) -> Optional[CompiledGraph]:
+    if "graph" not in b.manifest or "graph_modes" not in b.manifest:
+        return None  # bundle cũ chưa có thời gian theo phương tiện -> worker tự load .npz
+    if set(CompiledGraph.ARRAYS) - set(b.manifest.get("graph_arrays", ())):
+        return None  # bundle cũ thiếu mảng (vd thời gian theo segment) -> worker tự load .npz
+    G = CompiledGraph({name: b.array(f"graph.{name}") for name in CompiledGraph.ARRAYS}, b.manifest["graph"])
+    n = G.n_nodes
+    G._csr = csr_matrix((b.array("graph.csr.data"), b.array("graph.csr.indices"), b.array("graph.csr.indptr")),
+                        shape=(n, n), copy=False)
+    G._csr_t = csr_matrix((b.array("graph.csr_t.data"), b.array("graph.csr_t.indices"),
+                           b.array("graph.csr_t.indptr")), shape=(n, n), copy=False)
+    for mode in b.manifest["graph_modes"]:
+        G._modes[mode] = ModeWeights.from_arrays(
+            {name: b.array(f"graph.{mode}.{name}") for name in ModeWeights.ARRAYS}, n)
+    return G
+
+
+def main(argv=None):
+    import argparse
+
+    from .catalog import DATA_DIR, publish_shared_shard
+    from .cities import city_slug
+
+    ap = argparse.ArgumentParser(description="Publish catalog + road graph của thành phố vào TRIPIZ_SHARED_DIR")
+    ap.add_argument("--city", action="append", required=True, help="có thể lặp lại")
+    ap.add_argument("--data-dir", default=DATA_DIR)
+    ap.add_argument("--shared-dir", default=SHARED_DIR or None)
+    args = ap.parse_args(argv)
+    if not args.shared_dir:
+        print("❌ Cần TRIPIZ_SHARED_DIR hoặc --shared-dir")
+        return 1
+    for city in args.city:
+        t0 = time.perf_counter()
+        with publish_lock(city_slug(city), args.shared_dir):
+            version = publish_shared_shard(city, args.data_dir, args.shared_dir)
+        print(f"✅ {city} -> version {version} ({time.perf_counter() - t0:.1f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
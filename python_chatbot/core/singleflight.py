@@ -0,0 +1,114 @@
+"""
+Single-flight: gộp các lời gọi đồng thời cùng key thành một lần tính.
+
+- Lời gọi đầu tiên của một key (leader) chạy fn; các lời gọi tới trong lúc đó (shared) chờ
+  và nhận đúng kết quả hoặc exception của leader -> cache nguội / API ngoài chỉ bị gọi một lần mỗi key
+- Không cache sau khi xong: lời gọi sau khi leader kết thúc sẽ chạy lại (cache là việc của caller)
+- Metric theo group + key: số lời gọi theo vai trò, thời gian chờ của lời gọi shared,
+  fan-in (số lời gọi được phục vụ bởi một lần chạy); key ngoài SINGLEFLIGHT_MAX_KEYS key đầu tiên
+  được gộp nhãn "other" để giới hạn cardinality
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, Set, TypeVar
+
+from . import metrics
+
+T = TypeVar("T")
+
+SINGLEFLIGHT_MAX_KEYS = int(os.getenv("TRIPIZ_SINGLEFLIGHT_MAX_KEYS", "64"))
+
+SF_CALLS = metrics.counter("tripiz_singleflight_calls_total", "Số lời gọi single-flight theo vai trò",
+                           ("group", "key", "role"))
+SF_WAIT = metrics.histogram("tripiz_singleflight_wait_seconds", "Thời gian lời gọi shared chờ leader",
+                            ("group", "key"))
+SF_FANIN = metrics.histogram("tripiz_singleflight_fanin", "Số lời gọi được phục vụ bởi một lần chạy",
+                             ("group", "key"), buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+SF_INFLIGHT = metrics.gauge("tripiz_singleflight_inflight", "Số key đang chạy", ("group",))
+
+
+class _Call:
+    __slots__ = ("future", "fan_in", "thread")
+
+    def __init__(self):
+        self.future: Future = Future()
+        self.fan_in = 1
+        self.thread = threading.get_ident()
+
+
+class Group:
+    """Một nhóm single-flight (vd "weather"); key chỉ cần hashable."""
+
+    def __init__(self, name: str, max_keys: int = SINGLEFLIGHT_MAX_KEYS):
+        self.name = name
+        self.max_keys = max_keys
+        self._calls: Dict[Hashable, _Call] = {}
+        self._labels: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def _label(self, key: Hashable) -> str:
+        label = str(key)
+        if label in self._labels:
+            return label
+        with self._lock:
+            if len(self._labels) < self.max_keys:
+                self._labels.add(label)
+                return label
+        return "other"
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """Kết quả của fn() cho key; nếu key đang chạy ở thread khác thì chờ và dùng chung kết quả/lỗi."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                SF_INFLIGHT.set(len(self._calls), group=self.name)
+            elif call.thread == threading.get_ident():
+                leader = None  # gọi lồng cùng key trong leader -> chạy thẳng, tránh tự chờ mình
+            else:
+                call.fan_in += 1
+        label = self._label(key)
+
+        if leader is None:
+            return fn()
+        if not leader:
+            SF_CALLS.inc(group=self.name, key=label, role="shared")
+            t0 = time.perf_counter()
+            try:
+                return call.future.result()
+            finally:
+                SF_WAIT.observe(time.perf_counter() - t0, group=self.name, key=label)
+
+        SF_CALLS.inc(group=self.name, key=label, role="leader")
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, call, label)
+            call.future.set_exception(e)
+            raise
+        self._finish(key, call, label)
+        call.future.set_result(result)
+        return result
+
+    def _finish(self, key: Hashable, call: _Call, label: str):
+        with self._lock:
+            self._calls.pop(key, None)
+            fan_in = call.fan_in  # sau khi pop không còn ai gia nhập
+            SF_INFLIGHT.set(len(self._calls), group=self.name)
+        SF_FANIN.observe(fan_in, group=self.name, key=label)
+
+
+_GROUPS: Dict[str, Group] = {}
+_groups_lock = threading.Lock()
+
+
+def group(name: str) -> Group:
+    """Group theo tên (dùng chung trong process)."""
+    with _groups_lock:
+        g = _GROUPS.get(name)
+        if g is None:
+            g = _GROUPS[name] = Group(name)
+        return g
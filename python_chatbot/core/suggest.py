@@ -0,0 +1,282 @@
+"""
+Gợi ý tên địa điểm theo tiền tố (autocomplete), không phân biệt dấu.
+
+- Tên + địa chỉ được fold() (lowercase + bỏ dấu, giống city_norm) rồi tách token [a-z0-9]+
+- Từ điển token đã sắp xếp + postings (POI, điểm) xếp liền nhau theo token:
+  một tiền tố = một khoảng liên tục trong từ điển (searchsorted) = một lát cắt postings
+- Tiền tố "nặng" (khớp > SUGGEST_SCAN_MAX postings, thường là 1-3 ký tự) có sẵn top-k tính lúc build
+- Truy vấn nhiều từ: các từ trước là từ hoàn chỉnh (khớp nguyên token), chỉ từ cuối là tiền tố;
+  lấy từ hiếm nhất làm gốc, duyệt postings của nó theo từng đoạn và lọc ứng viên bằng danh sách
+  token của từng dòng (CSR dòng -> token id) -> chi phí theo số ứng viên, không theo độ phổ biến của từ
+- Xếp hạng: tên bắt đầu bằng cả cụm > mọi từ đều khớp trong tên > còn lại; cùng hạng theo điểm
+"""
+import math
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import unidecode
+
+from .cities import fold
+from .poi_record import FLOAT_DECIMALS
+
+SUGGEST_TOPK = 20          # số ứng viên giữ sẵn cho mỗi tiền tố nặng
+SUGGEST_SCAN_MAX = 4096    # postings tối đa quét trực tiếp khi truy vấn
+SUGGEST_MAX_LIMIT = 20
+SUGGEST_RERANK = 4         # xếp hạng lại limit * SUGGEST_RERANK ứng viên theo tên
+
+# Trọng số theo vị trí khớp: từ đầu tên > từ khác trong tên > địa chỉ
+WEIGHT_NAME_FIRST = 1.0
+WEIGHT_NAME = 0.8
+WEIGHT_ADDRESS = 0.4
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_TOKEN_OR_ROW = re.compile(r"[a-z0-9]+|\n")
+_END = "{"  # ký tự ngay sau 'z' -> cận trên của mọi token bắt đầu bằng tiền tố
+
+
+def tokenize(text) -> List[str]:
+    # lower() lần nữa: unidecode có thể sinh chữ hoa (chữ Hán, kana...)
+    return _TOKEN.findall(fold(text).lower()) if isinstance(text, str) and text else []
+
+
+def _token_rows(values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """(dòng, token) cho mọi token của cột, theo thứ tự xuất hiện – cùng kết quả với tokenize() từng dòng.
+    Cả cột được nối thành một chuỗi; unidecode chỉ chạy trên các ký tự non-ASCII khác nhau (vài trăm)
+    rồi áp bằng str.translate, còn tách token là một lần regex -> không có vòng lặp Python theo dòng."""
+    text = "\n".join(str(v).replace("\n", " ") for v in values.fillna("").to_numpy(dtype=object)).lower()
+    table = {ord(c): unidecode.unidecode(c).lower() for c in set(text) if ord(c) > 127}
+    toks = np.array(_TOKEN_OR_ROW.findall(text.translate(table)), dtype=object)
+    sep = toks == "\n"
+    return np.cumsum(sep)[~sep], toks[~sep]
+
+
+def popularity(df: pd.DataFrame) -> np.ndarray:
+    """Điểm phổ biến > 0: rating (mặc định 3.5) + log số review."""
+    n = len(df)
+    rating = pd.to_numeric(df["rating"], errors="coerce").fillna(3.5).to_numpy(float) if "rating" in df else np.full(n, 3.5)
+    reviews = pd.to_numeric(df["reviews"], errors="coerce").fillna(0).clip(lower=0).to_numpy(float) \
+        if "reviews" in df else np.zeros(n)
+    return rating + 0.3 * np.log1p(reviews) + 0.1
+
+
+class PrefixIndex:
+    """Từ điển token sắp xếp + postings theo token (CSR), postings mỗi token xếp theo điểm giảm dần."""
+
+    def __init__(self, vocab: np.ndarray, start: np.ndarray, post_poi: np.ndarray, post_score: np.ndarray,
+                 row_start: np.ndarray, row_tok: np.ndarray, heavy: Dict[str, np.ndarray], names: np.ndarray,
+                 columns: Dict[str, np.ndarray], build_s: float = 0.0):
+        self.vocab = vocab              # token duy nhất, đã sắp xếp (np.str_)
+        self.start = start              # (len(vocab) + 1,) offset vào postings
+        self.post_poi = post_poi        # int32, dòng trong DataFrame gốc
+        self.post_score = post_score    # float32
+        self.row_start = row_start      # (n + 1,) offset vào row_tok
+        self.row_tok = row_tok          # token id của từng dòng (tăng dần trong dòng), int32
+        self.heavy = heavy              # tiền tố nặng -> top SUGGEST_TOPK dòng (đã dedupe, theo điểm)
+        self.names = names              # tên đã fold, token nối bằng dấu cách (object)
+        self.columns = columns          # cột trả về (mảng numpy theo dòng)
+        self.build_s = build_s
+
+    @property
+    def nbytes(self) -> int:
+        total = self.vocab.nbytes + self.start.nbytes + self.post_poi.nbytes + self.post_score.nbytes
+        total += self.row_start.nbytes + self.row_tok.nbytes
+        total += sum(len(k) + v.nbytes + 64 for k, v in self.heavy.items()) + self.names.nbytes
+        return int(total + sum(c.nbytes for c in self.columns.values()))
+
+    @classmethod
+    def build(cls, df: pd.DataFrame) -> "PrefixIndex":
+        t0 = time.perf_counter()
+        n = len(df)
+        empty = pd.Series([""] * n)
+        name_rows, name_toks = _token_rows(df["name"] if "name" in df else empty)
+        addr_rows, addr_toks = _token_rows(df["address"] if "address" in df else empty)
+
+        # (token, dòng, trọng số): token đầu tiên của tên > các token khác của tên > địa chỉ
+        first = np.r_[True, name_rows[1:] != name_rows[:-1]] if len(name_rows) else np.zeros(0, bool)
+        rows = np.concatenate([name_rows, addr_rows])
+        weights = np.concatenate([np.where(first, WEIGHT_NAME_FIRST, WEIGHT_NAME),
+                                  np.full(len(addr_rows), WEIGHT_ADDRESS)])
+        tok_id, vocab = pd.factorize(np.concatenate([name_toks, addr_toks]), sort=True)
+
+        # mỗi (token, dòng) chỉ giữ trọng số cao nhất
+        key = tok_id.astype(np.int64) * max(n, 1) + rows
+        order = np.lexsort((-weights, key))
+        key = key[order]
+        keep = order[np.r_[True, key[1:] != key[:-1]]] if len(key) else order
+        tok_id, rows, weights = tok_id[keep], rows[keep], weights[keep]
+
+        # đang sắp theo (token, dòng) -> sắp ổn định theo dòng cho token id tăng dần trong mỗi dòng
+        by_row = np.argsort(rows, kind="stable")
+        row_tok = tok_id[by_row].astype(np.int32)
+        row_start = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=n))]).astype(np.int64)
+
+        post_score = (weights * popularity(df)[rows]).astype(np.float32)
+        order = np.lexsort((-post_score, tok_id))  # theo token, trong token theo điểm giảm dần
+        post_poi, post_score = rows[order].astype(np.int32), post_score[order]
+        start = np.concatenate([[0], np.cumsum(np.bincount(tok_id, minlength=len(vocab)))]).astype(np.int64)
+
+        # tên đã fold (token nối bằng dấu cách) để xếp hạng lại theo cụm
+        bounds = np.searchsorted(name_rows, np.arange(n + 1))
+        toks = name_toks.tolist()
+        names = np.array([" ".join(toks[bounds[i]:bounds[i + 1]]) for i in range(n)], dtype=object)
+
+        index = cls(np.asarray(vocab, dtype=np.str_), start, post_poi, post_score, row_start, row_tok, {}, names,
+                    poi_columns(df), 0.0)
+        index.heavy = index._heavy_prefixes()
+        index.build_s = time.perf_counter() - t0
+        return index
+
+    def _vocab_range(self, prefix: str, exact: bool = False) -> Tuple[int, int]:
+        """Khoảng token id bắt đầu bằng prefix (exact: chỉ đúng token đó)."""
+        lo = int(np.searchsorted(self.vocab, prefix, "left"))
+        hi = int(np.searchsorted(self.vocab, prefix, "right") if exact else np.searchsorted(self.vocab, prefix + _END, "left"))
+        return lo, hi
+
+    def _top(self, lo: int, hi: int, k: int) -> np.ndarray:
+        """Top k dòng (không trùng) trong postings[lo:hi] theo điểm."""
+        return _top_unique(self.post_poi[lo:hi], self.post_score[lo:hi], k)
+
+    def _heavy_prefixes(self) -> Dict[str, np.ndarray]:
+        """Top-k sẵn cho mọi tiền tố có > SUGGEST_SCAN_MAX postings.
+        Tiền tố dài hơn chỉ có thể nặng nếu tiền tố cha nặng -> chỉ đi xuống các nhánh nặng."""
+        heavy = {}
+        frontier = [""]
+        while frontier:
+            children = []
+            for parent in frontier:
+                a = int(np.searchsorted(self.vocab, parent, "left"))
+                end = int(np.searchsorted(self.vocab, parent + _END, "left"))
+                while a < end:
+                    token = str(self.vocab[a])
+                    if len(token) == len(parent):  # chính token = parent
+                        a += 1
+                        continue
+                    p = token[:len(parent) + 1]
+                    b = int(np.searchsorted(self.vocab, p + _END, "left"))
+                    lo, hi = int(self.start[a]), int(self.start[b])
+                    if hi - lo > SUGGEST_SCAN_MAX:
+                        heavy[p] = self._top(lo, hi, SUGGEST_TOPK)
+                        children.append(p)
+                    a = b
+            frontier = children
+        return heavy
+
+    def search(self, query: str, limit: int = 8) -> List[Dict]:
+        """Gợi ý theo tiền tố: các từ đầu khớp nguyên token, từ cuối là tiền tố (trong tên hoặc địa chỉ)."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        limit = max(1, min(limit, SUGGEST_MAX_LIMIT))
+        want = limit * SUGGEST_RERANK
+        vranges = {t: self._vocab_range(t, exact=t != terms[-1]) for t in terms}
+        spans = {t: (int(self.start[a]), int(self.start[b])) for t, (a, b) in vranges.items()}
+        driver = min(terms, key=lambda t: spans[t][1] - spans[t][0])
+        lo, hi = spans[driver]
+        if hi <= lo:
+            return []
+        others = [vranges[t] for t in terms if t != driver]
+
+        rows = None
+        if driver == terms[-1] and driver in self.heavy:
+            rows = self._filter(self.heavy[driver], others)
+            if len(rows) < limit and others:
+                rows = None  # top-k sẵn bị lọc gần hết -> quét postings
+        if rows is None:
+            rows = self._scan(lo, hi, others, want)
+        return self._payload(self._rerank(rows[:want], terms)[:limit])
+
+    def _scan(self, lo: int, hi: int, others: List[Tuple[int, int]], want: int) -> np.ndarray:
+        """Duyệt postings[lo:hi] theo từng đoạn SUGGEST_SCAN_MAX, giữ dòng khớp mọi từ còn lại.
+        Một token: postings đã theo điểm giảm dần -> dừng sớm vẫn đúng top. Tiền tố nặng nhiều token:
+        dừng khi đủ ứng viên (xấp xỉ, chỉ xảy ra khi top-k sẵn bị lọc hết)."""
+        pois, scores = [], []
+        found = 0
+        for a in range(lo, hi, SUGGEST_SCAN_MAX):
+            b = min(a + SUGGEST_SCAN_MAX, hi)
+            p, sc = self.post_poi[a:b], self.post_score[a:b]
+            for va, vb in others:
+                keep = self._has_token(p, va, vb)
+                p, sc = p[keep], sc[keep]
+            pois.append(p)
+            scores.append(sc)
+            found += len(p)
+            if found >= want and b < hi:
+                break
+        return _top_unique(np.concatenate(pois), np.concatenate(scores), want)
+
+    def _has_token(self, rows: np.ndarray, va: int, vb: int) -> np.ndarray:
+        """Mask: dòng có ít nhất một token id trong [va, vb) (duyệt CSR dòng -> token, không đụng postings)."""
+        if not len(rows):
+            return np.zeros(0, dtype=bool)
+        s = self.row_start[rows]
+        counts = self.row_start[rows + 1] - s
+        offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        toks = self.row_tok[np.repeat(s - offsets, counts) + np.arange(counts.sum())]
+        hit = (toks >= va) & (toks < vb)
+        # mọi dòng ứng viên đều có >= 1 token (đã khớp từ gốc) nên reduceat không gặp đoạn rỗng
+        return np.logical_or.reduceat(hit, offsets)
+
+    def _filter(self, rows: np.ndarray, others: List[Tuple[int, int]]) -> np.ndarray:
+        for va, vb in others:
+            rows = rows[self._has_token(rows, va, vb)]
+        return rows
+
+    def _rerank(self, rows: np.ndarray, terms: List[str]) -> np.ndarray:
+        """Sắp lại (ổn định) theo mức khớp tên: 2 = tên bắt đầu bằng cả cụm, 1 = mọi từ khớp một từ trong tên."""
+        phrase = " ".join(terms)
+        tiers = []
+        for name in self.names[rows]:
+            if name.startswith(phrase):
+                tiers.append(2)
+            else:
+                words = name.split()
+                tiers.append(1 if all(any(w.startswith(t) for w in words) for t in terms) else 0)
+        return rows[np.argsort(-np.asarray(tiers, dtype=np.int8), kind="stable")]
+
+    def _payload(self, rows: np.ndarray) -> List[Dict]:
+        return rows_payload(self.columns, rows)
+
+
+def _top_unique(pois: np.ndarray, scores: np.ndarray, k: int) -> np.ndarray:
+    """Top k dòng không trùng theo điểm (một dòng có thể xuất hiện ở nhiều token)."""
+    if len(scores) > 4 * k:
+        keep = np.argpartition(-scores, 4 * k)[:4 * k]
+        pois, scores = pois[keep], scores[keep]
+    pois = pois[np.argsort(-scores, kind="stable")]
+    _, first = np.unique(pois, return_index=True)
+    return pois[np.sort(first)][:k]
+
+
+def poi_columns(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    cols = {}
+    for k in ("poi_id", "name", "address", "category"):
+        cols[k] = df[k].to_numpy(dtype=object) if k in df else np.full(len(df), None, dtype=object)
+    for k in ("lat", "lon", "rating"):
+        cols[k] = pd.to_numeric(df[k], errors="coerce").to_numpy(np.float64) if k in df else np.full(len(df), np.nan)
+        if k in df and df[k].dtype == np.float32:
+            cols[k] = np.round(cols[k], FLOAT_DECIMALS)  # catalog gọn: bỏ đuôi nhị phân của float32
+    return cols
+
+
+def rows_payload(columns: Dict[str, np.ndarray], rows: np.ndarray) -> List[Dict]:
+    """Các dòng `rows` của poi_columns() -> list dict JSON được (NaN -> None)."""
+    cols = {k: v[rows] for k, v in columns.items()}
+    out = []
+    for i in range(len(rows)):
+        item = {}
+        for k, v in cols.items():
+            v = v[i]
+            if isinstance(v, (float, np.floating)):
+                v = None if math.isnan(v) else float(v)
+            item[k] = v
+        out.append(item)
+    return out
+
+
+def build_prefix_index(df: Optional[pd.DataFrame]) -> Optional[PrefixIndex]:
+    if df is None or not len(df):
+        return None
+    return PrefixIndex.build(df)
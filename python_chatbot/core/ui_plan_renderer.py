@@ -46,7 +46,9 @@ def fix_google_img(url: str):
 def render_plan_card(day_idx, plan_day):
     """Hiển thị 1 ngày hành trình dạng thẻ đẹp + ảnh + bản đồ."""
     st.markdown(f"## 🗓️ Ngày {day_idx+1}: {plan_day.get('title', 'Khám phá')}")
-    st.caption(f"🌤 {plan_day.get('weather', 'Không rõ')} • 🚗 {plan_day.get('distance', 0):.2f} km tổng quãng đường")
+    icon = "🚶" if plan_day.get("transport") == "walk" else "🚗"
+    st.caption(f"🌤 {plan_day.get('weather', 'Không rõ')} • {icon} {plan_day.get('distance', 0):.2f} km tổng quãng đường"
+               f" • ⏱ {plan_day.get('travel_minutes', 0):.0f} phút di chuyển")
     st.divider()
 
     pois = plan_day.get("pois", [])
@@ -0,0 +1,215 @@
+"""
+POI theo khung nhìn bản đồ (bbox + zoom) với cụm dựng sẵn theo từng mức zoom.
+
+- Lưới theo Web Mercator: ở zoom z mỗi trục có 2^(z + CELL_SHIFT) ô (ô ~64px trên tile 256px)
+- Mức mịn nhất (VIEWPORT_CLUSTER_MAX_ZOOM) gom từ POI; các mức thô hơn gom từ ô con
+  (count, tổng lat/lon cho tâm cụm, POI đại diện phổ biến nhất) -> dựng O(n log n) một lần
+- Truy vấn: mỗi hàng ô trong bbox là một khoảng liên tục của key đã sắp xếp (searchsorted);
+  zoom bị hạ để bbox phủ tối đa VIEWPORT_MAX_CELLS ô mỗi trục -> payload không phụ thuộc số POI
+- Zoom > VIEWPORT_CLUSTER_MAX_ZOOM: trả từng POI (tối đa VIEWPORT_MAX_POIS, ưu tiên phổ biến)
+"""
+import math
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .suggest import poi_columns, popularity, rows_payload
+
+VIEWPORT_CLUSTER_MAX_ZOOM = int(os.getenv("TRIPIZ_CLUSTER_MAX_ZOOM", "16"))
+VIEWPORT_MAX_ZOOM = 22
+VIEWPORT_MAX_CELLS = 32    # ô tối đa mỗi trục trong một khung nhìn (~2048px)
+VIEWPORT_MAX_POIS = 500
+CELL_SHIFT = 2             # 4 ô mỗi cạnh tile 256px -> ô 64px
+MAX_LAT = 85.05112878
+
+_ROW_BITS = 32  # key = iy << 32 | ix
+
+
+def mercator(lat, lon) -> Tuple[np.ndarray, np.ndarray]:
+    """(x, y) Web Mercator chuẩn hoá về [0, 1), y tăng về phía nam."""
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_LAT, MAX_LAT)
+    x = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0
+    s = np.sin(np.radians(lat))
+    y = 0.5 - np.log((1 + s) / (1 - s)) / (4 * math.pi)
+    return np.clip(x, 0.0, 1.0 - 1e-12), np.clip(y, 0.0, 1.0 - 1e-12)
+
+
+def parse_bbox(bbox: str) -> Tuple[float, float, float, float]:
+    """'west,south,east,north' (lon,lat,lon,lat) -> tuple; ValueError nếu sai định dạng."""
+    try:
+        west, south, east, north = (float(v) for v in bbox.split(","))
+    except (AttributeError, ValueError):
+        raise ValueError("bbox phải có dạng west,south,east,north (lon,lat,lon,lat)")
+    if not all(math.isfinite(v) for v in (west, south, east, north)):
+        raise ValueError("bbox chứa giá trị không hợp lệ")
+    if south > north:
+        south, north = north, south
+    if west > east:  # không hỗ trợ bbox vắt qua kinh tuyến 180
+        west, east = east, west
+    return west, south, east, north
+
+
+class ZoomGrid:
+    """Các ô có POI ở một mức zoom, sắp theo key (hàng trước, cột sau)."""
+
+    def __init__(self, keys: np.ndarray, count: np.ndarray, sum_lat: np.ndarray, sum_lon: np.ndarray,
+                 rep: np.ndarray, rep_score: np.ndarray):
+        self.keys = keys            # int64
+        self.count = count          # int32
+        self.sum_lat = sum_lat      # float64 (tâm cụm = sum / count)
+        self.sum_lon = sum_lon
+        self.rep = rep              # int32, dòng POI đại diện
+        self.rep_score = rep_score  # float32
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(a.nbytes for a in (self.keys, self.count, self.sum_lat, self.sum_lon, self.rep, self.rep_score)))
+
+    @classmethod
+    def aggregate(cls, keys, count, sum_lat, sum_lon, rep, rep_score) -> "ZoomGrid":
+        """Gom các phần tử cùng key: cộng count/tổng toạ độ, giữ đại diện có điểm cao nhất."""
+        order = np.lexsort((-rep_score, keys))
+        keys = keys[order]
+        start = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.zeros(0, np.int64)
+        if not len(start):
+            return cls(keys, count[order], sum_lat[order], sum_lon[order], rep[order], rep_score[order])
+        first = order[start]
+        return cls(
+            keys[start],
+            np.add.reduceat(count[order], start).astype(np.int32),
+            np.add.reduceat(sum_lat[order], start),
+            np.add.reduceat(sum_lon[order], start),
+            rep[first],
+            rep_score[first],
+        )
+
+    def parent(self) -> "ZoomGrid":
+        """Lưới ở zoom thấp hơn một mức (mỗi ô cha = 2x2 ô con)."""
+        iy, ix = self.keys >> _ROW_BITS, self.keys & ((1 << _ROW_BITS) - 1)
+        return ZoomGrid.aggregate(((iy >> 1) << _ROW_BITS) | (ix >> 1), self.count, self.sum_lat, self.sum_lon,
+                                  self.rep, self.rep_score)
+
+    def slices(self, x0: int, x1: int, y0: int, y1: int) -> np.ndarray:
+        """Chỉ số các ô trong khối [x0, x1] x [y0, y1] (mỗi hàng một searchsorted)."""
+        parts = []
+        for iy in range(y0, y1 + 1):
+            base = iy << _ROW_BITS
+            lo = np.searchsorted(self.keys, base | x0, "left")
+            hi = np.searchsorted(self.keys, base | x1, "right")
+            if hi > lo:
+                parts.append(np.arange(lo, hi))
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+
+class ViewportIndex:
+    """Lưới cụm dựng sẵn cho mọi zoom <= VIEWPORT_CLUSTER_MAX_ZOOM, cho cả catalog và từng category."""
+
+    def __init__(self, grids: Dict[Optional[str], List[ZoomGrid]], poi_keys: np.ndarray, poi_rows: np.ndarray,
+                 category: np.ndarray, score: np.ndarray, columns: Dict[str, np.ndarray], build_s: float = 0.0):
+        self.grids = grids          # category (None = tất cả) -> [ZoomGrid zoom 0 .. max]
+        self.poi_keys = poi_keys    # key ở zoom mịn nhất của từng POI, đã sắp xếp
+        self.poi_rows = poi_rows    # dòng tương ứng với poi_keys
+        self.category = category    # category theo dòng (object)
+        self.score = score          # điểm phổ biến theo dòng
+        self.columns = columns
+        self.build_s = build_s
+
+    @property
+    def nbytes(self) -> int:
+        total = sum(g.nbytes for levels in self.grids.values() for g in levels)
+        total += self.poi_keys.nbytes + self.poi_rows.nbytes + self.score.nbytes + self.category.nbytes
+        return int(total + sum(c.nbytes for c in self.columns.values()))
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, max_zoom: int = VIEWPORT_CLUSTER_MAX_ZOOM) -> "ViewportIndex":
+        t0 = time.perf_counter()
+        columns = poi_columns(df)
+        lat, lon = columns["lat"], columns["lon"]
+        ok = np.isfinite(lat) & np.isfinite(lon)
+        rows = np.flatnonzero(ok).astype(np.int32)
+        x, y = mercator(lat[ok], lon[ok])
+        n_cells = 1 << (max_zoom + CELL_SHIFT)
+        keys = ((y * n_cells).astype(np.int64) << _ROW_BITS) | (x * n_cells).astype(np.int64)
+        score = popularity(df).astype(np.float32)
+        category = df["category"].astype(str).to_numpy(dtype=object) if "category" in df else \
+            np.full(len(df), "", dtype=object)
+
+        grids = {}
+        for cat in [None] + sorted(set(category[rows])):
+            sel = slice(None) if cat is None else category[rows] == cat
+            finest = ZoomGrid.aggregate(keys[sel], np.ones(len(rows[sel]), np.int32), lat[rows[sel]], lon[rows[sel]],
+                                        rows[sel], score[rows[sel]])
+            levels = [finest]
+            for _ in range(max_zoom):
+                levels.append(levels[-1].parent())
+            grids[cat] = levels[::-1]
+
+        order = np.argsort(keys, kind="stable")
+        return cls(grids, keys[order], rows[order], category, score, columns, time.perf_counter() - t0)
+
+    @property
+    def max_zoom(self) -> int:
+        return len(self.grids[None]) - 1
+
+    def query(self, bbox: Tuple[float, float, float, float], zoom: int, category: Optional[str] = None) -> Dict:
+        """Cụm (zoom <= max_zoom) hoặc từng POI trong bbox; số phần tử trả về luôn bị chặn."""
+        west, south, east, north = bbox
+        x0, y0 = mercator(north, west)
+        x1, y1 = mercator(south, east)
+        x0, y0, x1, y1 = float(x0), float(y0), float(x1), float(y1)
+        span = max(x1 - x0, y1 - y0, 1e-12)
+        # zoom lớn nhất mà bbox vẫn nằm trong VIEWPORT_MAX_CELLS ô mỗi trục
+        fit = int(math.floor(math.log2(VIEWPORT_MAX_CELLS / span))) - CELL_SHIFT
+        zoom = max(0, min(int(zoom), VIEWPORT_MAX_ZOOM, fit))
+        category = category.lower() if category else None
+        if category is not None and category not in self.grids:
+            return {"zoom": zoom, "clustered": zoom <= self.max_zoom, "total": 0, "truncated": False, "items": []}
+        if zoom > self.max_zoom:
+            return self._pois(x0, y0, x1, y1, bbox, zoom, category)
+
+        grid = self.grids[category][zoom]
+        n_cells = 1 << (zoom + CELL_SHIFT)
+        idx = grid.slices(int(x0 * n_cells), int(x1 * n_cells), int(y0 * n_cells), int(y1 * n_cells))
+        count = grid.count[idx]
+        single = rows_payload(self.columns, grid.rep[idx[count == 1]])
+        items = [{"type": "poi", **p} for p in single]
+        multi = idx[count > 1]
+        if len(multi):
+            c = grid.count[multi]
+            names = self.columns["name"][grid.rep[multi]]
+            for n, la, lo, nm in zip(c, grid.sum_lat[multi] / c, grid.sum_lon[multi] / c, names):
+                items.append({"type": "cluster", "count": int(n), "lat": float(la), "lon": float(lo), "top": nm})
+        return {"zoom": zoom, "clustered": True, "total": int(count.sum()), "truncated": False, "items": items}
+
+    def _pois(self, x0, y0, x1, y1, bbox, zoom, category) -> Dict:
+        """Từng POI trong bbox, lấy theo lưới mịn nhất rồi lọc chính xác theo toạ độ."""
+        n_cells = 1 << (self.max_zoom + CELL_SHIFT)
+        parts = []
+        for iy in range(int(y0 * n_cells), int(y1 * n_cells) + 1):
+            base = iy << _ROW_BITS
+            lo = np.searchsorted(self.poi_keys, base | int(x0 * n_cells), "left")
+            hi = np.searchsorted(self.poi_keys, base | int(x1 * n_cells), "right")
+            if hi > lo:
+                parts.append(self.poi_rows[lo:hi])
+        rows = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+        west, south, east, north = bbox
+        lat, lon = self.columns["lat"][rows], self.columns["lon"][rows]
+        keep = (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
+        if category is not None:
+            keep &= self.category[rows] == category
+        rows = rows[keep]
+        total = len(rows)
+        if total > VIEWPORT_MAX_POIS:
+            rows = rows[np.argpartition(-self.score[rows], VIEWPORT_MAX_POIS)[:VIEWPORT_MAX_POIS]]
+        rows = rows[np.argsort(-self.score[rows], kind="stable")]
+        items = [{"type": "poi", **p} for p in rows_payload(self.columns, rows)]
+        return {"zoom": zoom, "clustered": False, "total": total, "truncated": total > len(rows), "items": items}
+
+
+def build_viewport_index(df: Optional[pd.DataFrame]) -> Optional[ViewportIndex]:
+    if df is None or not len(df):
+        return None
+    return ViewportIndex.build(df)
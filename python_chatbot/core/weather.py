@@ -1,38 +1,70 @@
-import os, requests, random
+import os, requests, random, time, threading
+from collections import OrderedDict
 from dotenv import load_dotenv
+from . import singleflight
 load_dotenv()
 
 API_KEY = os.getenv("OPENWEATHER_API_KEY")
+# Cho phép trỏ sang server giả lập (load test / dev offline)
+API_URL = os.getenv("OPENWEATHER_URL", "https://api.openweathermap.org/data/2.5/weather")
+# Kết quả thật từ API được giữ lại TTL giây; các request đồng thời cùng thành phố chỉ gọi API một lần
+WEATHER_TTL_S = float(os.getenv("TRIPIZ_WEATHER_TTL_S", "600"))
+WEATHER_CACHE_MAX = 256
+
+_FLIGHT = singleflight.group("weather")
+_cache: "OrderedDict[str, tuple]" = OrderedDict()  # city đã chuẩn hoá -> (thời điểm, dữ liệu)
+_cache_lock = threading.Lock()
+
+# Normalize city name for API
+CITY_MAP = {
+    "hồ chí minh": "Ho Chi Minh City",
+    "sài gòn": "Ho Chi Minh City",
+    "saigon": "Ho Chi Minh City",
+    "hà nội": "Hanoi",
+    "hanoi": "Hanoi",
+    "đà nẵng": "Da Nang",
+    "danang": "Da Nang",
+    "đà lạt": "Da Lat",
+    "dalat": "Da Lat",
+}
+
+def _fetch(city_normalized: str):
+    """Gọi OpenWeather; None nếu lỗi/không có dữ liệu."""
+    try:
+        url = f"{API_URL}?q={city_normalized},VN&appid={API_KEY}&units=metric&lang=vi"
+        r = requests.get(url, timeout=8)
+        data = r.json()
+        if data.get("cod") == 200:
+            return {
+                "temp": round(float(data["main"]["temp"]), 1),
+                "humidity": int(data["main"]["humidity"]),
+                "description": data["weather"][0]["description"]
+            }
+    except Exception:
+        pass
+    return None
+
+def _cached(key: str):
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None and time.monotonic() - hit[0] < WEATHER_TTL_S:
+            _cache.move_to_end(key)
+            return hit[1]
+    return None
 
 def get_weather(city: str):
     if API_KEY:
-        try:
-            # Normalize city name for API
-            city_map = {
-                "hồ chí minh": "Ho Chi Minh City",
-                "sài gòn": "Ho Chi Minh City",
-                "saigon": "Ho Chi Minh City",
-                "hà nội": "Hanoi",
-                "hanoi": "Hanoi",
-                "đà nẵng": "Da Nang",
-                "danang": "Da Nang",
-                "đà lạt": "Da Lat",
-                "dalat": "Da Lat",
-            }
-            city_normalized = city_map.get(city.lower().strip(), city)
-            
-            url = f"https://api.openweathermap.org/data/2.5/weather?q={city_normalized},VN&appid={API_KEY}&units=metric&lang=vi"
-            r = requests.get(url, timeout=8)
-            data = r.json()
-            if data.get("cod") == 200:
-                return {
-                    "city": city,
-                    "temp": round(float(data["main"]["temp"]), 1),
-                    "humidity": int(data["main"]["humidity"]),
-                    "description": data["weather"][0]["description"]
-                }
-        except Exception:
-            pass
+        city_normalized = CITY_MAP.get(city.lower().strip(), city)
+        data = _cached(city_normalized)
+        if data is None:
+            data = _FLIGHT.do(city_normalized, lambda: _fetch(city_normalized))
+            if data is not None:
+                with _cache_lock:
+                    _cache[city_normalized] = (time.monotonic(), data)
+                    while len(_cache) > WEATHER_CACHE_MAX:
+                        _cache.popitem(last=False)
+        if data is not None:
+            return {"city": city, **data}
     # Fallback mô phỏng
     return {
         "city": city,
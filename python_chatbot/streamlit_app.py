@@ -1,7 +1,7 @@
 import streamlit as st
 import folium
+from folium.plugins import FastMarkerCluster
 from streamlit_folium import st_folium
-import time
 
 from core.intent_detector import detect_intent
 from core.llm_parser import parse_prompt_to_params
@@ -9,7 +9,8 @@ from core.llm_composer import compose_plan_response
 from core.osm_loader import ensure_poi_dataset
 from core.recommender import recommend_pois
 from core.itinerary import build_itinerary
-from core.weather import get_weather
+from core.weather import get_weather, WEATHER_TTL_S
+from core.catalog import CATEGORIES, get_shard, road_graph_for_city
 from core.ui_plan_renderer import render_plan_card
 
 # --- Cấu hình trang ---
@@ -62,10 +63,101 @@ with st.sidebar:
 
 st.caption(f"📍 **{city}** • 💸 {budget:,}đ/ngày • 🚶 {walk_tolerance_km}km/ngày")
 
-# --- Cache dữ liệu ---
-with st.spinner("Đang tải dữ liệu địa điểm offline..."):
+# --- Cache dùng chung (mọi phiên, mọi lần rerun) ---
+# cache_resource: catalog + index + road graph giữ nguyên object trong process (không copy);
+# cache_data: kết quả theo input (thời tiết, gợi ý, lịch trình) -> đổi widget chỉ render lại từ cache
+CATEGORY_MAP = {
+    "🍽 Ẩm thực": "food",
+    "☕ Cafe": "cafe",
+    "🎢 Giải trí": "entertainment",
+    "🏛 Tham quan": "attraction",
+    "🛍 Mua sắm": "shopping",
+}
+SESSION_CACHE_MAX = 16
+
+
+@st.cache_resource(show_spinner="Đang tải dữ liệu địa điểm offline...")
+def load_catalog(city):
+    """DataFrame POI của thành phố + dựng sẵn index TF-IDF và road graph của shard."""
     poi_df = ensure_poi_dataset(city)
-weather_now = get_weather(city)
+    shard = get_shard(city)
+    for cat in CATEGORIES:
+        shard.text_index(cat)
+    try:
+        road_graph_for_city(city)
+    except (FileNotFoundError, RuntimeError) as e:
+        print(f"⚠️ Road graph not available for {city}: {e}")
+    return poi_df
+
+
+@st.cache_data(ttl=WEATHER_TTL_S, show_spinner=False)
+def cached_weather(city):
+    return get_weather(city)
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def cached_recommend(city, categories, user_query, taste, interests, budget, walk_tolerance_km, weather_desc):
+    pois = []
+    for cat in categories:
+        pois.extend(recommend_pois(
+            city=city,
+            category=cat,
+            user_query=user_query,
+            taste_tags=list(taste),
+            activity_tags=list(interests),
+            budget_per_day=budget,
+            walk_tolerance_km=walk_tolerance_km,
+            weather_desc=weather_desc,
+        ))
+    return pois
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def cached_itinerary(params, _poi_df, weather_now):
+    # _poi_df không vào khoá cache (đã xác định bởi params["city"])
+    return build_itinerary(dict(params), _poi_df, weather_now)
+
+
+def session_cached(key, compute):
+    """Kết quả riêng của phiên (vd tham số trích từ prompt), giữ SESSION_CACHE_MAX mục gần nhất."""
+    cache = st.session_state.setdefault("_results", {})
+    if key not in cache:
+        cache[key] = compute()
+        while len(cache) > SESSION_CACHE_MAX:
+            cache.pop(next(iter(cache)))
+    return cache[key]
+
+
+def recommend_chosen(user_query):
+    chosen = tuple(CATEGORY_MAP[c] for c in category_filter if c in CATEGORY_MAP)
+    return cached_recommend(city, chosen, user_query, tuple(taste), tuple(interests), budget,
+                            walk_tolerance_km, weather_now["description"])
+
+
+def run_itinerary(params):
+    progress_text = st.empty()
+    progress_bar = st.progress(0)
+    progress_text.text("🧭 Đang tạo lịch trình du lịch...")
+    # thành phố có thể khác sidebar khi câu chat nói rõ ("3 ngày ở Đà Nẵng")
+    if params["city"] == city:
+        plan_raw = cached_itinerary(params, poi_df, weather_now)
+    else:
+        plan_raw = cached_itinerary(params, load_catalog(params["city"]), cached_weather(params["city"]))
+    progress_bar.progress(100)
+    st.session_state["plan_raw"] = plan_raw
+
+    progress_bar.empty()
+    progress_text.empty()
+
+    st.markdown('<div class="center-container">', unsafe_allow_html=True)
+    st.success("✨ Lịch trình đã sẵn sàng! Dưới đây là gợi ý chi tiết:")
+    for i, day in enumerate(plan_raw):
+        render_plan_card(i, day)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+
+poi_df = load_catalog(city)
+weather_now = cached_weather(city)
 
 
 # --- Hiển thị thẻ địa điểm ---
@@ -108,6 +200,16 @@ def render_poi_card(p):
     st.divider()
 
 
+MARKER_CALLBACK = """
+function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.bindTooltip(row[2]);
+    marker.bindPopup(row[2]);
+    return marker;
+};
+"""
+
+
 def render_pois(pois):
     if not pois:
         st.warning("Không tìm thấy địa điểm phù hợp.")
@@ -128,12 +230,14 @@ def render_pois(pois):
     lon_center = sum(lon for _, lon in coords) / len(coords)
     fmap = folium.Map(location=[lat_center, lon_center], zoom_start=13)
 
+    # Một lớp FastMarkerCluster (dữ liệu + callback JS) thay vì một folium.Marker mỗi POI
+    points = []
     for p in pois:
         try:
-            lat, lon = float(p["lat"]), float(p["lon"])
-            folium.Marker([lat, lon], popup=p["name"], tooltip=p["name"]).add_to(fmap)
+            points.append([float(p["lat"]), float(p["lon"]), str(p["name"])])
         except Exception:
             continue
+    FastMarkerCluster(points, callback=MARKER_CALLBACK).add_to(fmap)
 
     st_folium(fmap, width=900, height=500, key=f"map_{city}")
     st.markdown('</div>', unsafe_allow_html=True)
@@ -147,26 +251,7 @@ with col1:
         if "plan_raw" in st.session_state:
             del st.session_state["plan_raw"]
 
-        category_map = {
-            "🍽 Ẩm thực": "food",
-            "☕ Cafe": "cafe",
-            "🎢 Giải trí": "entertainment",
-            "🏛 Tham quan": "attraction",
-            "🛍 Mua sắm": "shopping",
-        }
-        chosen = [category_map[c] for c in category_filter if c in category_map]
-        pois = []
-        for cat in chosen:
-            pois.extend(recommend_pois(
-                city=city,
-                category=cat,
-                user_query="",
-                taste_tags=taste,
-                activity_tags=interests,
-                budget_per_day=budget,
-                walk_tolerance_km=walk_tolerance_km,
-                weather_desc=weather_now["description"],
-            ))
+        pois = recommend_chosen("")
         st.session_state["pois"] = pois
         render_pois(pois)
 
@@ -190,26 +275,7 @@ with col3:
             "transport": transport,
         }
 
-        progress_text = st.empty()
-        progress_bar = st.progress(0)
-        progress_text.text("🔍 Đang tải dữ liệu bản đồ...")
-
-        for pct in range(0, 101, 25):
-            time.sleep(0.3)
-            progress_bar.progress(pct)
-            progress_text.text(f"🧭 Đang tạo lịch trình du lịch... {pct}%")
-
-        plan_raw = build_itinerary(params, poi_df, weather_now)
-        st.session_state["plan_raw"] = plan_raw
-
-        progress_bar.empty()
-        progress_text.empty()
-
-        st.markdown('<div class="center-container">', unsafe_allow_html=True)
-        st.success("✨ Lịch trình đã sẵn sàng! Dưới đây là gợi ý chi tiết:")
-        for i, day in enumerate(plan_raw):
-            render_plan_card(i, day)
-        st.markdown('</div>', unsafe_allow_html=True)
+        run_itinerary(params)
 
 
 # --- Chat input ---
@@ -229,26 +295,7 @@ if user_input:
         if "plan_raw" in st.session_state:
             del st.session_state["plan_raw"]
 
-        category_map = {
-            "🍽 Ẩm thực": "food",
-            "☕ Cafe": "cafe",
-            "🎢 Giải trí": "entertainment",
-            "🏛 Tham quan": "attraction",
-            "🛍 Mua sắm": "shopping",
-        }
-        chosen = [category_map[c] for c in category_filter if c in category_map]
-        pois = []
-        for cat in chosen:
-            pois.extend(recommend_pois(
-                city=city,
-                category=cat,
-                user_query=user_input,
-                taste_tags=taste,
-                activity_tags=interests,
-                budget_per_day=budget,
-                walk_tolerance_km=walk_tolerance_km,
-                weather_desc=weather_now["description"],
-            ))
+        pois = recommend_chosen(user_input)
         st.session_state["pois"] = pois
         st.chat_message("assistant").write("🔎 Đây là danh sách địa điểm gợi ý:")
         render_pois(pois)
@@ -257,8 +304,8 @@ if user_input:
         if "pois" in st.session_state:
             del st.session_state["pois"]
 
-        params = parse_prompt_to_params(user_input)
-        params.update({
+        # Sidebar là mặc định; slot nói rõ trong câu (vd "3 ngày ở Đà Nẵng, 2 triệu") được ưu tiên
+        params = {
             "city": city,
             "budget_vnd": budget,
             "days": days,
@@ -266,28 +313,10 @@ if user_input:
             "activity_tags": interests,
             "walk_tolerance_km": walk_tolerance_km,
             "transport": transport,
-        })
-
-        progress_text = st.empty()
-        progress_bar = st.progress(0)
-        progress_text.text("🔍 Đang tải dữ liệu bản đồ...")
-
-        for pct in range(0, 101, 25):
-            time.sleep(0.3)
-            progress_bar.progress(pct)
-            progress_text.text(f"🧭 Đang tạo lịch trình du lịch... {pct}%")
-
-        plan_raw = build_itinerary(params, poi_df, weather_now)
-        st.session_state["plan_raw"] = plan_raw
-
-        progress_bar.empty()
-        progress_text.empty()
+        }
+        params.update(session_cached(("params", user_input), lambda: parse_prompt_to_params(user_input, defaults={})))
 
-        st.markdown('<div class="center-container">', unsafe_allow_html=True)
-        st.success("✨ Lịch trình đã sẵn sàng! Dưới đây là gợi ý chi tiết:")
-        for i, day in enumerate(plan_raw):
-            render_plan_card(i, day)
-        st.markdown('</div>', unsafe_allow_html=True)
+        run_itinerary(params)
 
     else:
         st.chat_message("assistant").write(
@@ -0,0 +1,45 @@
+"""Fixture dùng chung cho test: chạy từ thư mục python_chatbot (`python -m pytest -q`)."""
+import os
+import sys
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from bench.synthetic import generate_grid_graph  # noqa: E402
+from core.graph_compiler import compile_graph  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def grid_graph():
+    """Road graph lưới 12x12 (30% cạnh một chiều) trong bbox HCM, schema như graph osmnx."""
+    return generate_grid_graph(12, 12, oneway_share=0.3, seed=7)
+
+
+@pytest.fixture(scope="session")
+def compiled_grid(grid_graph):
+    return compile_graph(grid_graph).prepare()
+
+
+@pytest.fixture
+def road_graph(monkeypatch, compiled_grid):
+    """route_optimizer dùng graph lưới đã biên dịch thay cho graph của thành phố."""
+    import core.route_optimizer as route_optimizer
+    monkeypatch.setattr(route_optimizer, "road_graph_for_city", lambda city: compiled_grid)
+    return compiled_grid
+
+
+@pytest.fixture(scope="session")
+def grid_pois(grid_graph):
+    """14 POI ứng viên (đã chấm điểm) đặt lệch khỏi nút lưới để phải snap vào giữa cạnh."""
+    nodes = sorted(grid_graph.nodes)[::7][:14]
+    return [{
+        "poi_id": f"hcm:food:{i}",
+        "name": f"POI {i}",
+        "lat": grid_graph.nodes[u]["y"] + 2e-4,
+        "lon": grid_graph.nodes[u]["x"] + 3e-4,
+        "avg_cost": 50_000,
+        "final": 1.0 - i / 100,
+    } for i, u in enumerate(nodes)]
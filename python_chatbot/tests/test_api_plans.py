@@ -0,0 +1,55 @@
+"""Endpoint /api/plans/*: sửa plan trả về ngày đã cập nhật, POI trùng -> 400."""
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+from core import plan_store
+from core.plan_store import DayState, Plan
+
+CITY = "Hồ Chí Minh"
+
+
+@pytest.fixture
+def client_plan(road_graph, grid_pois):
+    plan = Plan({"city": CITY, "days": 2, "budget_vnd": 10_000_000}, "", [dict(p) for p in grid_pois])
+    plan.days = [DayState.build(CITY, plan.candidates[0:3], plan.mode),
+                 DayState.build(CITY, plan.candidates[3:6], plan.mode)]
+    plan_store._STORE.put(plan)
+    yield TestClient(api.app), plan
+    plan_store.delete_plan(plan.id)
+
+
+def _ids(day):
+    return [p["poi_id"] for p in day["pois"]]
+
+
+def test_plan_edits(client_plan):
+    client, plan = client_plan
+    r = client.post(f"/api/plans/{plan.id}/days/1/pois", json={"poi_id": "hcm:food:9"})
+    assert r.status_code == 200
+    assert "hcm:food:9" in _ids(r.json()["days"][0])
+
+    r = client.put(f"/api/plans/{plan.id}/days/1/pois/0", json={"poi_id": "hcm:food:10"})
+    assert r.status_code == 200
+    assert "hcm:food:10" in _ids(r.json()["days"][0])
+
+    r = client.delete(f"/api/plans/{plan.id}/days/2/pois/0")
+    assert r.status_code == 200
+    assert len(r.json()["days"][1]["pois"]) == 2
+
+
+def test_plan_duplicate_poi_is_400(client_plan):
+    client, plan = client_plan
+    taken = plan.days[1].pois[0]["poi_id"]
+    r = client.post(f"/api/plans/{plan.id}/days/1/pois", json={"poi_id": taken})
+    assert r.status_code == 400
+    r = client.put(f"/api/plans/{plan.id}/days/1/pois/0", json={"poi_id": taken})
+    assert r.status_code == 400
+    assert client.get(f"/api/plans/{plan.id}").json()["days"][1]["pois"][0]["poi_id"] == taken
+
+
+def test_plan_not_found_and_bad_index(client_plan):
+    client, plan = client_plan
+    assert client.get("/api/plans/khong-co").status_code == 404
+    assert client.delete(f"/api/plans/{plan.id}/days/1/pois/99").status_code == 404
+    assert client.post(f"/api/plans/{plan.id}/days/9/pois", json={}).status_code == 404
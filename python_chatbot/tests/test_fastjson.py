@@ -0,0 +1,47 @@
+"""dumps(): cùng output với orjson và fallback json chuẩn, NaN/inf -> null, Fragment chèn nguyên văn."""
+import importlib.util
+import json
+import sys
+
+import numpy as np
+import pytest
+
+from core import fastjson
+
+
+@pytest.fixture(params=["orjson", "json"])
+def backend(request, monkeypatch):
+    """Module fastjson với orjson (nếu đã cài) hoặc bản nạp riêng khi không có orjson."""
+    if request.param == "orjson":
+        if fastjson.orjson is None:
+            pytest.skip("orjson chưa cài")
+        return fastjson
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    spec = importlib.util.spec_from_file_location("fastjson_stdlib", fastjson.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    assert module.orjson is None
+    return module
+
+
+def test_non_finite_floats_become_null(backend):
+    obj = {
+        "rating": np.float64("nan"),
+        "lat": float("inf"),
+        "lon": -float("inf"),
+        "f32": np.float32("nan"),
+        "arr": np.array([np.nan, 2.5]),
+        "nested": [{"x": float("nan")}, (1, np.float64(1.5))],
+        "text": "NaN",
+    }
+    assert json.loads(backend.dumps(obj)) == {
+        "rating": None, "lat": None, "lon": None, "f32": None, "arr": [None, 2.5],
+        "nested": [{"x": None}, [1, 1.5]], "text": "NaN",
+    }
+
+
+def test_numpy_scalars_and_fragments(backend):
+    frag = backend.Fragment(b'{"poi_id":"hcm:food:1","name":"Ph\xe1\xbb\x9f"}')
+    out = backend.dumps({"n": np.int64(3), "ok": np.bool_(True), "pois": [frag, frag], "city": "Huế"})
+    assert json.loads(out) == {"n": 3, "ok": True, "city": "Huế",
+                               "pois": [{"poi_id": "hcm:food:1", "name": "Phở"}] * 2}
@@ -0,0 +1,154 @@
+"""CompiledGraph (SCC + gộp node bậc 2 + snap + trọng số gói) so với Dijkstra của networkx trên graph gốc."""
+import math
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from core import route_optimizer
+from core.graph_compiler import WALK_SPEED_KMH, compile_graph, edge_speeds, haversine_m, pack_weights, unpack_weights
+
+MIN_TOL = 1e-3  # phút: làm tròn ms mỗi cạnh trong trọng số gói
+KM_TOL = 5e-3   # km: làm tròn dm mỗi cạnh
+
+
+@pytest.fixture(scope="module")
+def source_graph(grid_graph):
+    """Lưới đã chia mỗi phố thành 3 đoạn (node bậc 2 để gộp) + một đảo tách rời (bị bỏ khi lấy SCC)."""
+    G = nx.MultiDiGraph(crs="epsg:4326")
+    G.add_nodes_from(grid_graph.nodes(data=True))
+    nid = 10 ** 6
+    for u, v, data in list(grid_graph.edges(data=True)):
+        if u > v and grid_graph.has_edge(v, u):
+            continue  # phố hai chiều: chia một lần, thêm cả hai chiều bên dưới
+        two_way = grid_graph.has_edge(v, u)
+        pts = [u]
+        for t in (1 / 3, 2 / 3):
+            G.add_node(nid, x=grid_graph.nodes[u]["x"] * (1 - t) + grid_graph.nodes[v]["x"] * t,
+                       y=grid_graph.nodes[u]["y"] * (1 - t) + grid_graph.nodes[v]["y"] * t)
+            pts.append(nid)
+            nid += 1
+        pts.append(v)
+        for a, b in zip(pts, pts[1:]):
+            length = float(haversine_m(G.nodes[a]["y"], G.nodes[a]["x"], G.nodes[b]["y"], G.nodes[b]["x"]))
+            G.add_edge(a, b, length=length, highway=data["highway"])
+            if two_way:
+                G.add_edge(b, a, length=length, highway=data["highway"])
+    G.add_node(-1, x=106.70, y=10.75)
+    G.add_node(-2, x=106.701, y=10.751)
+    G.add_edge(-1, -2, length=150.0, highway="residential")
+    return G
+
+
+@pytest.fixture(scope="module")
+def compiled(source_graph):
+    return compile_graph(source_graph).prepare()
+
+
+@pytest.fixture(scope="module")
+def scc(source_graph):
+    return source_graph.subgraph(max(nx.strongly_connected_components(source_graph), key=len)).copy()
+
+
+@pytest.fixture(scope="module")
+def sample_nodes(scc):
+    """Node giao lộ + node giữa phố (đã bị gộp vào cạnh -> snap vào giữa cạnh)."""
+    rng = np.random.default_rng(3)
+    cross = [n for n in scc.nodes if n < 10 ** 6]
+    mid = [n for n in scc.nodes if n >= 10 ** 6]
+    return [int(n) for n in rng.choice(cross, 8, replace=False)] + [int(n) for n in rng.choice(mid, 8, replace=False)]
+
+
+def _coords(G, nodes):
+    return [(G.nodes[n]["y"], G.nodes[n]["x"]) for n in nodes]
+
+
+def _drive_s(u, v, d):
+    return min(e["length"] / (edge_speeds(e)[0] / 3.6) for e in d.values())
+
+
+def _walk_graph(scc):
+    """Đi bộ: mọi cạnh hai chiều, thời gian = length x hệ số vòng / tốc độ đi bộ (giữ cạnh nhanh nhất)."""
+    W = nx.DiGraph()
+    for a, b, e in scc.edges(data=True):
+        sec = e["length"] * edge_speeds(e)[1] / (WALK_SPEED_KMH / 3.6)
+        for x, y in ((a, b), (b, a)):
+            if not W.has_edge(x, y) or sec < W[x][y]["sec"]:
+                W.add_edge(x, y, sec=sec, length=e["length"])
+    return W
+
+
+def _path_m(G, path):
+    return sum(min(e["length"] for e in G[a][b].values()) if G.is_multigraph() else G[a][b]["length"]
+               for a, b in zip(path, path[1:]))
+
+
+def test_compile_prunes_and_contracts(compiled, source_graph, scc):
+    meta = compiled.meta
+    assert meta["source_nodes"] == source_graph.number_of_nodes()
+    assert meta["scc_nodes"] == scc.number_of_nodes() < meta["source_nodes"]
+    assert meta["nodes"] < meta["scc_nodes"]  # node giữa phố đã được gộp
+
+
+def test_distance_matches_networkx(compiled, scc, sample_nodes):
+    coords = _coords(scc, sample_nodes)
+    want = np.array([[nx.shortest_path_length(scc, a, b, weight="length") / 1000.0 for b in sample_nodes]
+                     for a in sample_nodes])
+    assert np.allclose(compiled.distance_matrix_km(coords), want, atol=1e-6)
+    # một cột (Dijkstra ngược từ đích) phải khớp với ma trận đầy đủ
+    assert np.allclose(compiled.distance_km(coords, coords[:1])[:, 0], want[:, 0], atol=1e-6)
+    assert not np.allclose(want, want.T)  # có đường một chiều -> ma trận có hướng
+
+
+@pytest.mark.parametrize("mode", ["drive", "walk"])
+def test_travel_matches_networkx(compiled, scc, sample_nodes, mode):
+    G = scc if mode == "drive" else _walk_graph(scc)
+    weight = _drive_s if mode == "drive" else "sec"
+    want_min = np.zeros((len(sample_nodes), len(sample_nodes)))
+    want_km = np.zeros_like(want_min)
+    for i, a in enumerate(sample_nodes):
+        sec, paths = nx.single_source_dijkstra(G, a, weight=weight)
+        for j, b in enumerate(sample_nodes):
+            want_min[i, j] = sec[b] / 60.0
+            want_km[i, j] = _path_m(G, paths[b]) / 1000.0
+    coords = _coords(scc, sample_nodes)
+    minutes, km = compiled.travel_matrix(coords, mode)
+    assert np.allclose(minutes, want_min, atol=MIN_TOL)
+    assert np.allclose(km, want_km, atol=KM_TOL)
+    col_min, col_km = compiled.travel(coords, coords[-1:], mode)
+    assert np.allclose(col_min[:, 0], want_min[:, -1], atol=MIN_TOL)
+    assert np.allclose(col_km[:, 0], want_km[:, -1], atol=KM_TOL)
+
+
+def test_packed_weights_round_trip():
+    seconds = np.array([0.0, 0.0004, 12.3456, 3600.0 * 100])
+    length = np.array([0.0, 0.2, 834.56, 1_600_000.0])
+    sec, met = unpack_weights(pack_weights(seconds, length).sum(keepdims=True))
+    assert sec[0] == pytest.approx(0.002 + 12.346 + 360_000.0)
+    assert met[0] == pytest.approx(0.2 + 834.6 + 1_600_000.0)
+    assert np.all(np.isinf(unpack_weights(np.array([np.inf]))))
+
+
+@pytest.mark.parametrize("lat,lon", [(math.nan, 106.70), (0.0, 0.0)])
+def test_snap_failure_raises_value_error(compiled, lat, lon):
+    with pytest.raises(ValueError):
+        compiled.snap(lat, lon)
+    with pytest.raises(ValueError):
+        compiled.travel_matrix([(10.77, 106.70), (lat, lon)])
+
+
+def test_route_optimizer_falls_back_to_haversine_when_snap_fails(monkeypatch, compiled, scc, sample_nodes):
+    monkeypatch.setattr(route_optimizer, "road_graph_for_city", lambda city: compiled)
+    pois = [{"lat": lat, "lon": lon} for lat, lon in _coords(scc, sample_nodes[:2])] + [{"lat": 0.0, "lon": 0.0}]
+    a, b = pois[0], pois[1]
+    crow = route_optimizer.haversine_km(a["lat"], a["lon"], b["lat"], b["lon"])
+
+    minutes, km = route_optimizer.pairwise_travel_matrix("hcm", pois, "drive")
+    assert km[0][1] == pytest.approx(crow)
+    assert minutes[0][1] == pytest.approx(crow * 60 / route_optimizer.FALLBACK_SPEED_KMH["drive"])
+    minutes, km = route_optimizer.travel_block("hcm", pois[:1], pois, "walk")
+    assert km[0][1] == pytest.approx(crow)
+    assert route_optimizer.pairwise_distance_matrix("hcm", pois)[0][0][1] == pytest.approx(crow)
+    assert route_optimizer.distance_block("hcm", pois[:1], pois)[0][1] == pytest.approx(crow)
+    # không lỗi snap -> vẫn dùng graph (đường đi >= đường chim bay)
+    assert route_optimizer.pairwise_travel_matrix("hcm", pois[:2], "drive")[1][0][1] > crow
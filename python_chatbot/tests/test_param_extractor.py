@@ -0,0 +1,73 @@
+"""Trích tham số bằng luật: slot + confidence chính xác, và các câu từng bị đọc nhầm thành ngày/ngân sách."""
+import pytest
+
+from core import llm_parser
+from core.param_extractor import extract_params
+
+CASES = [
+    # câu mẫu trong docstring/README
+    ("Lên lịch trình 3 ngày ở Đà Nẵng, 2 triệu", {"city": "Đà Nẵng", "days": 3, "budget_vnd": 2_000_000}, 0.85),
+    ("2tr cho 3 ngày", {"days": 3, "budget_vnd": 2_000_000}, 0.5),
+    ("1.5tr cho 2 ngày ở Hà Nội", {"city": "Hà Nội", "days": 2, "budget_vnd": 1_500_000}, 0.85),
+    ("cuối tuần ở Đà Lạt 500k", {"city": "Đà Lạt", "days": 2, "budget_vnd": 500_000}, 0.85),
+    ("1.500.000đ một ngày", {"days": 1, "budget_vnd": 1_500_000}, 0.5),
+    ("Plan a 2-day trip to Hanoi with a budget of 1,500,000 VND",
+     {"city": "Hà Nội", "days": 2, "budget_vnd": 1_500_000}, 0.85),
+    ("Sài Gòn 3N2Đ, ăn phở, cà phê, đi bộ tối đa 2km",
+     {"city": "Hồ Chí Minh", "days": 3, "taste_tags": ["Vietnamese", "Cafe"], "transport": "đi bộ",
+      "walk_tolerance_km": 2.0}, 0.7),
+    # tổng cả chuyến -> ngân sách mỗi ngày
+    ("tổng 3 triệu cho 3 ngày ở Huế", {"city": "Huế", "days": 3, "budget_vnd": 1_000_000}, 0.85),
+    ("Đà Lạt 2 ngày, tổng 3 triệu", {"city": "Đà Lạt", "days": 2, "budget_vnd": 1_500_000}, 0.85),
+    ("two days in Da Nang, total 4 million", {"city": "Đà Nẵng", "days": 2, "budget_vnd": 2_000_000}, 0.85),
+    # số ngày không bị đọc thành tiền dù đứng sau từ gợi ý ngân sách ("với")
+    ("đi chơi với bạn 3 ngày", {"days": 3}, 0.25),
+    # số đếm tiếng Việt: có dấu, hoặc không dấu khi không trùng từ thường
+    ("Đi Huế năm ngày", {"city": "Huế", "days": 5}, 0.6),
+    ("ba ngay o da nang", {"city": "Đà Nẵng", "days": 3}, 0.6),
+    # từ thường trùng số đếm khi bỏ dấu ("từ"=tư, "sau"=sáu, "bay"=bảy, "nam"=năm)
+    ("Lên lịch từ ngày 20/11 ở Hà Nội", {"city": "Hà Nội"}, 0.35),
+    ("Đi Hà Nội sau ngày mai", {"city": "Hà Nội"}, 0.35),
+    ("Bay ra Đà Nẵng ngày mai", {"city": "Đà Nẵng"}, 0.35),
+    ("miền nam 3 ngày", {"days": 3}, 0.25),
+    ("bà ngày nào cũng đi chợ", {}, 0),
+    # "m" là mét trừ khi có từ gợi ý tiền
+    ("Đi bộ tối đa 500m", {"transport": "đi bộ"}, 0.05),
+    ("ngân sách 2m", {"budget_vnd": 2_000_000}, 0.25),
+    ("budget 5 mil for 4 days", {"days": 4, "budget_vnd": 5_000_000}, 0.5),
+    ("walk max 1.5 km, quán chay, bảo tàng",
+     {"taste_tags": ["Vegetarian"], "activity_tags": ["museum"], "transport": "đi bộ", "walk_tolerance_km": 1.5},
+     0.15),
+    ("", {}, 0),
+]
+
+
+@pytest.mark.parametrize("prompt,slots,confidence", CASES, ids=[c[0] or "<empty>" for c in CASES])
+def test_extract_params(prompt, slots, confidence):
+    assert extract_params(prompt) == (slots, confidence)
+
+
+@pytest.fixture
+def llm_calls(monkeypatch):
+    calls = []
+
+    def fake_llm(prompt):
+        calls.append(prompt)
+        return {"city": "Huế", "days": 9}
+
+    monkeypatch.setattr(llm_parser, "_ask_llm", fake_llm)
+    return calls
+
+
+def test_parse_prompt_skips_llm_when_confident(llm_calls):
+    params = llm_parser.parse_prompt_to_params("Lên lịch trình 3 ngày ở Đà Nẵng, 2 triệu")
+    assert llm_calls == []
+    assert params == {**llm_parser.DEFAULT_PARAMS, "city": "Đà Nẵng", "days": 3, "budget_vnd": 2_000_000}
+
+
+def test_parse_prompt_asks_llm_below_threshold(llm_calls):
+    # chỉ có transport (0.05) < ngưỡng: hỏi LLM, nhưng slot luật đã tìm được vẫn thắng
+    params = llm_parser.parse_prompt_to_params("Đi bộ tối đa 500m", defaults={})
+    assert llm_calls == ["Đi bộ tối đa 500m"]
+    assert params == {"city": "Huế", "days": 9, "transport": "đi bộ"}
+    assert "budget_vnd" not in params
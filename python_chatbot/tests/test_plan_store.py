@@ -0,0 +1,76 @@
+"""Sửa plan từng bước (insert/replace/remove) phải cho cùng ma trận với tính lại toàn bộ."""
+import pytest
+
+from core.plan_store import DayState, Plan
+from core.route_optimizer import pairwise_travel_matrix
+
+CITY = "Hồ Chí Minh"
+
+
+@pytest.fixture(params=["xe máy/ô tô", "đi bộ"])
+def plan(request, road_graph, grid_pois):
+    params = {"city": CITY, "days": 2, "budget_vnd": 10_000_000, "transport": request.param}
+    plan = Plan(params, "", [dict(p) for p in grid_pois])
+    plan.days = [DayState.build(CITY, plan.candidates[0:4], plan.mode),
+                 DayState.build(CITY, plan.candidates[4:8], plan.mode)]
+    assert all(d.minutes is not None for d in plan.days)
+    return plan
+
+
+def _assert_matches_recompute(plan):
+    for ds in plan.days:
+        minutes, km = pairwise_travel_matrix(plan.city, ds.pois, plan.mode)
+        assert len(ds.minutes) == len(ds.pois)
+        for got, want in ((ds.minutes, minutes), (ds.km, km)):
+            for row_got, row_want in zip(got, want):
+                assert row_got == pytest.approx(row_want, rel=1e-9, abs=1e-9)
+
+
+def _ids(ds):
+    return [p["poi_id"] for p in ds.pois]
+
+
+def test_insert_replace_remove_keep_matrices_in_sync(plan):
+    _assert_matches_recompute(plan)
+
+    plan.insert(1, poi_id="hcm:food:10")
+    assert "hcm:food:10" in _ids(plan.days[0])
+    _assert_matches_recompute(plan)
+
+    plan.insert(2)  # tự chọn ứng viên chưa dùng
+    assert len(plan.days[1].pois) == 5
+    _assert_matches_recompute(plan)
+
+    plan.replace(1, 0, poi_id="hcm:food:12")
+    assert "hcm:food:12" in _ids(plan.days[0])
+    _assert_matches_recompute(plan)
+
+    plan.remove(2, 2)
+    assert len(plan.days[1].pois) == 4
+    _assert_matches_recompute(plan)
+
+    plan.replace(2, 1, poi={"name": "Nhà bạn", "lat": 10.78, "lon": 106.70})
+    _assert_matches_recompute(plan)
+    assert plan.version == 5
+
+
+def test_insert_rejects_poi_already_in_plan(plan):
+    other_day = plan.days[1].pois[0]["poi_id"]
+    with pytest.raises(ValueError, match="đã có trong lịch trình"):
+        plan.insert(1, poi_id=other_day)
+    with pytest.raises(ValueError, match="đã có trong lịch trình"):
+        plan.insert(2, poi_id=other_day)
+    assert plan.version == 0
+
+
+def test_replace_rejects_poi_already_in_plan(plan):
+    day1 = _ids(plan.days[0])
+    with pytest.raises(ValueError, match="đã có trong lịch trình"):
+        plan.replace(1, 0, poi_id=plan.days[1].pois[0]["poi_id"])
+    with pytest.raises(ValueError, match="đã có trong lịch trình"):
+        plan.replace(1, 0, poi_id=day1[1])
+    assert _ids(plan.days[0]) == day1
+
+    plan.replace(1, 0, poi_id=day1[0])  # thay bằng chính nó vẫn được
+    assert sorted(_ids(plan.days[0])) == sorted(day1)
+    _assert_matches_recompute(plan)